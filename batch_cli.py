@@ -0,0 +1,314 @@
+"""
+Headless batch mode: analyzes a folder (or a list) of MDL PDFs and writes one
+MDL_<cpf>_FUNCOES.txt per servidor (plus .csv/.jsonl with the same rows, untruncated),
+applying the same merge rules as the GUI.
+
+    python batch_cli.py PASTA_OU_PDF [...] -o saida/ [--mainframe-data mainframe.json]
+                        [--mainframe-user usuario] [--workers 4] [--formats csv,jsonl]
+
+The optional MAINFRAME file holds pre-recorded rows keyed by CPF:
+
+    {"303.225.961-49": [{"date": "1999-04-22", "code": "036",
+                         "lotacao": "8992 - C.E. ALFREDO NASSER",
+                         "periodo": "22/04/1999 - 14/01/2000"}, ...]}
+"""
+import argparse
+import getpass
+import io
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import traceback
+
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from db_utils import load_all_initial_data, load_app_config
+from cache_utils import open_pdf_result_cache
+from records import FuncaoRecord
+from progress import ProgressTracker, TextProgressReporter
+from tracing import enable_tracing, init_worker_tracing, write_trace, write_worker_trace, span
+from report_export import build_report_model, write_report_files, parse_export_formats, EXPORT_FORMATS
+from pdf_parser import (
+    PdfDocumentSession, MainframeSession, read_pdf_header, read_pdf_yearly_data,
+    scrape_mainframe_data, build_final_report,
+)
+
+def _cpf_digits(cpf):
+    return ''.join(ch for ch in cpf if ch.isdigit())
+
+def load_mainframe_records(path):
+    """
+    Reads pre-recorded MAINFRAME rows and returns {cpf_digits: scraped_data}, where
+    scraped_data has the same {year: {FuncaoRecord}} shape returned by scrape_mainframe_data.
+    Raises OSError when the file can't be read and ValueError when it is not in that format.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        raw_records = json.load(f)
+    if not isinstance(raw_records, dict):
+        raise ValueError("o conteúdo deve ser um objeto JSON com os CPFs como chaves")
+
+    records_by_cpf = {}
+    for cpf, rows in raw_records.items():
+        if not isinstance(rows, list):
+            raise ValueError(f"as linhas do CPF {cpf} devem estar em uma lista")
+        scraped_data = defaultdict(set)
+        for row in rows:
+            try:
+                date_obj = datetime.fromisoformat(row['date'])
+                code = str(row['code']).zfill(3)
+            except (KeyError, TypeError) as e:
+                raise ValueError(f"linha inválida para o CPF {cpf} (campos 'date' e 'code' são obrigatórios): {row!r}") from e
+            scraped_data[str(date_obj.year)].add(FuncaoRecord.from_periodo(
+                date_obj, code, "[MAINFRAME]", row.get('lotacao') or "-------", row.get('periodo')
+            ))
+        records_by_cpf[_cpf_digits(cpf)] = scraped_data
+    return records_by_cpf
+
+def find_pdf_files(inputs):
+    """Expands folders into their *.pdf files (sorted) and keeps explicit file paths as given."""
+    pdf_files = []
+    for path in inputs:
+        if os.path.isdir(path):
+            pdf_files.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path)) if name.lower().endswith('.pdf')
+            )
+        else:
+            pdf_files.append(path)
+    return pdf_files
+
+def parse_pdf_file(pdf_path, unidades_data, pdf_cache=None):
+    """
+    Stages 0 and 2 for one PDF (header fields and yearly MDL data).
+    Runs in the worker processes; returns a picklable summary dict.
+    """
+    log = io.StringIO()
+    started = time.perf_counter()
+    parsed = {'pdf_path': pdf_path, 'cpf': None, 'name': None, 'data_inicio': None,
+              'pdf_data': None, 'pages': 0, 'error': None}
+    try:
+        with PdfDocumentSession(pdf_path) as pdf_session:
+            log.write("Iniciando Etapa 0: Extraindo dados do cabeçalho do PDF...\n" + "="*50 + "\n")
+            cpf = read_pdf_header(pdf_session, log, unidades_data, pdf_cache)
+            if not cpf:
+                parsed['error'] = "CPF não encontrado no PDF"
+                return parsed
+
+            log.write("\nIniciando Etapa 2: Análise do Arquivo PDF...\n" + "="*50 + "\n")
+            parsed['pdf_data'] = read_pdf_yearly_data(pdf_session, log, unidades_data, max_workers=1)
+            if pdf_session.cached_yearly_data is None:
+                parsed['pages'] = len(pdf_session.pdf.pages)
+            parsed.update(cpf=cpf, name=pdf_session.name, data_inicio=pdf_session.data_inicio)
+    except Exception as e:
+        parsed['error'] = str(e)
+        log.write(traceback.format_exc() + "\n")
+    finally:
+        parsed['seconds'] = time.perf_counter() - started
+        parsed['log'] = log.getvalue()
+    return parsed
+
+def unique_report_path(output_path, pdf_path, used_paths):
+    """
+    Returns `output_path`, or, when another PDF of this batch already wrote it (two PDFs
+    of the same CPF), that name suffixed with this PDF's file name (and a number, if
+    still taken). The returned path is added to `used_paths`.
+    """
+    base_path, extension = os.path.splitext(output_path)
+    pdf_stem = os.path.splitext(os.path.basename(pdf_path))[0]
+    candidate, number = output_path, 1
+    # normcase: on Windows, names differing only in case are the same file.
+    while os.path.normcase(candidate) in used_paths:
+        number += 1
+        candidate = f"{base_path}_{pdf_stem}{extension}" if number == 2 else f"{base_path}_{pdf_stem}_{number}{extension}"
+    used_paths.add(os.path.normcase(candidate))
+    return candidate
+
+def write_report(parsed, scraped_data, funcoes_data, output_dir, log, export_formats=EXPORT_FORMATS, used_paths=None):
+    """
+    Etapas 3 to 5 for one parsed PDF: merges with the MAINFRAME rows and writes
+    MDL_<cpf>_FUNCOES.txt plus the requested structured formats. Returns the .txt path.
+    With `used_paths` (the reports already written by this batch), a second PDF of the
+    same CPF gets its own file instead of overwriting the first one's.
+    """
+    report_name = parsed['name'] or "Nome não encontrado"
+    report_data_inicio = parsed['data_inicio'] or "Não encontrada"
+
+    final_yearly_data, found_special_functions = build_final_report(
+        parsed['pdf_data'], scraped_data, report_data_inicio, funcoes_data, log
+    )
+    report_model = build_report_model(
+        report_name, parsed['cpf'], report_data_inicio, final_yearly_data, found_special_functions, funcoes_data
+    )
+
+    # Same text the GUI's "SALVAR RESULTADOS" would write.
+    output_path = os.path.join(output_dir, f"MDL_{parsed['cpf']}_FUNCOES.txt")
+    if used_paths is not None:
+        default_path, output_path = output_path, unique_report_path(output_path, parsed['pdf_path'], used_paths)
+        if output_path != default_path:
+            log.write(f"  - AVISO: Outro PDF deste lote já gerou {os.path.basename(default_path)}; "
+                      f"este relatório será gravado como {os.path.basename(output_path)}.\n")
+    write_report_files(output_path, report_model, export_formats)
+    return output_path
+
+# --- Process-pool workers (reference data is sent once per process) ---
+_worker_state = {}
+
+def _init_batch_worker(unidades_data):
+    logging.getLogger("pdfminer").setLevel(logging.ERROR)
+    init_worker_tracing()
+    _worker_state.update(unidades_data=unidades_data, pdf_cache=open_pdf_result_cache())
+
+def _parse_pdf_file_in_worker(pdf_path):
+    with span("parse_pdf_file", "pdf", arquivo=os.path.basename(pdf_path)):
+        parsed = parse_pdf_file(pdf_path, **_worker_state)
+    write_worker_trace()
+    return parsed
+
+# Batch progress: PDFs parsed by the workers, then reports merged and written here.
+BATCH_STAGES = (('pdf', 'PDFs', 0.7), ('merge', 'Relatórios', 0.3))
+
+def run_batch(pdf_files, output_dir, funcoes_data, unidades_data, mainframe_records,
+              workers=1, mainframe_session=None, verbose=False, export_formats=EXPORT_FORMATS,
+              progress_interval=5.0):
+    """
+    Parses the PDFs (in a process pool when workers > 1) and, as each one arrives,
+    gets its MAINFRAME rows (pre-recorded, or scraped through the single logged-in
+    `mainframe_session`), merges them and writes the report. Returns per-file summaries.
+    A progress line with the ETA is printed at most every `progress_interval` seconds.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    results = []
+    used_paths = set()
+    progress = ProgressTracker(TextProgressReporter(sys.stdout), stages=BATCH_STAGES, min_interval=progress_interval)
+    progress.start('pdf', total=len(pdf_files), unit="arquivos")
+    progress.start('merge', total=len(pdf_files), unit="relatórios")
+
+    def finish(parsed):
+        progress.advance('pdf')
+        log = io.StringIO()
+        log.write(parsed.pop('log'))
+        result = dict(parsed, output_path=None)
+        if not result['error']:
+            try:
+                scraped_data = mainframe_records.get(_cpf_digits(result['cpf']))
+                if scraped_data is None and mainframe_session is not None:
+                    log.write("\nIniciando Etapa 1: Scraping de Dados do Power BI...\n" + "="*50 + "\n")
+                    scraped_data = scrape_mainframe_data(
+                        result['cpf'], mainframe_session.username, mainframe_session.password,
+                        log, unidades_data, session=mainframe_session
+                    )
+                if scraped_data is None:
+                    log.write("  - AVISO: Nenhum dado do MAINFRAME para este CPF. Apenas o PDF será usado.\n")
+                result['output_path'] = write_report(
+                    result, scraped_data, funcoes_data, output_dir, log, export_formats, used_paths
+                )
+            except Exception as e:
+                result['error'] = str(e)
+                log.write(traceback.format_exc() + "\n")
+
+        # The yearly data is already in the written report; don't keep it for the whole batch.
+        result.pop('pdf_data', None)
+        results.append(result)
+        if verbose:
+            print(log.getvalue())
+        if result['error']:
+            print(f"[ERRO] {result['pdf_path']}: {result['error']}")
+        else:
+            print(f"[OK]   {result['pdf_path']} -> {result['output_path']} ({result['seconds']:.1f}s)")
+        progress.advance('merge')
+
+    if workers > 1 and len(pdf_files) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker, initargs=(unidades_data,)) as executor:
+            for parsed in executor.map(_parse_pdf_file_in_worker, pdf_files):
+                finish(parsed)
+    else:
+        _init_batch_worker(unidades_data)
+        for pdf_path in pdf_files:
+            finish(_parse_pdf_file_in_worker(pdf_path))
+
+    progress.finish('pdf')
+    progress.finish('merge')
+    return results
+
+def print_throughput_summary(results, elapsed):
+    succeeded = [r for r in results if not r['error']]
+    total_pages = sum(r['pages'] for r in results)
+    print("\n" + "="*50)
+    print(f"Arquivos processados: {len(results)} ({len(succeeded)} com sucesso, {len(results) - len(succeeded)} com erro)")
+    print(f"Páginas analisadas: {total_pages} (PDFs vindos do cache não contam)")
+    print(f"Tempo total: {elapsed:.1f}s")
+    if elapsed > 0:
+        print(f"Vazão: {len(results) / elapsed * 60:.1f} arquivos/min, {total_pages / elapsed:.1f} páginas/s")
+    if results:
+        print(f"Tempo médio por arquivo: {sum(r['seconds'] for r in results) / len(results):.2f}s")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera os relatórios MDL_<cpf>_FUNCOES.txt para vários PDFs, sem interface gráfica.")
+    parser.add_argument('inputs', nargs='+', help="Arquivos PDF ou pastas contendo PDFs.")
+    parser.add_argument('-o', '--output-dir', default='.', help="Pasta onde os relatórios serão gravados.")
+    parser.add_argument('--mainframe-data', help="Arquivo JSON com os dados do MAINFRAME já coletados, por CPF.")
+    parser.add_argument('--mainframe-user', help="Usuário da Intranet para buscar no MAINFRAME os CPFs sem dados pré-gravados "
+                                                 "(a senha é lida de MAINFRAME_PASSWORD ou solicitada).")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Número de processos em paralelo.")
+    parser.add_argument('--formats', help="Formatos gravados junto do .txt, separados por vírgula (csv, jsonl); "
+                                          "'none' grava apenas o .txt. Padrão: seção [export] do config.ini.")
+    parser.add_argument('--trace', metavar='ARQUIVO', help="Grava a duração de cada etapa em um trace JSON (Chrome/Perfetto). "
+                                                           "Os processos de trabalho gravam ARQUIVO com o PID no nome.")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Mostra o log completo de cada arquivo.")
+    args = parser.parse_args(argv)
+
+    logging.getLogger("pdfminer").setLevel(logging.ERROR)
+    if args.trace:
+        enable_tracing(args.trace)
+
+    pdf_files = find_pdf_files(args.inputs)
+    if not pdf_files:
+        print("Nenhum arquivo PDF encontrado.", file=sys.stderr)
+        return 1
+
+    mainframe_records = {}
+    if args.mainframe_data:
+        try:
+            mainframe_records = load_mainframe_records(args.mainframe_data)
+        except (OSError, ValueError) as e:
+            print(f"Não foi possível ler os dados do MAINFRAME em '{args.mainframe_data}': {e}", file=sys.stderr)
+            return 1
+
+    initial_data = load_all_initial_data(show_dialogs=False)
+    if not initial_data or not initial_data.get('funcoes') or not initial_data.get('unidades'):
+        return 1
+    if args.formats is None:
+        args.formats = load_app_config().get('export', 'formats', fallback=", ".join(EXPORT_FORMATS))
+    export_formats = parse_export_formats(args.formats)
+
+    mainframe_session = None
+    if args.mainframe_user:
+        password = os.environ.get('MAINFRAME_PASSWORD') or getpass.getpass("Senha do MAINFRAME: ")
+        mainframe_session = MainframeSession(args.mainframe_user, password, sys.stdout)
+        # Chrome starts while the first PDFs are being parsed.
+        threading.Thread(target=mainframe_session.warm_up, daemon=True).start()
+
+    started = time.perf_counter()
+    try:
+        results = run_batch(
+            pdf_files, args.output_dir, initial_data['funcoes'], initial_data['unidades'], mainframe_records,
+            workers=args.workers, mainframe_session=mainframe_session, verbose=args.verbose,
+            export_formats=export_formats
+        )
+    finally:
+        if mainframe_session:
+            mainframe_session.close()
+    print_throughput_summary(results, time.perf_counter() - started)
+    trace_path = write_trace()
+    if trace_path:
+        print(f"Trace gravado em {trace_path}")
+    return 0 if all(not r['error'] for r in results) else 1
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,8 @@
+"""
+Benchmarks for the PDF aggregation and the MAINFRAME unit matching, on synthetic data.
+Run them from the project folder:
+
+    python -m benchmarks.bench_aggregate --reports 50 --pages-per-report 4 --workers 1
+    python -m benchmarks.bench_unit_match --sizes 1000 10000 50000
+    python -m benchmarks.synthetic_pdf saida.pdf --reports 20
+"""
@@ -0,0 +1,107 @@
+"""
+Times the PDF path of an analysis (Etapa 0 header, Etapa 2 aggregation and the merge
+stages) on a synthetic multi-report MDL PDF, and reports pages/s, peak RSS and the time
+per stage. Stage times come from the tracing spans, so they match what a trace shows;
+with --workers above 1 the table extraction runs in other processes and its columns
+stay at zero (their spans go to the per-worker trace files).
+
+    python -m benchmarks.bench_aggregate --reports 50 --pages-per-report 4 --workers 1 --repeat 3
+"""
+import argparse
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from collections import defaultdict
+
+import tracing
+
+from pdf_parser import PdfDocumentSession, read_pdf_header, read_pdf_yearly_data, build_final_report
+from benchmarks.synthetic_pdf import FUNCOES, generate_mdl_pdf
+from benchmarks.synthetic_units import synthetic_unidades
+
+# Spans summed per run; nested spans overlap their parents, so the columns do not add up.
+STAGE_SPANS = (
+    'read_pdf_header', 'scan_report_boundaries', 'extract_boundary_text',
+    'extract_report_funcao_tuples', 'extract_tables', 'build_final_report',
+)
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its finished children (pool workers), in MB."""
+    try:
+        import resource
+    except ImportError:
+        # Windows: psutil, when installed, only gives the current process's peak.
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 2**20
+        except (ImportError, AttributeError):
+            return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    scale = 1 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return max(own, children) / 2**20
+
+def stage_seconds(tracer, first_event):
+    totals = defaultdict(float)
+    for event in tracer.events[first_event:]:
+        if event['name'] in STAGE_SPANS:
+            totals[event['name']] += event['dur'] / 1e6
+    return totals
+
+def run_once(pdf_path, unidades_data, funcoes_data, workers):
+    log = io.StringIO()
+    with PdfDocumentSession(pdf_path) as pdf_session:
+        read_pdf_header(pdf_session, log, unidades_data)
+        pdf_data = read_pdf_yearly_data(pdf_session, log, unidades_data, max_workers=workers)
+        page_count = len(pdf_session.pdf.pages)
+    build_final_report(pdf_data, None, pdf_session.data_inicio or "Não encontrada", funcoes_data, log)
+    return page_count, sum(len(rows) for rows in pdf_data.values())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark da análise de PDFs MDL sintéticos.")
+    parser.add_argument('--reports', type=int, default=20)
+    parser.add_argument('--old-reports', type=int, default=5, help="Relatórios anteriores a 05/2014 (só passam pela varredura).")
+    parser.add_argument('--pages-per-report', type=int, default=3)
+    parser.add_argument('--rows-per-page', type=int, default=8)
+    parser.add_argument('--units', type=int, default=2000, help="Tamanho da tabela de unidades sintética.")
+    parser.add_argument('--workers', type=int, default=1, help="pdf_workers da análise (0 = um por CPU).")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--pdf', help="Usa este PDF em vez de gerar um sintético.")
+    args = parser.parse_args(argv)
+
+    logging.getLogger("pdfminer").setLevel(logging.ERROR)
+    work_dir = tempfile.mkdtemp(prefix="bench_mdl_")
+    # The spans are what the stage times are read from; the trace file itself is a by-product.
+    tracer = tracing.enable_tracing(os.path.join(work_dir, "trace.json"))
+
+    unidades_data = synthetic_unidades(args.units)
+    # Every generated code is known, so the merge never asks the DB for a missing one.
+    funcoes_data = {code: {'descricao': description, 'classificacao': 'Magistério'} for code, description in FUNCOES}
+    pdf_path = args.pdf
+    if not pdf_path:
+        pdf_path = os.path.join(work_dir, "sintetico.pdf")
+        generate_mdl_pdf(pdf_path, args.reports, args.pages_per_report, args.rows_per_page,
+                         unidades_data=unidades_data, old_reports=args.old_reports)
+
+    print(f"PDF: {pdf_path} ({os.path.getsize(pdf_path) / 1024:.0f} KB), workers={args.workers}")
+    header = f"{'exec':>4} {'páginas':>7} {'linhas':>6} {'tempo':>7} {'pág/s':>7}  " + "  ".join(f"{name}" for name in STAGE_SPANS)
+    print(header)
+    for run in range(1, args.repeat + 1):
+        first_event = len(tracer.events)
+        started = time.perf_counter()
+        page_count, row_count = run_once(pdf_path, unidades_data, funcoes_data, args.workers)
+        elapsed = time.perf_counter() - started
+        stages = stage_seconds(tracer, first_event)
+        print(f"{run:>4} {page_count:>7} {row_count:>6} {elapsed:>6.2f}s {page_count / elapsed:>7.1f}  "
+              + "  ".join(f"{stages.get(name, 0.0):>{len(name)}.3f}" for name in STAGE_SPANS))
+
+    rss = peak_rss_mb()
+    print(f"RSS máximo: {rss:.0f} MB" if rss is not None else "RSS máximo: indisponível nesta plataforma")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Times find_best_unit_match against synthetic SGDP_UNIDADES tables of growing size:
+index build, matches per second (exact, misspelled and unknown names mixed, as they
+come from the MAINFRAME grid) and, optionally, the old full-scan matcher for comparison.
+
+    python -m benchmarks.bench_unit_match --sizes 1000 5000 10000 50000 --queries 300
+"""
+import argparse
+import time
+
+from pdf_parser import find_best_unit_match
+from unit_index import _full_scan_match, unit_index_for
+from benchmarks.synthetic_units import synthetic_unidades, mainframe_unit_names
+
+def bench_size(size, query_count, full_scan_queries, seed):
+    unidades_data = synthetic_unidades(size, seed)
+    queries = mainframe_unit_names(unidades_data, query_count, seed)
+
+    started = time.perf_counter()
+    unit_index_for(unidades_data)
+    build_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    matches = [find_best_unit_match(name, unidades_data) for name in queries]
+    match_seconds = time.perf_counter() - started
+    matched = sum(unit is not None for unit in matches)
+
+    line = (f"{size:>7} {build_seconds:>9.3f}s {query_count / match_seconds:>10.0f} "
+            f"{match_seconds / query_count * 1e3:>9.3f}ms {matched / query_count:>8.0%}")
+    if full_scan_queries:
+        sample = queries[:full_scan_queries]
+        started = time.perf_counter()
+        scan_matches = [_full_scan_match(name, unidades_data) for name in sample]
+        scan_seconds = time.perf_counter() - started
+        agreement = sum(a is b for a, b in zip(scan_matches, matches)) / len(sample)
+        line += f" {scan_seconds / len(sample) * 1e3:>12.1f}ms {agreement:>9.0%}"
+    print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de find_best_unit_match com tabelas de unidades sintéticas.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 10000, 50000], help="Unidades em cada tabela.")
+    parser.add_argument('--queries', type=int, default=500, help="Nomes do MAINFRAME procurados por tabela.")
+    parser.add_argument('--full-scan', type=int, default=0, metavar='N',
+                        help="Compara também com a varredura completa em N nomes (lenta em tabelas grandes).")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    header = f"{'unidades':>7} {'índice':>10} {'buscas/s':>10} {'por busca':>11} {'achados':>8}"
+    if args.full_scan:
+        header += f" {'varredura':>14} {'iguais':>9}"
+    print(header)
+    for size in args.sizes:
+        bench_size(size, args.queries, args.full_scan, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Writes synthetic multi-report MDL PDFs: each report starts with "Página 1 de N" and the
+CPF/Nome/Data Consulta block, its first page has the Vínculo/Lotação table, and every
+page has a Função/Lotação/Dt Inicial/Dt Final table. The PDF is written directly (one
+Helvetica font, text and ruled tables), so no PDF library is needed.
+
+    python -m benchmarks.synthetic_pdf saida.pdf --reports 20 --pages-per-report 3
+"""
+import argparse
+import random
+
+from datetime import date, timedelta
+
+PAGE_WIDTH, PAGE_HEIGHT = 842, 595
+ROW_HEIGHT = 14
+FUNCOES = (
+    ('036', 'PROFESSOR'), ('037', 'PROFESSOR DE APOIO'), ('040', 'AUXILIAR ADMINISTRATIVO'),
+    ('109', 'COORDENADOR PEDAGOGICO'), ('141', 'DIRETOR'), ('004', 'SECRETARIO GERAL'),
+)
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def _text(x, y, text, size=9):
+    return f"BT /F1 {size} Tf {x} {y} Td ({_escape(text)}) Tj ET"
+
+def _table(x0, top, column_widths, rows):
+    """Ruled table (so pdfplumber's extract_tables finds it), one text line per cell."""
+    width = sum(column_widths)
+    ops = [f"{x0} {top - r * ROW_HEIGHT} m {x0 + width} {top - r * ROW_HEIGHT} l S" for r in range(len(rows) + 1)]
+    x = x0
+    for c in range(len(column_widths) + 1):
+        ops.append(f"{x} {top} m {x} {top - len(rows) * ROW_HEIGHT} l S")
+        if c < len(column_widths):
+            x += column_widths[c]
+    for r, row in enumerate(rows):
+        x = x0
+        for width_, cell in zip(column_widths, row):
+            ops.append(_text(x + 2, top - r * ROW_HEIGHT - 10, cell, size=7))
+            x += width_
+    return ops
+
+def write_pdf(path, page_streams):
+    """Writes a PDF with one page per content stream (a list of operator strings)."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    kids = []
+    for ops in page_streams:
+        stream = "\n".join(ops).encode('cp1252')
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>".encode()
+        )
+        kids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{k} 0 R' for k in kids)}] /Count {len(kids)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_offset = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+    with open(path, 'wb') as f:
+        f.write(out)
+
+def report_pages(cpf, name, data_consulta, page_count, rows_per_page, lotacoes, rng):
+    """Content streams for one report consulted on `data_consulta` (a date)."""
+    pages = []
+    default_lotacao = rng.choice(lotacoes)
+    for page_number in range(1, page_count + 1):
+        ops = [_text(700, 570, f"Página {page_number} de {page_count}")]
+        if page_number == 1:
+            ops += [_text(40, 540, "CPF Nome Data Consulta Vínculo"),
+                    _text(40, 528, f"{cpf} {name} {data_consulta:%d/%m/%Y} 1"),
+                    _text(40, 500, "Cargo Data Início Data Fim"),
+                    _text(40, 488, "PROFESSOR 02/08/1999")]
+            ops += _table(40, 470, [80, 260], [["Vínculo", "Lotação"], ["1", default_lotacao]])
+        rows = [["Função", "Lotação", "Dt Inicial", "Dt Final"]]
+        for _ in range(rows_per_page):
+            code, description = rng.choice(FUNCOES)
+            start = data_consulta - timedelta(days=rng.randint(30, 3000))
+            end = start + timedelta(days=rng.randint(10, 400))
+            rows.append([f"{code} - {description}", rng.choice(lotacoes), f"{start:%d/%m/%Y}", f"{end:%d/%m/%Y}"])
+        top = 420 if page_number == 1 else 540
+        ops += _table(40, top, [150, 300, 80, 80], rows)
+        pages.append(ops)
+    return pages
+
+def generate_mdl_pdf(path, reports=10, pages_per_report=3, rows_per_page=5, unidades_data=None,
+                     old_reports=0, seed=0):
+    """
+    Writes a multi-report MDL PDF and returns its page count. Lotações are taken from
+    `unidades_data` when given (so they resolve to known units); `old_reports` extra
+    reports are dated before 05/2014 and must be skipped by the parser.
+    """
+    rng = random.Random(seed)
+    if unidades_data:
+        lotacoes = sorted({unit['display_string'] for unit in unidades_data.values()})[:500]
+    else:
+        lotacoes = ["8992 - C.E. ALFREDO NASSER", "1001 - E.E. JARDIM AMERICA"]
+
+    report_dates = [date(2013, 1, 10) + timedelta(days=30 * i) for i in range(old_reports)]
+    report_dates += [date(2014, 6, 10) + timedelta(days=45 * i) for i in range(reports)]
+    page_streams = []
+    for data_consulta in report_dates:
+        page_streams += report_pages(
+            "123.456.789-00", "MARIA DA SILVA", data_consulta, pages_per_report, rows_per_page, lotacoes, rng
+        )
+    write_pdf(path, page_streams)
+    return len(page_streams)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera um PDF MDL sintético com vários relatórios.")
+    parser.add_argument('output', help="Arquivo PDF a gravar.")
+    parser.add_argument('--reports', type=int, default=10, help="Relatórios válidos (>= 05/2014).")
+    parser.add_argument('--old-reports', type=int, default=0, help="Relatórios anteriores a 05/2014 (ignorados pela análise).")
+    parser.add_argument('--pages-per-report', type=int, default=3)
+    parser.add_argument('--rows-per-page', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    pages = generate_mdl_pdf(args.output, args.reports, args.pages_per_report, args.rows_per_page,
+                             old_reports=args.old_reports, seed=args.seed)
+    print(f"{args.output}: {pages} páginas")
+
+if __name__ == "__main__":
+    main()
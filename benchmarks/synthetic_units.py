@@ -0,0 +1,55 @@
+import random
+
+from db_utils import build_unidades_data
+
+PREFIXES = ('E.E.', 'C.E.', 'ESC. EST.', 'COLEGIO ESTADUAL', 'CEPI', 'ESCOLA ESTADUAL', 'C.M.E.I.', 'CENTRO DE EDUCACAO')
+WORDS = (
+    'JOSE MARIA ALFREDO NASSER SANTOS DUMONT RUI BARBOSA DOM PEDRO II JARDIM AMERICA VILA NOVA '
+    'SETOR SUL PROFESSOR JOAO BATISTA SAO FRANCISCO NOSSA SENHORA APARECIDA GOIANIA ANAPOLIS '
+    'PADRE ANCHIETA CASTELO BRANCO TIRADENTES CORA CORALINA OLAVO BILAC MONTEIRO LOBATO LUIZ '
+    'CARLOS ANTONIO AUGUSTA BERNARDO SAYAO PEDRO LUDOVICO TEIXEIRA RIO VERDE CATALAO ITUMBIARA'
+).split()
+
+def synthetic_unit_rows(count, seed=0):
+    """(mdl, inep, nome_folha) rows shaped like the SGDP_UNIDADES query, with school-like names."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        name = f"{rng.choice(PREFIXES)} {' '.join(rng.sample(WORDS, rng.randint(2, 5)))}"
+        rows.append((str(1000 + i), str(52000000 + i), name))
+    return rows
+
+def synthetic_unidades(count, seed=0):
+    """A unidades_data dict (keyed by MDL and INEP codes) with `count` units."""
+    return build_unidades_data(synthetic_unit_rows(count, seed))
+
+def _misspell(name, rng):
+    chars = list(name)
+    for _ in range(rng.randint(1, 4)):
+        position = rng.randrange(len(chars))
+        operation = rng.random()
+        if operation < 0.3 and len(chars) > 1:
+            chars.pop(position)
+        elif operation < 0.6:
+            chars.insert(position, rng.choice('ABCDEO .'))
+        else:
+            chars[position] = rng.choice('ABCDEO')
+    return ''.join(chars)
+
+def mainframe_unit_names(unidades_data, count, seed=0, exact_share=0.4, unknown_share=0.1):
+    """
+    Unit names as they come from the MAINFRAME grid: some exactly as in the table
+    (up to case and periods), most slightly misspelled, and a few not in the table at all.
+    """
+    rng = random.Random(seed)
+    names = sorted({unit['nome_folha'] for unit in unidades_data.values()})
+    queries = []
+    for _ in range(count):
+        draw = rng.random()
+        if draw < unknown_share:
+            queries.append(f"ESCOLA {' '.join(rng.sample(WORDS, 3))} {rng.randint(1, 999)}")
+        elif draw < unknown_share + exact_share:
+            queries.append(rng.choice(names).replace('.', '').lower())
+        else:
+            queries.append(_misspell(rng.choice(names), rng))
+    return queries
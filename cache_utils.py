@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+
+from collections import OrderedDict
+
+from db_utils import resource_path, load_app_config
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """Returns the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class JsonLruCache:
+    """
+    Small on-disk cache with one JSON file per entry, evicted in LRU order.
+    The file's mtime is the recency stamp: it is refreshed on every hit, and the
+    oldest files are removed once the directory holds more than `max_entries`.
+    """
+    def __init__(self, cache_dir, max_entries=200, enabled=True):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.enabled = enabled
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+            os.utime(path, None)
+            return payload
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, payload):
+        if not self.enabled:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._entry_path(key)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            self._evict()
+        except OSError as e:
+            print(f"AVISO: Não foi possível gravar o cache em {self.cache_dir}: {e}")
+
+    def _evict(self):
+        entries = [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir) if name.endswith('.json')
+        ]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=os.path.getmtime)
+        for path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.json'):
+                os.remove(os.path.join(self.cache_dir, name))
+
+class PdfResultCache(JsonLruCache):
+    """
+    Parsed PDF results keyed by the file's content hash and the parser version,
+    so a repeat analysis of an unchanged file skips PDF parsing entirely.
+    """
+    def make_key(self, pdf_path, *key_parts):
+        digest = hashlib.sha256(file_digest(pdf_path).encode())
+        for part in key_parts:
+            digest.update(b'\0' + str(part).encode('utf-8'))
+        return digest.hexdigest()
+
+def cache_directory(config=None):
+    """The folder for the on-disk caches ([cache] directory, default 'cache' next to config.ini)."""
+    config = config or load_app_config()
+    return resource_path(config.get('cache', 'directory', fallback='cache'))
+
+def open_pdf_result_cache():
+    """Builds the PDF result cache from the optional [cache] section of config.ini."""
+    config = load_app_config()
+    return PdfResultCache(
+        cache_directory(config),
+        max_entries=config.getint('cache', 'max_entries', fallback=200),
+        enabled=config.getboolean('cache', 'enabled', fallback=True),
+    )
+
+class UnitResolutionMemo:
+    """
+    MAINFRAME unit name -> SGDP unit resolutions that survive restarts, in one JSON file.
+    Entries are keyed by the normalized MAINFRAME name and hold the matched unit key
+    (None when nothing matched) and its score. The whole file is discarded when the
+    SGDP_UNIDADES fingerprint changes, and the least recently used names are dropped
+    beyond `max_entries`.
+    """
+    def __init__(self, path, fingerprint, max_entries=5000, enabled=True):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._entries = OrderedDict()
+        if enabled:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return
+        if payload.get('fingerprint') == self.fingerprint:
+            # The file is written least recently used first.
+            self._entries = OrderedDict((name, tuple(entry)) for name, entry in payload.get('entries', {}).items())
+
+    def get(self, normalized_name):
+        """Returns (unit_key, score) or None if the name was never resolved."""
+        entry = self._entries.get(normalized_name)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(normalized_name)
+        return entry
+
+    def put(self, normalized_name, unit_key, score):
+        self._entries[normalized_name] = (unit_key, score)
+        self._entries.move_to_end(normalized_name)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._dirty = True
+
+    def save(self):
+        if not self.enabled or not self._dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'fingerprint': self.fingerprint, 'entries': self._entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except OSError as e:
+            print(f"AVISO: Não foi possível gravar o cache de unidades em {self.path}: {e}")
+
+    def summary(self):
+        return f"{self.hits} do cache, {self.misses} calculadas"
+
+def open_unit_resolution_memo(fingerprint):
+    """Builds the unit-name memo for the given SGDP_UNIDADES fingerprint from the [cache] settings."""
+    config = load_app_config()
+    return UnitResolutionMemo(
+        # Kept in a subfolder, so the PDF cache's eviction never counts it.
+        os.path.join(cache_directory(config), 'unidades', 'resolutions.json'),
+        fingerprint,
+        max_entries=config.getint('cache', 'unit_memo_entries', fallback=5000),
+        enabled=config.getboolean('cache', 'enabled', fallback=True),
+    )
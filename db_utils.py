@@ -1,8 +1,17 @@
 import pyodbc
-from tkinter import messagebox
 import configparser
+import hashlib
+import json
 import os
 import sys
+import threading
+import time
+
+from contextlib import contextmanager
+from datetime import datetime
+
+from unit_index import unit_index_for
+from tracing import span, traced
 
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -13,19 +22,27 @@ def resource_path(relative_path):
 
     return os.path.join(base_path, relative_path)
 
-def load_unidades_from_db(conn):
+def load_app_config():
     """
-    Loads unit/location data from the SGDP_UNIDADES table using a provided connection.
+    Reads config.ini for the optional, non-database settings.
+    A missing file simply yields an empty configuration, so callers must use fallbacks.
+    """
+    config = configparser.ConfigParser()
+    config.read(resource_path('config.ini'))
+    return config
+
+UNIDADES_QUERY = "SELECT mdl, inep, nome_folha FROM dbo.SGDP_UNIDADES"
+FUNCOES_QUERY = "SELECT id, descricao, classificacao FROM dbo.SGDP_FUNCOES"
+
+def build_unidades_data(rows):
+    """
+    Builds the units dictionary from (mdl, inep, nome_folha) rows.
     Returns a dictionary mapping INEP and MDL codes to a standard format.
     """
     unidades_data = {}
-    cursor = conn.cursor()
-    cursor.execute("SELECT mdl, inep, nome_folha FROM dbo.SGDP_UNIDADES")
-    
-    for row in cursor.fetchall():
-        mdl_code = str(row.mdl).strip() if row.mdl else None
-        inep_code = str(row.inep).strip() if row.inep else None
-        nome_folha = row.nome_folha
+    for mdl, inep, nome_folha in rows:
+        mdl_code = str(mdl).strip() if mdl else None
+        inep_code = str(inep).strip() if inep else None
 
         if not nome_folha:
             continue
@@ -47,17 +64,33 @@ def load_unidades_from_db(conn):
 
     return unidades_data
 
-def load_funcoes_from_db(conn):
+@traced(category="banco")
+def load_unidades_from_db(conn):
     """
-    Loads function codes, descriptions, and classifications using a provided connection.
+    Loads unit/location data from the SGDP_UNIDADES table using a provided connection.
+    Returns a dictionary mapping INEP and MDL codes to a standard format.
     """
-    funcoes_data = {}
     cursor = conn.cursor()
-    cursor.execute("SELECT id, descricao, classificacao FROM dbo.SGDP_FUNCOES")
-    
-    for row in cursor.fetchall():
-        code = str(row.id).zfill(3)
-        original_classificacao = row.classificacao
+    cursor.execute(UNIDADES_QUERY)
+    return build_unidades_data(cursor.fetchall())
+
+def unidades_fingerprint(unidades_data):
+    """
+    Returns a short hash of the loaded units, used to invalidate caches built
+    against an older SGDP_UNIDADES snapshot.
+    """
+    digest = hashlib.sha256()
+    for key in sorted(unidades_data):
+        digest.update(f"{key}\0{unidades_data[key]['display_string']}\n".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+def build_funcoes_data(rows):
+    """
+    Builds the function codes dictionary (descriptions and classifications) from (id, descricao, classificacao) rows.
+    """
+    funcoes_data = {}
+    for funcao_id, descricao, original_classificacao in rows:
+        code = str(funcao_id).zfill(3)
         
         if original_classificacao and original_classificacao.startswith("Regência"):
             simplified_classificacao = "Magistério"
@@ -65,70 +98,414 @@ def load_funcoes_from_db(conn):
             simplified_classificacao = original_classificacao
         
         funcoes_data[code] = {
-            'descricao': row.descricao,
+            'descricao': descricao,
             'classificacao': simplified_classificacao
         }
         
     return funcoes_data
 
-def load_all_initial_data():
-    """Connects to the DB once by reading credentials from config.ini."""
+@traced(category="banco")
+def load_funcoes_from_db(conn):
+    """
+    Loads function codes, descriptions, and classifications using a provided connection.
+    """
+    cursor = conn.cursor()
+    cursor.execute(FUNCOES_QUERY)
+    return build_funcoes_data(cursor.fetchall())
+
+def _show_error(title, message, show_dialogs, on_error=None):
+    if on_error:
+        on_error(title, message)
+    elif show_dialogs:
+        # Imported here so headless runs (show_dialogs=False) work on Python builds without Tk.
+        from tkinter import messagebox
+        messagebox.showerror(title, message)
+    else:
+        print(f"{title}: {message}", file=sys.stderr)
+
+# --- Local snapshot of the reference tables ---
+SNAPSHOT_VERSION = 1
+# Row count and aggregate checksum: cheap to query, and they change whenever a row does.
+SIGNATURE_QUERIES = {
+    'funcoes': "SELECT COUNT(*), CHECKSUM_AGG(BINARY_CHECKSUM(id, descricao, classificacao)) FROM dbo.SGDP_FUNCOES",
+    'unidades': "SELECT COUNT(*), CHECKSUM_AGG(BINARY_CHECKSUM(mdl, inep, nome_folha)) FROM dbo.SGDP_UNIDADES",
+}
+ROW_QUERIES = {'funcoes': FUNCOES_QUERY, 'unidades': UNIDADES_QUERY}
+DATA_BUILDERS = {'funcoes': build_funcoes_data, 'unidades': build_unidades_data}
+
+def _jsonable_row(row):
+    return [value if value is None or isinstance(value, (int, str)) else str(value) for value in row]
+
+class ReferenceSnapshot:
+    """
+    Last good copy of the SGDP_FUNCOES and SGDP_UNIDADES rows, in a JSON file next to
+    config.ini. Each table keeps the signature (row count, checksum) it was read with,
+    so a refresh only downloads the tables that changed.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.tables = {}
+        self.checked_at = None
+
+    @classmethod
+    def load(cls, path):
+        """Returns the snapshot stored at `path`, or None if there is no usable one."""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if payload.get('version') != SNAPSHOT_VERSION or set(payload.get('tables', {})) != set(ROW_QUERIES):
+            return None
+        snapshot = cls(path)
+        snapshot.tables = payload['tables']
+        snapshot.checked_at = datetime.fromisoformat(payload['checked_at'])
+        return snapshot
+
+    def save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': SNAPSHOT_VERSION, 'checked_at': self.checked_at.isoformat(), 'tables': self.tables}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def age_hours(self):
+        return (datetime.now() - self.checked_at).total_seconds() / 3600
+
+    def build_data(self):
+        return {table: DATA_BUILDERS[table](self.tables[table]['rows']) for table in ROW_QUERIES}
+
+    @traced("ReferenceSnapshot.refresh", category="banco")
+    def refresh(self, conn):
+        """Re-reads the tables whose signature changed, saves the snapshot and returns their names."""
+        changed = []
+        cursor = conn.cursor()
+        for table, signature_query in SIGNATURE_QUERIES.items():
+            signature = _jsonable_row(cursor.execute(signature_query).fetchone())
+            if self.tables.get(table, {}).get('signature') == signature:
+                continue
+            print(f"INFO: Downloading {table} from DB (changed since the last snapshot)...")
+            rows = [_jsonable_row(row) for row in cursor.execute(ROW_QUERIES[table]).fetchall()]
+            self.tables[table] = {'signature': signature, 'rows': rows}
+            changed.append(table)
+        self.checked_at = datetime.now()
+        self.save()
+        return changed
+
+def build_connection_string(config):
+    """Raises KeyError when a [database] setting is missing."""
+    db_config = config['database']
+    return (
+        f"DRIVER={db_config['driver']};"
+        f"SERVER={db_config['server']};"
+        f"DATABASE={db_config['database']};"
+        f"UID={db_config['uid']};"
+        f"PWD={db_config['pwd']};"
+        "TrustServerCertificate=yes;"
+    )
+
+# --- Connection pool ---
+class ConnectionPool:
+    """
+    Small thread-safe pool of pyodbc connections. Connections are opened lazily, at most
+    `max_size` are in use at once, idle ones are reused (checked with SELECT 1 when they
+    sat unused for `health_check_after` seconds), and a connection that raised a
+    pyodbc.Error is discarded instead of going back to the pool. After a failed connect,
+    new connects fail fast for `retry_after` seconds, so an offline DB costs one timeout;
+    reset_backoff() lifts that for an explicit retry.
+    """
+    def __init__(self, connection_string, max_size=4, connect_timeout=5, acquire_timeout=30, health_check_after=60, retry_after=60):
+        self.connection_string = connection_string
+        self.max_size = max_size
+        self.connect_timeout = connect_timeout
+        self.acquire_timeout = acquire_timeout
+        self.health_check_after = health_check_after
+        self.retry_after = retry_after
+        self._unavailable_until = 0.0
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._idle = []
+
+    def _take_idle(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                conn, last_used = self._idle.pop()
+            if time.monotonic() - last_used < self.health_check_after:
+                return conn
+            try:
+                conn.cursor().execute("SELECT 1").fetchone()
+                return conn
+            except pyodbc.Error:
+                self._discard(conn)
+
+    @traced("ConnectionPool.connect", category="banco")
+    def _connect(self):
+        if time.monotonic() < self._unavailable_until:
+            raise pyodbc.Error("08001", "Banco de dados indisponível; nova tentativa em instantes.")
+        try:
+            return pyodbc.connect(self.connection_string, timeout=self.connect_timeout)
+        except pyodbc.Error:
+            self._unavailable_until = time.monotonic() + self.retry_after
+            raise
+
+    def reset_backoff(self):
+        """Lets the next connect reach the DB even if the last one failed moments ago."""
+        self._unavailable_until = 0.0
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
+
+    @contextmanager
+    def connection(self):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise pyodbc.Error("HYT00", "Tempo esgotado aguardando uma conexão livre com o banco de dados.")
+        conn = None
+        try:
+            conn = self._take_idle() or self._connect()
+            yield conn
+        except pyodbc.Error:
+            if conn is not None:
+                self._discard(conn)
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_connection_pool(config=None):
+    """
+    Returns the process-wide pool, created (without connecting) from config.ini on first use.
+    Raises KeyError when a [database] setting is missing.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            config = config or load_app_config()
+            _pool = ConnectionPool(
+                build_connection_string(config),
+                max_size=config.getint('database', 'pool_size', fallback=4),
+            )
+        return _pool
+
+# --- On-demand lookups for codes missing from the loaded data ---
+# Codes the DB did not have either are not asked for again before this many seconds.
+MISSING_CODE_RETRY_SECONDS = 600
+_missing_codes = {}
+_missing_codes_lock = threading.Lock()
+
+def _should_query(kind, code):
+    with _missing_codes_lock:
+        missing_since = _missing_codes.get((kind, code))
+    return missing_since is None or time.monotonic() - missing_since >= MISSING_CODE_RETRY_SECONDS
+
+def _mark_missing(kind, codes):
+    now = time.monotonic()
+    with _missing_codes_lock:
+        for code in codes:
+            _missing_codes[(kind, code)] = now
+
+@traced(category="banco")
+def lookup_funcoes(codes, funcoes_data):
+    """
+    Fetches the function codes missing from `funcoes_data` (e.g. added after startup)
+    through the pool, adds them to it and returns the codes that were found.
+    """
+    missing = sorted(code for code in set(codes) if code not in funcoes_data and code.isdigit() and _should_query('funcao', code))
+    if not missing:
+        return []
+    try:
+        with get_connection_pool().connection() as conn:
+            placeholders = ", ".join("?" * len(missing))
+            rows = conn.cursor().execute(f"{FUNCOES_QUERY} WHERE id IN ({placeholders})", [int(code) for code in missing]).fetchall()
+    except (KeyError, pyodbc.Error) as e:
+        print(f"WARNING: Could not look up Funções {', '.join(missing)} in the DB: {e}")
+        _mark_missing('funcao', missing)
+        return []
+
+    found = build_funcoes_data(rows)
+    funcoes_data.update(found)
+    _mark_missing('funcao', [code for code in missing if code not in found])
+    return sorted(found)
+
+# Units fetched on demand are kept here rather than added to the loaded unidades_data,
+# which the MAINFRAME thread iterates (fingerprint, unit index) while the PDF is parsed.
+# A code the DB did not have either maps to None.
+_fetched_unidades = {}
+_fetched_unidades_lock = threading.Lock()
+# One lock per code being fetched: threads asking for the same code send it only once,
+# while cache hits and lookups of other codes go on during the query.
+_unidade_query_locks = {}
+
+def lookup_unidade(code, unidades_data):
+    """
+    Returns the unit for an MDL or INEP code. Codes missing from `unidades_data` are asked
+    to the DB once and kept in a separate cache; `unidades_data` itself is never changed.
+    """
+    unit_info = unidades_data.get(code)
+    if unit_info is not None:
+        return unit_info
+    if not code.isdigit():
+        return None
+    with _fetched_unidades_lock:
+        unit_info = _fetched_unidades.get(code)
+        query_lock = _unidade_query_locks.setdefault(code, threading.Lock())
+    if unit_info is not None or not _should_query('unidade', code):
+        return unit_info
+
+    with query_lock:
+        # Another thread may have fetched it while this one waited.
+        with _fetched_unidades_lock:
+            unit_info = _fetched_unidades.get(code)
+        if unit_info is not None or not _should_query('unidade', code):
+            return unit_info
+        try:
+            with span("lookup_unidade", "banco", codigo=code), get_connection_pool().connection() as conn:
+                rows = conn.cursor().execute(f"{UNIDADES_QUERY} WHERE mdl = ? OR inep = ?", code, code).fetchall()
+        except (KeyError, pyodbc.Error) as e:
+            print(f"WARNING: Could not look up Unidade {code} in the DB: {e}")
+            _mark_missing('unidade', [code])
+            return None
+
+        with _fetched_unidades_lock:
+            _fetched_unidades.update(build_unidades_data(rows))
+            unit_info = _fetched_unidades.setdefault(code, None)
+        if unit_info is None:
+            _mark_missing('unidade', [code])
+        return unit_info
+
+def fetched_unidades():
+    """Copy of the on-demand unit cache (misses included), for seeding process-pool workers."""
+    with _fetched_unidades_lock:
+        return dict(_fetched_unidades)
+
+def seed_fetched_unidades(fetched):
+    """Loads a copy made by fetched_unidades() into this process's on-demand cache."""
+    now = time.monotonic()
+    with _fetched_unidades_lock, _missing_codes_lock:
+        for code, unit_info in fetched.items():
+            _fetched_unidades.setdefault(code, unit_info)
+            if unit_info is None:
+                _missing_codes.setdefault(('unidade', code), now)
+
+@traced(category="banco")
+def _finish_loading(all_data):
+    print(f"SUCCESS: Loaded {len(all_data['funcoes'])} Funções and {len(all_data['unidades'])} Unidades.")
+    # Built now so the first MAINFRAME lookup does not pay for it.
+    unit_index_for(all_data['unidades'])
+    return all_data
+
+def _refresh_snapshot_in_background(pool, snapshot, on_refresh):
+    try:
+        with pool.connection() as conn:
+            changed = snapshot.refresh(conn)
+        if not changed:
+            print("INFO: Reference data unchanged since the last snapshot.")
+        elif on_refresh:
+            on_refresh(_finish_loading(snapshot.build_data()))
+    except Exception as e:
+        print(f"WARNING: Could not refresh the reference data snapshot, still using the local copy: {e}")
+
+@traced(category="banco")
+def load_all_initial_data(show_dialogs=True, on_refresh=None, on_error=None):
+    """
+    Loads Funções and Unidades, from the local snapshot when there is one, else from the DB.
+
+    A snapshot checked less than [snapshot] refresh_after_hours ago is used as is; an older
+    one is used right away while a background thread checks the DB and downloads only the
+    tables that changed, calling `on_refresh(all_data)` if anything did. A snapshot older
+    than max_offline_days must be refreshed before it is used again.
+    With show_dialogs=False (headless runs) errors are printed to stderr instead of shown in a messagebox;
+    with `on_error(title, message)` they are handed to the caller (e.g. when loading off the Tk thread).
+    """
     all_data = {'funcoes': None, 'unidades': None}
-    conn = None
     
     config = configparser.ConfigParser()
     config_file = resource_path('config.ini')
 
     if not os.path.exists(config_file):
-        messagebox.showerror(
+        _show_error(
             "Erro de Configuração",
             f"O arquivo de configuração '{config_file}' não foi encontrado.\n\n"
-            "Por favor, crie o arquivo com as suas credenciais de banco de dados."
+            "Por favor, crie o arquivo com as suas credenciais de banco de dados.",
+            show_dialogs, on_error
         )
         return None
         
     config.read(config_file)
+
+    snapshot = None
+    snapshot_enabled = config.getboolean('snapshot', 'enabled', fallback=True)
+    snapshot_path = resource_path(config.get('snapshot', 'path', fallback='sgdp_snapshot.json'))
+    if snapshot_enabled:
+        snapshot = ReferenceSnapshot.load(snapshot_path)
+
+    if snapshot:
+        age_hours = snapshot.age_hours()
+        max_offline_days = config.getfloat('snapshot', 'max_offline_days', fallback=30)
+        if not max_offline_days or age_hours <= max_offline_days * 24:
+            print(f"INFO: Loading Funções and Unidades from the local snapshot ({age_hours:.1f}h old)...")
+            all_data = _finish_loading(snapshot.build_data())
+            if age_hours >= config.getfloat('snapshot', 'refresh_after_hours', fallback=12):
+                try:
+                    pool = get_connection_pool(config)
+                except KeyError:
+                    return all_data
+                threading.Thread(
+                    target=_refresh_snapshot_in_background, args=(pool, snapshot, on_refresh), daemon=True
+                ).start()
+            return all_data
+        print(f"INFO: The local snapshot is {age_hours / 24:.0f} days old; it must be refreshed from the DB.")
     
     try:
-        db_config = config['database']
-        connection_string = (
-            f"DRIVER={db_config['driver']};"
-            f"SERVER={db_config['server']};"
-            f"DATABASE={db_config['database']};"
-            f"UID={db_config['uid']};"
-            f"PWD={db_config['pwd']};"
-            "TrustServerCertificate=yes;"
-        )
-        conn = pyodbc.connect(connection_string, timeout=5)
-        
-        print("INFO: Loading Funções from DB...")
-        all_data['funcoes'] = load_funcoes_from_db(conn)
-        print(f"SUCCESS: Loaded {len(all_data['funcoes'])} Funções.")
+        pool = get_connection_pool(config)
+        # Loading is asked for by the user (startup, "Tentar novamente"), so it always reaches the DB.
+        pool.reset_backoff()
+        with pool.connection() as conn:
+            if snapshot_enabled:
+                snapshot = snapshot or ReferenceSnapshot(snapshot_path)
+                print("INFO: Loading Funções and Unidades from DB...")
+                snapshot.refresh(conn)
+                return _finish_loading(snapshot.build_data())
 
-        print("INFO: Loading Unidades (Lotações) from DB...")
-        all_data['unidades'] = load_unidades_from_db(conn)
-        print(f"SUCCESS: Loaded {len(all_data['unidades'])} Unidades.")
-        
-        return all_data
+            print("INFO: Loading Funções from DB...")
+            all_data['funcoes'] = load_funcoes_from_db(conn)
+
+            print("INFO: Loading Unidades (Lotações) from DB...")
+            all_data['unidades'] = load_unidades_from_db(conn)
+        return _finish_loading(all_data)
     
     except KeyError as e:
-        messagebox.showerror(
+        _show_error(
             "Erro de Configuração",
-            f"A chave '{e}' está faltando na seção [database] do arquivo {config_file}."
+            f"A chave '{e}' está faltando na seção [database] do arquivo {config_file}.",
+            show_dialogs, on_error
         )
         return None
     except pyodbc.Error as ex:
         sqlstate = ex.args[0]
         print(f"DATABASE ERROR: {sqlstate} - {ex}")
-        messagebox.showerror(
+        _show_error(
             "Erro de Conexão com o Banco de Dados",
-            f"Não foi possível conectar ao banco de dados.\n\nVerifique as credenciais no arquivo {config_file} e a conexão de rede.\n\nDetalhes: {ex}"
+            f"Não foi possível conectar ao banco de dados.\n\nVerifique as credenciais no arquivo {config_file} e a conexão de rede.\n\nDetalhes: {ex}",
+            show_dialogs, on_error
         )
         return None
     except Exception as e:
         print(f"UNEXPECTED ERROR during DB load: {e}")
-        messagebox.showerror("Erro Inesperado", f"Ocorreu um erro inesperado ao carregar os dados das funções:\n{e}")
+        _show_error("Erro Inesperado", f"Ocorreu um erro inesperado ao carregar os dados das funções:\n{e}", show_dialogs, on_error)
         return None
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
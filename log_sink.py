@@ -0,0 +1,166 @@
+import io
+import logging
+import logging.handlers
+import os
+import queue
+
+try:
+    import tkinter as tk
+except ImportError:
+    # Only BufferedLogSink needs Tk; the headless batch CLI imports this module without it.
+    tk = None
+
+from db_utils import resource_path, load_app_config
+
+# Queued in place of text to empty the widget, so a clear stays in order with the writes around it.
+_CLEAR = object()
+
+class BufferedLogSink(io.TextIOBase):
+    """
+    stdout/stderr replacement for the log widget. write() only queues the text, from
+    any thread; a Tk timer drains the queue every `flush_interval_ms` and inserts it
+    in a single call. The widget keeps at most `max_lines` lines (older ones are
+    removed from the screen and counted as dropped), while `log_file`, when given,
+    receives everything through a RotatingFileHandler.
+    """
+    def __init__(self, widget, max_lines=5000, flush_interval_ms=100, log_file=None,
+                 max_bytes=5 * 1024 * 1024, backup_count=3):
+        super().__init__()
+        self.widget = widget
+        self.max_lines = max_lines
+        self.flush_interval_ms = flush_interval_ms
+        self.log_file = log_file
+        self.flushed_lines = 0
+        self.dropped_lines = 0
+        self.flush_count = 0
+        self._queue = queue.SimpleQueue()
+        self._file_handler = None
+        if log_file:
+            try:
+                os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+                self._file_handler = logging.handlers.RotatingFileHandler(
+                    log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+                )
+                self._file_handler.terminator = ''
+            except OSError as e:
+                self.log_file = None
+                self._queue.put(f"AVISO: Não foi possível abrir o arquivo de log {log_file}: {e}\n")
+        self._closed = False
+        self._timer_id = self.widget.after(self.flush_interval_ms, self._on_timer)
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        if s:
+            self._queue.put(s)
+        return len(s)
+
+    def clear(self):
+        """Empties the widget once everything written before this call is shown."""
+        self._queue.put(_CLEAR)
+
+    def flush(self):
+        # Text is shown on the next timer tick; nothing to do for callers.
+        pass
+
+    def _drain(self):
+        chunks = []
+        while True:
+            try:
+                chunks.append(self._queue.get_nowait())
+            except queue.Empty:
+                return chunks
+
+    def _on_timer(self):
+        self._timer_id = None
+        try:
+            self.flush_pending()
+        finally:
+            if not self._closed:
+                self._timer_id = self.widget.after(self.flush_interval_ms, self._on_timer)
+
+    def flush_pending(self):
+        """Moves the queued text to the log file and the widget. Must run on the Tk thread."""
+        chunks = self._drain()
+        if not chunks:
+            return
+        # Split on clears: each segment is inserted after the clears that precede it.
+        segments = [[]]
+        for chunk in chunks:
+            if chunk is _CLEAR:
+                segments.append(None)
+                segments.append([])
+            else:
+                segments[-1].append(chunk)
+
+        self.widget.config(state=tk.NORMAL)
+        try:
+            for segment in segments:
+                if segment is None:
+                    self.widget.delete('1.0', tk.END)
+                    continue
+                text = ''.join(segment)
+                if not text:
+                    continue
+                self._write_file(text)
+                self.widget.insert(tk.END, text)
+                self.flushed_lines += text.count('\n')
+            self._trim()
+            self.widget.see(tk.END)
+        finally:
+            self.widget.config(state=tk.DISABLED)
+        self.flush_count += 1
+
+    def _write_file(self, text):
+        if self._file_handler is None:
+            return
+        # One record per batch; rotation happens between batches.
+        self._file_handler.emit(logging.makeLogRecord({'msg': text}))
+
+    def _trim(self):
+        if not self.max_lines:
+            return
+        line_count = int(self.widget.index('end-1c').split('.')[0])
+        excess = line_count - self.max_lines
+        if excess > 0:
+            self.widget.delete('1.0', f'{excess + 1}.0')
+            self.dropped_lines += excess
+
+    def summary(self):
+        text = f"{self.flushed_lines} linhas de log em {self.flush_count} atualizações da tela"
+        if self.dropped_lines:
+            text += f", {self.dropped_lines} removidas da tela"
+        if self.log_file:
+            text += f"; log completo em {self.log_file}"
+        return text
+
+    def close(self):
+        """Stops the timer and writes whatever is still queued to the log file."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._timer_id is not None:
+            try:
+                self.widget.after_cancel(self._timer_id)
+            except tk.TclError:
+                pass
+        pending = ''.join(chunk for chunk in self._drain() if chunk is not _CLEAR)
+        if pending:
+            self._write_file(pending)
+        if self._file_handler is not None:
+            self._file_handler.close()
+        super().close()
+
+def open_log_sink(widget):
+    """Builds the log sink from the optional [log] section of config.ini."""
+    config = load_app_config()
+    log_file = config.get('log', 'file', fallback='logs/processamento.log')
+    return BufferedLogSink(
+        widget,
+        max_lines=config.getint('log', 'widget_max_lines', fallback=5000),
+        flush_interval_ms=config.getint('log', 'flush_interval_ms', fallback=100),
+        log_file=resource_path(log_file) if log_file else None,
+        max_bytes=config.getint('log', 'max_file_kb', fallback=5120) * 1024,
+        backup_count=config.getint('log', 'backup_count', fallback=3),
+    )
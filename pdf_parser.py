@@ -1,44 +1,189 @@
-import tkinter as tk
 import pdfplumber
 import threading
 import time
 import re
 import sys
 import io
+import os
+import multiprocessing
+import json
 
-from datetime import datetime
-from difflib import SequenceMatcher
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 from collections import defaultdict
-from tkinter import filedialog, scrolledtext, messagebox, ttk
+try:
+    import tkinter as tk
+    from tkinter import filedialog, scrolledtext, messagebox, ttk
+except ImportError:
+    # Python builds without Tk (e.g. a server running batch_cli.py); only PdfAnalyzerApp needs it.
+    tk = None
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from webdriver_manager.chrome import ChromeDriverManager
-from selenium.common.exceptions import NoSuchElementException
+from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.support import expected_conditions as EC
 
-from db_utils import load_all_initial_data
-
-# --- TextRedirector ---
-class TextRedirector(io.StringIO):
-    def __init__(self, widget):
-        super().__init__()
-        self.widget = widget
+from db_utils import load_all_initial_data, load_app_config, resource_path, unidades_fingerprint, lookup_funcoes, lookup_unidade, fetched_unidades, seed_fetched_unidades
+from cache_utils import open_pdf_result_cache, open_unit_resolution_memo, cache_directory
+from unit_index import unit_index_for, normalize_unit_name
+from records import FuncaoRecord
+from timeline import consolidate_records, covered_days_by_year
+from log_sink import open_log_sink
+from progress import ProgressTracker
+from tracing import span, traced, enable_tracing, init_worker_tracing, write_trace, write_worker_trace
+from report_export import build_report_model, render_text, write_report_files, parse_export_formats, EXPORT_FORMATS
+
+class StageLogWriter:
+    """
+    Prefixes every line a pipeline stage writes, so stages running at the same time
+    stay readable in the shared log. Everything else is delegated to the target.
+    """
+    def __init__(self, target, prefix):
+        self.target = target
+        self.prefix = prefix
+        self._at_line_start = True
 
     def write(self, s):
-        self.widget.after_idle(self._write_to_widget, s)
-
-    def _write_to_widget(self, s):
-        self.widget.config(state=tk.NORMAL)
-        self.widget.insert(tk.END, s)
-        self.widget.see(tk.END)
-        self.widget.config(state=tk.DISABLED)
+        parts = []
+        for line in s.splitlines(keepends=True):
+            if self._at_line_start:
+                parts.append(self.prefix)
+            parts.append(line)
+            self._at_line_start = line.endswith('\n')
+        if parts:
+            self.target.write(''.join(parts))
 
     def flush(self):
-        pass
+        self.target.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.target, name)
+
+# --- Page Extraction Cache ---
+class PageExtractionCache:
+    """
+    Per-page memo for pdfplumber's extract_text/extract_tables.
+    Results are keyed by page number, so each page is analysed at most once per method.
+    Hits and misses are counted to show how much layout analysis was saved.
+    """
+    def __init__(self):
+        self._text = {}
+        self._tables = {}
+        self._boundary_text = {}
+        self.hits = 0
+        self.misses = 0
+
+    def page(self, pdf_page):
+        return CachedPage(pdf_page, self)
+
+    def text(self, pdf_page):
+        return self._get(self._text, pdf_page, pdf_page.extract_text, "extract_text")
+
+    def tables(self, pdf_page):
+        return self._get(self._tables, pdf_page, pdf_page.extract_tables, "extract_tables")
+
+    def boundary_text(self, pdf_page):
+        return self._get(self._boundary_text, pdf_page, lambda: extract_boundary_text(pdf_page), "extract_boundary_text")
+
+    def _get(self, store, pdf_page, compute, label):
+        key = pdf_page.page_number
+        if key in store:
+            self.hits += 1
+            return store[key]
+        self.misses += 1
+        with span(label, "pdf", pagina=key):
+            value = compute()
+        store[key] = value
+        return value
+
+    def clear(self):
+        self._text.clear()
+        self._tables.clear()
+        self._boundary_text.clear()
+
+    def summary(self):
+        return f"{self.hits} reaproveitadas, {self.misses} extrações"
+
+class CachedPage:
+    """Wraps a pdfplumber page so that every consumer goes through the PageExtractionCache."""
+    def __init__(self, pdf_page, cache):
+        self._page = pdf_page
+        self._cache = cache
+
+    def extract_text(self):
+        return self._cache.text(self._page)
+
+    def extract_tables(self):
+        return self._cache.tables(self._page)
+
+    def extract_boundary_text(self):
+        return self._cache.boundary_text(self._page)
+
+    def __getattr__(self, name):
+        return getattr(self._page, name)
+
+# --- PDF Document Session ---
+class PdfDocumentSession:
+    """
+    Keeps a single pdfplumber handle open for the whole analysis of one MDL PDF.
+    The header extractors and the multi-report aggregation share this handle
+    and its PageExtractionCache, so the first page is extracted only once.
+    """
+    def __init__(self, pdf_path):
+        self.pdf_path = pdf_path
+        self._pdf = None
+        self.page_cache = PageExtractionCache()
+        # Filled by read_pdf_header.
+        self.cpf = None
+        self.name = None
+        self.data_inicio = None
+        self.result_cache = None
+        self.result_cache_key = None
+        self.cached_yearly_data = None
+
+    @property
+    def pdf(self):
+        # Opened lazily so that errors surface inside the callers' own try blocks.
+        if self._pdf is None:
+            self._pdf = pdfplumber.open(self.pdf_path)
+        return self._pdf
+
+    @property
+    def first_page_text(self):
+        return self.page_cache.text(self.pdf.pages[0])
+
+    def close(self):
+        if self._pdf is not None:
+            self._pdf.close()
+            self._pdf = None
+        self.page_cache.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+@contextmanager
+def _open_pdf(pdf_source):
+    """
+    Yields (pdf, page_cache) for a path or a PdfDocumentSession.
+    A session's handle and cache are reused and left open.
+    """
+    if isinstance(pdf_source, PdfDocumentSession):
+        yield pdf_source.pdf, pdf_source.page_cache
+    else:
+        with pdfplumber.open(pdf_source) as pdf:
+            yield pdf, PageExtractionCache()
+
+def _read_first_page_text(pdf_source):
+    with _open_pdf(pdf_source) as (pdf, page_cache):
+        return page_cache.text(pdf.pages[0])
 
 # --- PDF Parsing Logic ---
 def extract_year_from_date_string(date_str):
@@ -47,18 +192,20 @@ def extract_year_from_date_string(date_str):
     if match: return match.group(1)
     return None
 
-def is_start_of_new_report(page_text):
-    if not page_text: return None
+FIRST_PAGE_MARKER_RE = re.compile(r"Página\s*1(?:$|\s*de\s*\d+)", re.IGNORECASE | re.MULTILINE)
 
-    page_marker_match = re.search(r"Página\s*1(?:$|\s*de\s*\d+)", page_text, re.IGNORECASE | re.MULTILINE)
-    if not page_marker_match:
-        return None
+# Fractions of the page height that hold the report header ("Nome / Data Consulta")
+# and the footer; only these bands are read when looking for report boundaries.
+HEADER_BAND_RATIO = 0.35
+FOOTER_BAND_RATIO = 0.08
 
-    match = re.search(r"Nome\s+Data Consulta\s+Vínculo\s*\n(?:.|\n)*?(\d{2}/\d{2}/\d{4})", page_text)
+def find_data_consulta(text):
+    """Returns the date under the 'CPF / Nome / Data Consulta' header in `text`, or None."""
+    match = re.search(r"Nome\s+Data Consulta\s+Vínculo\s*\n(?:.|\n)*?(\d{2}/\d{2}/\d{4})", text)
     if match:
         return match.group(1)
 
-    page_text_lines = page_text.split('\n')
+    page_text_lines = text.split('\n')
     for i, line in enumerate(page_text_lines):
         if "Data Consulta" in line and "CPF" in line and "Nome" in line:
             if i + 1 < len(page_text_lines):
@@ -69,6 +216,41 @@ def is_start_of_new_report(page_text):
                     
     return None
 
+def is_start_of_new_report(page_text):
+    if not page_text: return None
+
+    page_marker_match = FIRST_PAGE_MARKER_RE.search(page_text)
+    if not page_marker_match:
+        return None
+
+    return find_data_consulta(page_text)
+
+def extract_boundary_text(pdf_page):
+    """
+    Returns (header_text, footer_text): pdfplumber's extract_text of the header and
+    footer bands only, which is all report-boundary detection needs. The lines come
+    out as they do for the whole page; pdfminer still parses the full page, but the
+    text clustering skips everything between the bands.
+    """
+    x0, top, x1, bottom = pdf_page.bbox
+    height = bottom - top
+    header_text = pdf_page.crop((x0, top, x1, top + height * HEADER_BAND_RATIO)).extract_text() or ""
+    footer_text = pdf_page.crop((x0, bottom - height * FOOTER_BAND_RATIO, x1, bottom)).extract_text() or ""
+    return header_text, footer_text
+
+def detect_report_start(page):
+    """Returns the 'Data Consulta' if the (cached) page starts a new report, reading the header band first."""
+    header_text, footer_text = page.extract_boundary_text()
+    # "Página 1 de N" may be printed at the top or at the bottom of the page.
+    if not (FIRST_PAGE_MARKER_RE.search(header_text) or FIRST_PAGE_MARKER_RE.search(footer_text)):
+        return None
+    # Only the header band holds the 'Data Consulta' block; a footer date must not be taken for it.
+    data_consulta_str = find_data_consulta(header_text)
+    if data_consulta_str is None:
+        # The block lies (partly) outside the band: read the whole page, as before the band scan.
+        data_consulta_str = is_start_of_new_report(page.extract_text())
+    return data_consulta_str
+
 def extract_funcao_and_lotacao_from_page(page, unidades_data, default_lotacao):
     """
     Extracts (code, lotacao, dt_inicial_str, dt_final_str) tuples from tables.
@@ -129,8 +311,9 @@ def extract_funcao_and_lotacao_from_page(page, unidades_data, default_lotacao):
             if lotacao_idx != -1 and len(row) > lotacao_idx and row[lotacao_idx]:
                 lotacao_cell_text = str(row[lotacao_idx]).replace('\n', ' ')
                 potential_code = lotacao_cell_text.split(' ')[0].strip()
-                if potential_code in unidades_data:
-                    lotacao_display = unidades_data[potential_code]['display_string']
+                unit_info = lookup_unidade(potential_code, unidades_data)
+                if unit_info:
+                    lotacao_display = unit_info['display_string']
                 else: lotacao_display = lotacao_cell_text
             
             results.add((code, lotacao_display, dt_inicial_str, dt_final_str))
@@ -170,89 +353,241 @@ def extract_funcao_codes_from_page(page):
                             codes.add(potential_code)
     return codes
 
-def aggregate_yearly_data_multi_report(pdf_path, log_area, unidades_data, progress_callback=None):
+# Reports consulted before this date predate the MDL system and are ignored.
+MDL_CUTOFF_DATE = datetime(2014, 5, 1)
+# Below this many valid report pages, process start-up costs more than it saves.
+PARALLEL_MIN_PAGES = 40
+# Page-range chunks per worker: enough for an even load, few enough to keep per-task overhead low.
+CHUNKS_PER_WORKER = 4
+
+@traced(category="pdf")
+def scan_report_boundaries(pdf, page_cache, log_area, progress=None):
+    """
+    Phase 1 of the aggregation: finds where each report starts and reads its 'Data Consulta'.
+    Only the header/footer bands are read here; full-page work is left to phase 2.
+    Returns [(report_date, page_indices)] for the valid (>= 05/2014) reports, in page order.
+    """
+    valid_reports = []
+    current_report = None
+    total_pages = len(pdf.pages)
+
+    for i, pdf_page in enumerate(pdf.pages):
+        if progress:
+            progress((i + 1) / total_pages)
+
+        page_num = i + 1
+        page = page_cache.page(pdf_page)
+        new_report_data_consulta_str = detect_report_start(page)
+
+        if new_report_data_consulta_str:
+            current_report = None
+            try:
+                report_date = datetime.strptime(new_report_data_consulta_str, '%d/%m/%Y')
+                if report_date >= MDL_CUTOFF_DATE:
+                    current_report = (report_date, [])
+                    valid_reports.append(current_report)
+                    log_area.write(f"  - Relatório VÁLIDO encontrado (>= 05/2014) na Pág {page_num} com data: {new_report_data_consulta_str}\n")
+                else:
+                    log_area.write(f"  - Relatório IGNORADO (< 05/2014) na Pág {page_num} com data: {new_report_data_consulta_str}\n")
+            except ValueError:
+                log_area.write(f"  - AVISO: Data de consulta inválida '{new_report_data_consulta_str}' na Página {page_num}.\n")
+
+        if current_report:
+            current_report[1].append(i)
+
+    return valid_reports
+
+def extract_default_lotacao_from_page(page, unidades_data):
+    """Reads the report-wide Lotação from the small table on the first page of a report."""
+    for table in page.extract_tables() or []:
+        if table and len(table) > 1 and table[0] and len(table[0]) > 1 and "Lotação" in str(table[0][1]):
+            lotacao_cell_text = str(table[1][1]).replace('\n', ' ')
+            potential_code = lotacao_cell_text.split(' ')[0].replace('-', '').strip()
+            unit_info = lookup_unidade(potential_code, unidades_data)
+            if unit_info:
+                return unit_info['display_string']
+            return lotacao_cell_text
+    return "-------"
+
+def extract_report_funcao_tuples(pdf, page_cache, page_indices, unidades_data, default_lotacao=None):
+    """
+    Phase 2 of the aggregation: collects the (code, lotacao, dt_ini, dt_fim) tuples of the
+    given pages of one report. The report-wide Lotação is read from the first of them
+    unless `default_lotacao` is given (for chunks that do not start the report).
+    """
+    with span("extract_report_funcao_tuples", "pdf", primeira_pagina=page_indices[0] + 1, paginas=len(page_indices)):
+        if default_lotacao is None:
+            first_page = page_cache.page(pdf.pages[page_indices[0]])
+            default_lotacao = extract_default_lotacao_from_page(first_page, unidades_data)
+
+        report_funcao_tuples = set()
+        for page_index in page_indices:
+            page = page_cache.page(pdf.pages[page_index])
+            report_funcao_tuples.update(extract_funcao_and_lotacao_from_page(page, unidades_data, default_lotacao))
+        return report_funcao_tuples
+
+def split_into_chunks(valid_reports, worker_count):
+    """
+    Splits the valid reports' pages into (report_number, first_page_index, page_indices)
+    chunks of at most ~1/4 of a worker's share, so a PDF holding one large report is
+    spread over the workers too. Chunks never cross reports and stay in page order.
+    """
+    valid_page_count = sum(len(page_indices) for _, page_indices in valid_reports)
+    chunk_size = max(1, -(-valid_page_count // (worker_count * CHUNKS_PER_WORKER)))
+    chunks = []
+    for report_number, (_, page_indices) in enumerate(valid_reports):
+        for start in range(0, len(page_indices), chunk_size):
+            chunks.append((report_number, page_indices[0], page_indices[start:start + chunk_size]))
+    return chunks
+
+# --- Process-pool workers (each process keeps its own open copy of the PDF) ---
+_worker_state = {}
+
+def _init_page_worker(pdf_path, unidades_data, fetched):
+    import logging
+    logging.getLogger("pdfminer").setLevel(logging.ERROR)
+    init_worker_tracing()
+    # Units the main process already fetched (or found missing) are not asked to the DB again.
+    seed_fetched_unidades(fetched)
+    _worker_state['pdf'] = pdfplumber.open(pdf_path)
+    _worker_state['unidades_data'] = unidades_data
+    # Report-wide Lotação by the index of the report's first page, read once per worker.
+    _worker_state['default_lotacoes'] = {}
+
+def _extract_chunk_funcao_tuples_in_worker(chunk):
+    _, first_page_index, page_indices = chunk
+    pdf, unidades_data = _worker_state['pdf'], _worker_state['unidades_data']
+    default_lotacoes = _worker_state['default_lotacoes']
+    if first_page_index not in default_lotacoes:
+        first_page = PageExtractionCache().page(pdf.pages[first_page_index])
+        default_lotacoes[first_page_index] = extract_default_lotacao_from_page(first_page, unidades_data)
+    funcao_tuples = extract_report_funcao_tuples(
+        pdf, PageExtractionCache(), page_indices, unidades_data, default_lotacoes[first_page_index]
+    )
+    write_worker_trace()
+    return funcao_tuples
+
+def _resolve_worker_count(max_workers):
+    if max_workers is None or max_workers < 0:
+        return 1
+    if max_workers == 0:
+        return os.cpu_count() or 1
+    return max_workers
+
+@traced(category="pdf")
+def aggregate_yearly_data_multi_report(pdf_path, log_area, unidades_data, progress=None, max_workers=None):
+    """
+    Walks every page of the (possibly multi-report) PDF and collects the MDL FuncaoRecords by year.
+    `pdf_path` may also be an open PdfDocumentSession, whose handle is reused.
+
+    The work is done in two phases: a boundary scan over all pages, then the table
+    extraction of the valid reports. With `max_workers` > 1 (0 = one per CPU) the
+    second phase runs in a ProcessPoolExecutor over page-range chunks of the reports
+    (see split_into_chunks); each chunk's tuples are added to its report's set, so the
+    output is identical to the serial path. A single chunk is extracted in-process.
+    Pages scanned and extracted are counted on the 'pdf' stage of `progress` (a ProgressTracker).
+    Returns None when the PDF could not be read, so a failed parse is not cached as an empty one.
+    """
     yearly_funcoes = defaultdict(set)
+
+    def report_pages(step=1, done=None, total=None):
+        if progress:
+            progress.advance('pdf', step=step, done=done, total=total)
+
     try:
-        with pdfplumber.open(pdf_path) as pdf:
+        with _open_pdf(pdf_path) as (pdf, page_cache):
             if not pdf.pages:
-                log_area.write("Error: PDF has no pages.\n"); return {}
-            
+                log_area.write("Error: PDF has no pages.\n"); return None
+
+            # Until the scan is done, assume every page will also have its tables extracted.
             total_pages = len(pdf.pages)
-            current_report_date_obj = None
-            current_report_funcao_tuples = set()
-            current_report_default_lotacao = "-------"
+            if progress:
+                progress.start('pdf', total=total_pages * 2, unit="páginas")
+            valid_reports = scan_report_boundaries(pdf, page_cache, log_area, lambda f: report_pages(done=round(f * total_pages)))
+            valid_page_count = sum(len(page_indices) for _, page_indices in valid_reports)
+            report_pages(done=total_pages, total=total_pages + valid_page_count)
+            worker_count = _resolve_worker_count(max_workers)
+            chunks = split_into_chunks(valid_reports, worker_count) if worker_count > 1 else []
+            worker_count = min(worker_count, len(chunks))
+
+            report_tuples = [set() for _ in valid_reports]
+            if worker_count > 1 and valid_page_count >= PARALLEL_MIN_PAGES:
+                log_area.write(f"  - Extraindo tabelas de {valid_page_count} páginas em {worker_count} processos ({len(chunks)} blocos)...\n")
+                source_path = pdf_path.pdf_path if isinstance(pdf_path, PdfDocumentSession) else pdf_path
+                with ProcessPoolExecutor(max_workers=worker_count, initializer=_init_page_worker,
+                                         initargs=(source_path, unidades_data, fetched_unidades())) as executor:
+                    for (report_number, _, page_indices), funcao_tuples in zip(chunks, executor.map(_extract_chunk_funcao_tuples_in_worker, chunks)):
+                        report_tuples[report_number].update(funcao_tuples)
+                        report_pages(step=len(page_indices))
+            else:
+                for report_number, (_, page_indices) in enumerate(valid_reports):
+                    report_tuples[report_number] = extract_report_funcao_tuples(pdf, page_cache, page_indices, unidades_data)
+                    report_pages(step=len(page_indices))
 
-            for i, page in enumerate(pdf.pages):
-                if progress_callback:
-                    log_area.widget.master.after_idle(progress_callback, (i + 1) / total_pages * 100)
-                
-                page_num = i + 1
-                page_text = page.extract_text()
-                new_report_data_consulta_str = is_start_of_new_report(page_text)
-
-                if new_report_data_consulta_str:
-                    if current_report_date_obj and current_report_funcao_tuples:
-                        year_str = str(current_report_date_obj.year)
-                        for code, lotacao, dt_ini, dt_fim in current_report_funcao_tuples:
-                            periodo_str = f"{dt_ini} - {dt_fim}" if dt_ini and dt_fim else "-------"
-                            yearly_funcoes[year_str].add((current_report_date_obj, code, "[MDL]", lotacao, periodo_str))
-                    
-                    try:
-                        report_date = datetime.strptime(new_report_data_consulta_str, '%d/%m/%Y')
-                        cutoff_date = datetime(2014, 5, 1)
-                        if report_date >= cutoff_date:
-                            current_report_date_obj = report_date
-                            current_report_funcao_tuples = set()
-                            log_area.write(f"  - Relatório VÁLIDO encontrado (>= 05/2014) na Pág {page_num} com data: {new_report_data_consulta_str}\n")
-                            
-                            current_report_default_lotacao = "-------"
-                            for table in page.extract_tables() or []:
-                                if table and len(table) > 1 and table[0] and len(table[0]) > 1 and "Lotação" in str(table[0][1]):
-                                    lotacao_cell_text = str(table[1][1]).replace('\n', ' ')
-                                    potential_code = lotacao_cell_text.split(' ')[0].replace('-', '').strip()
-                                    if potential_code in unidades_data:
-                                        current_report_default_lotacao = unidades_data[potential_code]['display_string']
-                                    else:
-                                        current_report_default_lotacao = lotacao_cell_text
-                                    break
-                        else:
-                            log_area.write(f"  - Relatório IGNORADO (< 05/2014) na Pág {page_num} com data: {new_report_data_consulta_str}\n")
-                            current_report_date_obj = None
-                            
-                    except ValueError:
-                        log_area.write(f"  - AVISO: Data de consulta inválida '{new_report_data_consulta_str}' na Página {page_num}.\n")
-                        current_report_date_obj = None
-                
-                if current_report_date_obj:
-                    tuples_from_page = extract_funcao_and_lotacao_from_page(page, unidades_data, current_report_default_lotacao)
-                    current_report_funcao_tuples.update(tuples_from_page)
+            for (report_date, _), funcao_tuples in zip(valid_reports, report_tuples):
+                year_str = str(report_date.year)
+                for code, lotacao, dt_ini, dt_fim in funcao_tuples:
+                    yearly_funcoes[year_str].add(FuncaoRecord.from_period_strings(report_date, code, "[MDL]", lotacao, dt_ini, dt_fim))
 
-            if current_report_date_obj and current_report_funcao_tuples:
-                year_str = str(current_report_date_obj.year)
-                for code, lotacao, dt_ini, dt_fim in current_report_funcao_tuples:
-                    periodo_str = f"{dt_ini} - {dt_fim}" if dt_ini and dt_fim else "-------"
-                    yearly_funcoes[year_str].add((current_report_date_obj, code, "[MDL]", lotacao, periodo_str))
+            if progress:
+                progress.finish('pdf')
+            log_area.write(f"  - Cache de páginas: {page_cache.summary()}.\n")
 
     except Exception as e:
         log_area.write(f"Error processing PDF {pdf_path}: {e}\n")
         import traceback
         log_area.write(traceback.format_exc() + "\n")
-        return {}
+        return None
         
     return yearly_funcoes
       
+# Bump whenever a parsing rule changes, so results cached by older versions are not reused.
+PDF_PARSER_VERSION = "2"
+
+def _iso_or_none(value):
+    return value.isoformat() if value else None
+
+def _date_or_none(iso_text):
+    return date.fromisoformat(iso_text) if iso_text else None
+
+def encode_pdf_result(cpf, name, data_inicio, yearly_funcoes):
+    """Converts the header fields and the yearly MDL records into a JSON-serializable dict."""
+    return {
+        'cpf': cpf,
+        'name': name,
+        'data_inicio': data_inicio,
+        'yearly': {
+            year: [
+                [record.date.isoformat(), record.code, record.source, record.lotacao,
+                 _iso_or_none(record.start), _iso_or_none(record.end), record.raw_periodo]
+                for record in sorted(records, key=FuncaoRecord.sort_key)
+            ]
+            for year, records in yearly_funcoes.items()
+        },
+    }
+
+def decode_pdf_result(payload):
+    """Inverse of encode_pdf_result: returns (cpf, name, data_inicio, yearly_funcoes)."""
+    yearly_funcoes = defaultdict(set)
+    for year, rows in payload['yearly'].items():
+        for date_iso, code, source, lotacao, start_iso, end_iso, raw_periodo in rows:
+            yearly_funcoes[year].add(FuncaoRecord(
+                datetime.fromisoformat(date_iso), code, source, lotacao,
+                _date_or_none(start_iso), _date_or_none(end_iso), raw_periodo
+            ))
+    return payload['cpf'], payload['name'], payload['data_inicio'], yearly_funcoes
+
 def extract_cpf_from_pdf(pdf_path, log_area):
     """Extracts the CPF number from the first page of the PDF."""
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            first_page_text = pdf.pages[0].extract_text()
-            if first_page_text:
-                # Regex to find a CPF pattern. Catches XXX.XXX.XXX-XX format.
-                match = re.search(r'(\d{3}\.\d{3}\.\d{3}-\d{2})', first_page_text)
-                if match:
-                    cpf = match.group(1)
-                    log_area.write(f"  - CPF do servidor: {cpf}\n")
-                    return cpf
+        first_page_text = _read_first_page_text(pdf_path)
+        if first_page_text:
+            # Regex to find a CPF pattern. Catches XXX.XXX.XXX-XX format.
+            match = re.search(r'(\d{3}\.\d{3}\.\d{3}-\d{2})', first_page_text)
+            if match:
+                cpf = match.group(1)
+                log_area.write(f"  - CPF do servidor: {cpf}\n")
+                return cpf
     except Exception as e:
         log_area.write(f"  - ERRO ao extrair CPF do PDF: {e}\n")
     return None
@@ -260,25 +595,24 @@ def extract_cpf_from_pdf(pdf_path, log_area):
 def extract_name_from_pdf(pdf_path, log_area):
     """Extracts the Person's Name from the first page of the PDF."""
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            first_page_text = pdf.pages[0].extract_text()
-            if first_page_text:
-                match = re.search(r"Nome\s+([\w\s]+?)\s+Data Consulta", first_page_text)
-                if match:
-                    name = match.group(1).strip()
-                    log_area.write(f"  - Nome do servidor: {name}\n")
-                    return name
-                else:
-                    cpf_match = re.search(r"(\d{3}\.\d{3}\.\d{3}-\d{2})", first_page_text)
-                    if cpf_match:
-                        cpf = cpf_match.group(1)
-                        for line in first_page_text.split('\n'):
-                            if cpf in line:
-                                name_match = re.search(fr"{re.escape(cpf)}\s+([\w\s]+?)\s+\d{{2}}/\d{{2}}/\d{{4}}", line)
-                                if name_match:
-                                    name = name_match.group(1).strip()
-                                    log_area.write(f"  - Nome do servidor: {name}\n")
-                                    return name
+        first_page_text = _read_first_page_text(pdf_path)
+        if first_page_text:
+            match = re.search(r"Nome\s+([\w\s]+?)\s+Data Consulta", first_page_text)
+            if match:
+                name = match.group(1).strip()
+                log_area.write(f"  - Nome do servidor: {name}\n")
+                return name
+            else:
+                cpf_match = re.search(r"(\d{3}\.\d{3}\.\d{3}-\d{2})", first_page_text)
+                if cpf_match:
+                    cpf = cpf_match.group(1)
+                    for line in first_page_text.split('\n'):
+                        if cpf in line:
+                            name_match = re.search(fr"{re.escape(cpf)}\s+([\w\s]+?)\s+\d{{2}}/\d{{2}}/\d{{4}}", line)
+                            if name_match:
+                                name = name_match.group(1).strip()
+                                log_area.write(f"  - Nome do servidor: {name}\n")
+                                return name
     except Exception as e:
         log_area.write(f"  - ERRO ao extrair Nome do PDF: {e}\n")
     log_area.write("  - AVISO: Não foi possível encontrar o nome no PDF.\n")
@@ -287,107 +621,416 @@ def extract_name_from_pdf(pdf_path, log_area):
 def extract_data_inicio_from_pdf(pdf_path, log_area):
     """Extracts the 'Data Início' from the 'Cargo' section of the PDF."""
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            first_page_text = pdf.pages[0].extract_text()
-            if first_page_text:
-                match = re.search(r"Cargo\s+Data Início\s+Data Fim\s*\n(?:.|\n)*?(\d{2}/\d{2}/\d{4})", first_page_text)
-                if match:
-                    data_inicio = match.group(1)
-                    log_area.write(f"  - Data Início: {data_inicio}\n")
-                    return data_inicio
+        first_page_text = _read_first_page_text(pdf_path)
+        if first_page_text:
+            match = re.search(r"Cargo\s+Data Início\s+Data Fim\s*\n(?:.|\n)*?(\d{2}/\d{2}/\d{4})", first_page_text)
+            if match:
+                data_inicio = match.group(1)
+                log_area.write(f"  - Data Início: {data_inicio}\n")
+                return data_inicio
     except Exception as e:
         log_area.write(f"  - ERRO ao extrair Data Início do PDF: {e}\n")
     log_area.write("  - AVISO: Não foi possível encontrar a Data de Início no PDF.\n")
     return None
 
-def find_best_unit_match(mainframe_name, unidades_data):
+@traced(category="unidades")
+def find_best_unit_match(mainframe_name, unidades_data, memo=None):
     """
     Finds the best matching unit from the database for a given name from MAINFRAME
     using fuzzy string matching, respecting that DB names can also be abbreviated.
+    The normalized-name index is built once per loaded unidades_data (see unit_index.py).
 
     Args:
         mainframe_name (str): The location name scraped from MAINFRAME.
         unidades_data (dict): The dictionary of all units loaded from the DB.
+        memo (UnitResolutionMemo): Optional persistent memo of earlier resolutions.
 
     Returns:
         dict: The unit_info dictionary for the best match, or None.
     """
     if not mainframe_name or not mainframe_name.strip() or not unidades_data:
         return None
+    if memo is None:
+        return unit_index_for(unidades_data).match(mainframe_name)
+
+    normalized_name = normalize_unit_name(mainframe_name)
+    remembered = memo.get(normalized_name)
+    if remembered is not None:
+        unit_key, _score = remembered
+        if unit_key is None:
+            return None
+        if unit_key in unidades_data:
+            return unidades_data[unit_key]
+
+    unit_info, score = unit_index_for(unidades_data).match_normalized(normalized_name)
+    memo.put(normalized_name, (unit_info['mdl'] or unit_info['inep']) if unit_info else None, round(score, 4))
+    return unit_info
+
+# Installs (once per element) a MutationObserver that counts DOM changes inside the grid,
+# and returns that count together with the set of rendered aria-rowindex values.
+GRID_STATE_JS = """
+const grid = arguments[0];
+if (!grid.__mdlObserver) {
+    grid.__mdlMutations = 0;
+    grid.__mdlObserver = new MutationObserver(() => { grid.__mdlMutations++; });
+    grid.__mdlObserver.observe(grid, {childList: true, subtree: true, characterData: true, attributes: true});
+}
+const rows = grid.querySelectorAll('div[role="row"][aria-rowindex]');
+return [grid.__mdlMutations, Array.from(rows, r => r.getAttribute('aria-rowindex')).join(',')];
+"""
+
+SCROLL_BY_VIEWPORT_JS = """
+const c = arguments[0], before = c.scrollTop;
+c.scrollTop += c.clientHeight;
+return c.scrollTop !== before;
+"""
+
+SCROLL_TO_TOP_JS = """
+const c = arguments[0], before = c.scrollTop;
+c.scrollTop = 0;
+return c.scrollTop !== before;
+"""
+
+# Reads every rendered grid row in one round-trip: [[aria-rowindex, {colindex: text}], ...].
+# Missing cells come back as null.
+READ_GRID_ROWS_JS = """
+const grid = arguments[0], columns = arguments[1], result = [];
+for (const row of grid.querySelectorAll('div[role="row"]')) {
+    if (!(row.getAttribute('class') || '').includes('row')) continue;
+    const cells = {};
+    for (const col of columns) {
+        const cell = row.querySelector('div[role="gridcell"][aria-colindex="' + col + '"]');
+        cells[col] = cell ? cell.innerText : null;
+    }
+    result.push([row.getAttribute('aria-rowindex'), cells]);
+}
+return result;
+"""
+
+# True when the first rendered grid row has a cell for each of the given aria-colindex values.
+COLUMNS_RENDERED_JS = """
+const row = arguments[0].querySelector('div[role="row"][aria-rowindex]:not([aria-rowindex="1"])');
+return !!row && arguments[1].every(col => !!row.querySelector('div[role="gridcell"][aria-colindex="' + col + '"]'));
+"""
+
+class GridChangeWaiter:
+    """
+    Event-driven replacement for the scraper's fixed sleeps. A MutationObserver counts
+    changes in the grid; each wait polls it through execute_script and returns as soon as
+    the grid changed (and, for scrolls, the rendered aria-rowindex set changed) and has
+    been quiet for `settle` seconds, or after `timeout`. Every wait's duration is recorded.
+    """
+    def __init__(self, driver, poll_interval=0.05, settle=0.15):
+        self.driver = driver
+        self.poll_interval = poll_interval
+        self.settle = settle
+        self.timings = defaultdict(list)
+        self.timeouts = defaultdict(int)
+
+    def state(self, grid):
+        mutations, row_indexes = self.driver.execute_script(GRID_STATE_JS, grid)
+        return mutations, row_indexes
+
+    def wait_for_change(self, grid, before, label, timeout, require_row_change=False):
+        """Waits until the grid differs from the `before` state (see state()); returns True if it did."""
+        started = time.perf_counter()
+        deadline = started + timeout
+        changed_at = None
+        last_mutations = None
+        while True:
+            mutations, row_indexes = self.state(grid)
+            now = time.perf_counter()
+            if changed_at is None:
+                if mutations != before[0] and (not require_row_change or row_indexes != before[1]):
+                    changed_at, last_mutations = now, mutations
+            elif mutations != last_mutations:
+                # Still rendering: restart the quiet period.
+                changed_at, last_mutations = now, mutations
+            elif now - changed_at >= self.settle:
+                break
+            if now >= deadline:
+                self.timeouts[label] += 1
+                break
+            time.sleep(self.poll_interval)
+
+        self.timings[label].append(time.perf_counter() - started)
+        return changed_at is not None
+
+    @traced("scroll_and_wait", category="mainframe")
+    def scroll_and_wait(self, scroll_container, grid, label, script=SCROLL_BY_VIEWPORT_JS, timeout=3):
+        """Scrolls with `script` and waits for new rows; returns False right away if the grid did not move."""
+        before = self.state(grid)
+        if not self.driver.execute_script(script, scroll_container):
+            return False
+        return self.wait_for_change(grid, before, label, timeout, require_row_change=True)
+
+    def summary(self):
+        parts = []
+        for label, durations in self.timings.items():
+            part = f"{label}: {len(durations)}x, total {sum(durations):.1f}s, máx {max(durations):.2f}s"
+            if self.timeouts[label]:
+                part += f", {self.timeouts[label]} timeout(s)"
+            parts.append(part)
+        return "; ".join(parts)
+
+    def reset(self):
+        self.timings.clear()
+        self.timeouts.clear()
+
+# --- Power BI query responses (network extraction mode) ---
+# Position of each needed field in the table visual's query (Select order). The grid shows
+# the same columns, so this is the grid's aria-colindex minus one.
+NETWORK_FIELD_POSITIONS = {'code': 1, 'date2': 7, 'date1': 8, 'unidade': 14}
+# Columns holding dates, whatever the size of the value (epoch milliseconds).
+NETWORK_DATE_FIELDS = ('date1', 'date2')
+
+def decode_powerbi_dsr_rows(query_result):
+    """
+    Decodes the compressed 'DSR' payload of one Power BI querydata result into plain rows.
+    Each row in DM0 lists only the values that are neither repeated from the previous row
+    (bitmask 'R') nor null (bitmask 'Ø'); dictionary-encoded columns ('DN') hold indexes
+    into the dataset's ValueDicts. Returns (rows, complete, schema), where `schema` is the
+    column list ({'N', 'T', ...}) the first row declared.
+    """
+    data = query_result['result']['data']
+    dataset = data['dsr']['DS'][0]
+    value_dicts = dataset.get('ValueDicts', {})
+    primary_rows = dataset['PH'][0].get('DM0', [])
+
+    schema = []
+    first_schema = None
+    previous = []
+    rows = []
+    for raw_row in primary_rows:
+        if 'S' in raw_row:
+            schema = raw_row['S']
+            first_schema = first_schema or schema
+            previous = [None] * len(schema)
+        values = iter(raw_row.get('C', []))
+        repeated = raw_row.get('R', 0)
+        nulls = raw_row.get('Ø', 0)
+        row = []
+        for i, column in enumerate(schema):
+            if repeated & (1 << i):
+                value = previous[i]
+            elif nulls & (1 << i):
+                value = None
+            else:
+                value = next(values, None)
+                if 'DN' in column and isinstance(value, int):
+                    value = value_dicts[column['DN']][value]
+            row.append(value)
+        previous = row
+        rows.append(row)
 
-    unique_units_by_name = {unit['nome_folha']: unit for unit in unidades_data.values() if unit.get('nome_folha')}
-    
-    # Normalization function to prepare strings for a more lenient comparison.
-    def normalize(text):
-        # Convert to uppercase and remove leading/trailing whitespace.
-        text = text.upper().strip()
-        # Remove periods to treat "E.E." and "E E" as the same.
-        text = text.replace('.', '')
-        # Collapse multiple spaces into one.
-        text = re.sub(r'\s+', ' ', text)
-        return text
-
-    normalized_mainframe_name = normalize(mainframe_name)
-    
-    # 1. Try for a perfect match on the normalized string.
-    for name, unit_info in unique_units_by_name.items():
-        if normalize(name) == normalized_mainframe_name:
-            return unit_info  # Found a perfect match
-
-    # 2. If no perfect match, proceed with fuzzy matching to find the most similar name.
-    best_match_unit = None
-    highest_score = 0.0
-    
-    for name, unit_info in unique_units_by_name.items():
-        normalized_db_name = normalize(name)
-        
-        # SequenceMatcher calculates a similarity ratio between the two normalized strings.
-        score = SequenceMatcher(None, normalized_mainframe_name, normalized_db_name).ratio()
-        
-        if score > highest_score:
-            highest_score = score
-            best_match_unit = unit_info
-            
-    # 3. Return the best match only if its similarity score is above a confident threshold.
-    if highest_score > 0.85:
-        return best_match_unit
-        
+    complete = not dataset.get('IC', False) and 'RT' not in dataset
+    return rows, complete, first_schema or []
+
+def _format_powerbi_value(value, is_date=False):
+    """
+    Turns one cell into the text the grid would show. Date columns hold epoch milliseconds
+    (negative before 1970). A value that cannot be shown is blanked, like an empty grid cell.
+    """
+    if value is None:
+        return None
+    if is_date and isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            return (datetime(1970, 1, 1) + timedelta(milliseconds=value)).strftime('%d/%m/%Y')
+        except (OverflowError, ValueError):
+            return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def _is_date_text(text):
+    try:
+        datetime.strptime(text, '%d/%m/%Y')
+        return True
+    except (TypeError, ValueError):
+        return False
+
+def rows_from_powerbi_response(response_body):
+    """
+    Returns the grid rows ({'code', 'date1', 'date2', 'unidade'}) found in one querydata
+    response, or None if it is not the table visual's (complete, well-formed) result.
+    """
+    try:
+        payload = json.loads(response_body)
+        results = payload.get('results', [])
+    except (ValueError, AttributeError):
+        return None
+
+    needed_width = max(NETWORK_FIELD_POSITIONS.values()) + 1
+    for query_result in results:
+        try:
+            rows, complete, schema = decode_powerbi_dsr_rows(query_result)
+        except (KeyError, IndexError, TypeError):
+            continue
+        if not rows or not complete or len(schema) < needed_width:
+            continue
+
+        collected = {}
+        for i, row in enumerate(rows):
+            fields = {
+                name: _format_powerbi_value(row[pos], is_date=name in NETWORK_DATE_FIELDS)
+                for name, pos in NETWORK_FIELD_POSITIONS.items()
+            }
+            # A cell that is not a date is blanked, like an empty grid cell (e.g. an open-ended
+            # Dt Final); build_scraped_data skips incomplete rows, as it does for the DOM grid.
+            for name in NETWORK_DATE_FIELDS:
+                if fields[name] and not _is_date_text(fields[name]):
+                    fields[name] = None
+            collected[str(i + 1)] = fields
+
+        # Sanity check that the positions really point at the code and date columns.
+        if not any(fields['code'] and fields['code'].isdigit() and fields['date1'] for fields in collected.values()):
+            continue
+        return collected
     return None
 
-def scrape_mainframe_data(cpf, username, password, log_area, unidades_data):
+# --- MAINFRAME (Power BI) Scraping ---
+MAINFRAME_LOGIN_URL = "https://intra.educacao.go.gov.br"
+LOGIN_USERNAME_ID = 'ctl00_PlaceHolderMain_signInControl_UserName'
+
+# Código, the two dates and Unidade (aria-colindex). With a window wide enough
+# for the grid to render all of them, one vertical pass reads everything.
+GRID_COLUMNS = ("2", "9", "8", "15")
+SINGLE_PASS_WINDOW_SIZE = "3840,1200"
+TWO_PASS_WINDOW_SIZE = "1920,1200"
+
+# Last ChromeDriver path resolved by webdriver-manager, so later starts (and offline ones) skip it.
+CHROMEDRIVER_PATH_FILE = "chromedriver_path.txt"
+
+def resolve_chromedriver_path(log_area, refresh=False):
     """
-    Scrapes Power BI by following a precise multi-pass scroll and scrape logic.
-    Horizontal scroll is now fixed using ActionChains to drag the custom scrollbar.
+    Returns the ChromeDriver executable: [mainframe] chromedriver_path if set, else the
+    locally remembered path, else (or with `refresh`) the one webdriver-manager downloads.
     """
-    log_area.write("Iniciando scraping do MAINFRAME...\n")
-    scraped_data = defaultdict(set)
-    
-    options = Options()
-    options.add_argument("--headless")
-    options.add_argument("--window-size=1920,1200")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--log-level=3")
-    
-    driver = None
+    config = load_app_config()
+    configured_path = config.get('mainframe', 'chromedriver_path', fallback='').strip()
+    if configured_path:
+        return configured_path
+
+    path_file = os.path.join(cache_directory(config), CHROMEDRIVER_PATH_FILE)
+    if not refresh:
+        try:
+            with open(path_file, 'r', encoding='utf-8') as f:
+                cached_path = f.read().strip()
+            if cached_path and os.path.exists(cached_path):
+                return cached_path
+        except OSError:
+            pass
+
+    log_area.write("  - Resolvendo a versão do ChromeDriver (webdriver-manager)...\n")
+    with span("ChromeDriverManager.install", "mainframe"):
+        driver_path = ChromeDriverManager().install()
     try:
-        log_area.write("  - Configurando e iniciando o ChromeDriver...\n")
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=options)
-        wait = WebDriverWait(driver, 20)
-        
-        # --- Steps 1-6: Login, navigation, iframe switching, and CPF filtering ---
-        log_area.write("  - Navegando para a página de login...\n")
-        driver.get("https://intra.educacao.go.gov.br")
-        wait.until(EC.element_to_be_clickable((By.ID, 'ctl00_PlaceHolderMain_signInControl_UserName'))).send_keys(username)
-        wait.until(EC.element_to_be_clickable((By.ID, 'ctl00_PlaceHolderMain_signInControl_password'))).send_keys(password)
-        wait.until(EC.element_to_be_clickable((By.ID, 'ctl00_PlaceHolderMain_signInControl_login'))).click()
+        os.makedirs(os.path.dirname(path_file), exist_ok=True)
+        with open(path_file, 'w', encoding='utf-8') as f:
+            f.write(driver_path)
+    except OSError as e:
+        log_area.write(f"  - AVISO: Não foi possível salvar o caminho do ChromeDriver: {e}\n")
+    return driver_path
+
+class MainframeSession:
+    """
+    Long-lived, logged-in browser session on the MAINFRAME Power BI report.
+    It logs in and navigates once, stays parked inside the Power BI frame and serves
+    many CPF lookups by re-typing only the search-field filter. An expired or broken
+    session is detected on lookup, and the login/navigation is redone once.
+    """
+    def __init__(self, username, password, log_area, extraction_mode=None):
+        self.username = username
+        self.password = password
+        self.log_area = log_area
+        # Optional ProgressTracker; grid rows read are counted on its 'scrape' stage.
+        self.progress = None
+        # "dom" scrolls the grid; "network" reads the Power BI query responses and falls back to "dom".
+        config = load_app_config()
+        self.extraction_mode = extraction_mode or config.get('mainframe', 'extraction', fallback='dom')
+        # Wide window + one vertical pass; the two-pass scrape is used when the grid still hides a column.
+        self.single_pass = config.getboolean('mainframe', 'single_pass', fallback=True)
+        self.driver = None
+        self.wait = None
+        self.waiter = None
+        self._parked = False
+        self._at_login_page = False
+        self.logged_in_as = None
+        # Serializes the background warm-up with lookups and credential changes.
+        self._lock = threading.RLock()
+
+    def set_credentials(self, username, password):
+        """Updates the credentials; a browser already logged in as another user is restarted."""
+        with self._lock:
+            if self.logged_in_as not in (None, username):
+                self._quit_driver()
+            self.username = username
+            self.password = password
+
+    @traced("MainframeSession.warm_up", category="mainframe")
+    def warm_up(self):
+        """
+        Starts the browser and opens the login page ahead of the first lookup (meant for a
+        background thread while the operator is still typing). Errors are only logged;
+        the lookup will try again.
+        """
+        with self._lock:
+            try:
+                if self.driver is None:
+                    self._start_driver()
+                if not self._parked and not self._at_login_page:
+                    self.driver.get(MAINFRAME_LOGIN_URL)
+                    self.wait.until(EC.presence_of_element_located((By.ID, LOGIN_USERNAME_ID)))
+                    self._at_login_page = True
+                self.log_area.write("  - Navegador do MAINFRAME pronto.\n")
+            except Exception as e:
+                self.log_area.write(f"  - AVISO: Não foi possível preparar o navegador do MAINFRAME: {e}\n")
+
+    @traced("MainframeSession.start_driver", category="mainframe")
+    def _start_driver(self):
+        options = Options()
+        options.add_argument("--headless")
+        options.add_argument(f"--window-size={SINGLE_PASS_WINDOW_SIZE if self.single_pass else TWO_PASS_WINDOW_SIZE}")
+        options.add_argument("--disable-gpu")
+        options.add_argument("--no-sandbox")
+        options.add_argument("--log-level=3")
+        if self.extraction_mode == 'network':
+            options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+        self.log_area.write("  - Configurando e iniciando o ChromeDriver...\n")
+        try:
+            self.driver = webdriver.Chrome(service=Service(resolve_chromedriver_path(self.log_area)), options=options)
+        except WebDriverException:
+            # The remembered driver no longer matches the installed Chrome: resolve it again.
+            self.log_area.write("  - ChromeDriver salvo incompatível ou ausente. Obtendo uma nova versão...\n")
+            self.driver = webdriver.Chrome(service=Service(resolve_chromedriver_path(self.log_area, refresh=True)), options=options)
+        self.wait = WebDriverWait(self.driver, 20)
+        self.waiter = GridChangeWaiter(self.driver)
+
+    @traced("MainframeSession.login_and_navigate", category="mainframe")
+    def _login_and_navigate(self):
+        """Steps 1-5: login, navigation and switching into the Power BI iframe."""
+        driver, wait, log_area = self.driver, self.wait, self.log_area
+        self._parked = False
+
+        driver.switch_to.default_content()
+        if not self._at_login_page:
+            log_area.write("  - Navegando para a página de login...\n")
+            driver.get(MAINFRAME_LOGIN_URL)
+        self._at_login_page = False
+        with span("login", "mainframe"):
+            wait.until(EC.element_to_be_clickable((By.ID, LOGIN_USERNAME_ID))).send_keys(self.username)
+            wait.until(EC.element_to_be_clickable((By.ID, 'ctl00_PlaceHolderMain_signInControl_password'))).send_keys(self.password)
+            wait.until(EC.element_to_be_clickable((By.ID, 'ctl00_PlaceHolderMain_signInControl_login'))).click()
+        self.logged_in_as = self.username
 
         log_area.write("  - Clicando em 'SPG'...\n")
-        wait.until(EC.element_to_be_clickable((By.XPATH, "//div[contains(@style, 'SPG.png')]"))).click()
+        with span("clique SPG", "mainframe"):
+            wait.until(EC.element_to_be_clickable((By.XPATH, "//div[contains(@style, 'SPG.png')]"))).click()
 
         log_area.write("  - Clicando em 'MAINFRAME - Aposentadoria'...\n")
-        wait.until(EC.element_to_be_clickable((By.XPATH, "//div[@title='MAINFRAME - Aposentadoria']"))).click()
+        with span("clique MAINFRAME - Aposentadoria", "mainframe"):
+            wait.until(EC.element_to_be_clickable((By.XPATH, "//div[@title='MAINFRAME - Aposentadoria']"))).click()
 
         log_area.write("  - Mudando para o iframe container (dw-report)...\n")
         wait.until(EC.frame_to_be_available_and_switch_to_it((By.XPATH, "//iframe[contains(@src, 'dw-report.educacao.go.gov.br')]")))
@@ -397,55 +1040,150 @@ def scrape_mainframe_data(cpf, username, password, log_area, unidades_data):
 
         log_area.write("  - Aguardando o carregamento inicial da tabela de dados...\n")
         wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.tableEx")))
+        self._parked = True
+
+    def ensure_ready(self):
+        """Starts the browser and logs in if needed, leaving the driver inside the Power BI frame."""
+        if self.driver is None:
+            self._start_driver()
+        if not self._parked:
+            self._login_and_navigate()
+
+    def is_session_alive(self):
+        """Cheap check that the browser is still parked on the report (and not bounced to the login page)."""
+        if self.driver is None or not self._parked:
+            return False
+        try:
+            return bool(self.driver.find_elements(By.CSS_SELECTOR, "div.tableEx"))
+        except WebDriverException:
+            return False
+
+    @traced("MainframeSession.lookup", category="mainframe")
+    def lookup(self, cpf, unidades_data, log_area=None, progress=None):
+        """
+        Returns the scraped rows for one CPF, re-logging in once if the session has expired.
+        `log_area` (when given) and `progress` apply from this lookup on; they are set under
+        the session lock, so a warm-up still running keeps writing to the previous log.
+        """
+        with self._lock:
+            if log_area is not None:
+                self.log_area = log_area
+            self.progress = progress
+            try:
+                return self._lookup(cpf, unidades_data)
+            finally:
+                self.progress = None
+
+    def _lookup(self, cpf, unidades_data):
+        for attempt in (1, 2):
+            try:
+                if self.driver is not None and not self.is_session_alive():
+                    self.log_area.write("  - Sessão do MAINFRAME expirada ou fora do relatório. Refazendo login...\n")
+                    self._parked = False
+                self.ensure_ready()
+                return self._scrape_cpf(cpf, unidades_data)
+            except WebDriverException:
+                if attempt == 2:
+                    raise
+                self.log_area.write("  - Falha na sessão do MAINFRAME. Tentando novamente após novo login...\n")
+                self._parked = False
+                if self.driver is not None:
+                    try:
+                        self.driver.current_url
+                    except WebDriverException:
+                        # The browser itself is gone: start a new one.
+                        self._quit_driver()
+
+    @traced("MainframeSession.apply_cpf_filter", category="mainframe")
+    def _apply_cpf_filter(self, cpf):
+        """Step 6: re-types the CPF in the search slicer and returns to the Power BI frame."""
+        driver, wait = self.driver, self.wait
+        table_container = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.tableEx")))
+        grid_before_filter = self.waiter.state(table_container)
 
-        log_area.write("  - Procurando e interagindo com o filtro de CPF...\n")
+        self.log_area.write("  - Procurando e interagindo com o filtro de CPF...\n")
         cpf_visual_container = wait.until(EC.presence_of_element_located((By.XPATH, "//div[contains(@class, 'visualContainer') and @aria-label='CPF ']")))
         search_iframe = cpf_visual_container.find_element(By.TAG_NAME, "iframe")
         wait.until(EC.frame_to_be_available_and_switch_to_it(search_iframe))
-        cpf_numeric = cpf.replace('.', '').replace('-', '')
-        search_input = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, 'input[name="search-field"]')))
-        search_input.clear()
-        search_input.send_keys(cpf_numeric)
-        wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, 'button.search-button'))).click()
-        driver.switch_to.parent_frame()
-
-        log_area.write("  - Aguardando a tabela ser filtrada...\n")
+        try:
+            cpf_numeric = cpf.replace('.', '').replace('-', '')
+            search_input = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, 'input[name="search-field"]')))
+            search_input.clear()
+            search_input.send_keys(cpf_numeric)
+            wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, 'button.search-button'))).click()
+        finally:
+            driver.switch_to.parent_frame()
+
+        self.log_area.write("  - Aguardando a tabela ser filtrada...\n")
         wait.until(EC.invisibility_of_element_located((By.TAG_NAME, "spinner")))
-        time.sleep(2)
+        if not self.waiter.wait_for_change(table_container, grid_before_filter, "filtro", timeout=5):
+            self.log_area.write("  - AVISO: A tabela não mudou após o filtro (mesmo CPF ou resultado idêntico).\n")
 
-        # --- Step 7: Scrape in Two Passes with explicit scrolling ---        
-        collected_data = {}
+    def _collect_grid_rows(self, table_container, vertical_scroll_container, columns):
+        """
+        One vertical pass over the virtualized grid. Each scroll position costs a single
+        execute_script that returns every rendered row with the requested columns.
+        A row is kept only once all its cells are rendered, so it can be picked up again
+        at a later position instead of being lost.
+        """
+        rows_by_index = {}
+        last_known_row_count = -1
+        with span("MainframeSession.collect_grid_rows", "mainframe", colunas=",".join(columns)):
+            while last_known_row_count != len(rows_by_index):
+                last_known_row_count = len(rows_by_index)
+                for row_index, cells in self.driver.execute_script(READ_GRID_ROWS_JS, table_container, list(columns)):
+                    if row_index and row_index not in rows_by_index and all(cells.get(col) is not None for col in columns):
+                        rows_by_index[row_index] = cells
+                self._report_rows(len(rows_by_index) - last_known_row_count)
+
+                self.waiter.scroll_and_wait(vertical_scroll_container, table_container, "rolagem")
+        return rows_by_index
+
+    def _report_rows(self, row_count):
+        if self.progress and row_count > 0:
+            self.progress.advance('scrape', step=row_count)
+
+    def _querydata_request_ids(self):
+        """Drains Chrome's performance log and returns the ids of the Power BI querydata responses in it."""
+        request_ids = []
+        for entry in self.driver.get_log('performance'):
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, ValueError):
+                continue
+            if message.get('method') == 'Network.responseReceived':
+                params = message['params']
+                if 'querydata' in params['response'].get('url', ''):
+                    request_ids.append(params['requestId'])
+        return request_ids
+
+    @traced("MainframeSession.collect_rows_from_network", category="mainframe")
+    def _collect_rows_from_network(self):
+        """Reads the grid rows from the querydata responses received since the filter; None if not usable."""
+        # The latest response is the one for the current filter.
+        for request_id in reversed(self._querydata_request_ids()):
+            try:
+                body = self.driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+            except WebDriverException:
+                continue
+            collected = rows_from_powerbi_response(body.get('body', ''))
+            if collected:
+                return collected
+        return None
 
-        # Find the main table container
-        table_container = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.tableEx")))
-        vertical_scroll_container = table_container.find_element(By.CSS_SELECTOR, 'div.mid-viewport')
+    @traced("MainframeSession.collect_two_passes", category="mainframe")
+    def _collect_two_passes(self, table_container, vertical_scroll_container):
+        """
+        Narrow-grid fallback: a vertical pass for code and dates, a drag of the horizontal
+        scrollbar, then a second vertical pass for the Unidade column, joined by aria-rowindex.
+        """
+        driver, log_area = self.driver, self.log_area
+        collected_data = {}
 
         # --- PASS 1: Get left-side columns (vertical scroll only) ---
         log_area.write("  - Iniciando 1ª passagem vertical (Código e Data)...\n")
-        processed_row_keys_pass1 = set()
-        last_known_row_count = -1
-        
-        while last_known_row_count != len(processed_row_keys_pass1):
-            last_known_row_count = len(processed_row_keys_pass1)
-            rows = table_container.find_elements(By.XPATH, './/div[@role="row" and contains(@class, "row")]')
-            for row in rows:
-                try:
-                    row_index = row.get_attribute('aria-rowindex')
-                    if row_index and row_index not in processed_row_keys_pass1:
-                        processed_row_keys_pass1.add(row_index)
-                        code_cell = row.find_element(By.XPATH, './/div[@role="gridcell" and @aria-colindex="2"]')
-                        date_cell_1 = row.find_element(By.XPATH, './/div[@role="gridcell" and @aria-colindex="9"]')
-                        date_cell_2 = row.find_element(By.XPATH, './/div[@role="gridcell" and @aria-colindex="8"]')
-                        collected_data[row_index] = {
-                            'code': code_cell.text, 
-                            'date1': date_cell_1.text, 
-                            'date2': date_cell_2.text
-                        }
-                except NoSuchElementException:
-                    continue
-            
-            driver.execute_script("arguments[0].scrollTop += arguments[0].clientHeight;", vertical_scroll_container)
-            time.sleep(0.5)
+        for row_index, cells in self._collect_grid_rows(table_container, vertical_scroll_container, ("2", "9", "8")).items():
+            collected_data[row_index] = {'code': cells["2"], 'date1': cells["9"], 'date2': cells["8"]}
 
         # --- Horizontal scroll (using ActionChains on Power BI's custom scrollbar) ---
         log_area.write("  - Rolando horizontalmente (drag do scrollbar)...\n")
@@ -453,75 +1191,171 @@ def scrape_mainframe_data(cpf, username, password, log_area, unidades_data):
             By.XPATH,
             './/div[@class="scroll-bar-div" and contains(@style, "height: 9px")]//div[@class="scroll-bar-part-bar"]'
         )
+        grid_before_drag = self.waiter.state(table_container)
         actions = ActionChains(driver)
         actions.click_and_hold(horizontal_scrollbar).move_by_offset(500, 0).release().perform()
-        time.sleep(1)
+        self.waiter.wait_for_change(table_container, grid_before_drag, "horizontal", timeout=3)
 
         # Reset vertical scroll
-        driver.execute_script("arguments[0].scrollTop = 0;", vertical_scroll_container)
-        time.sleep(1)
+        self.waiter.scroll_and_wait(vertical_scroll_container, table_container, "topo", script=SCROLL_TO_TOP_JS)
 
         # --- PASS 2: Get right-side column after horizontal scroll ---
         log_area.write("  - Iniciando 2ª passagem vertical (Unidade)...\n")
-        processed_row_keys_pass2 = set()
-        last_known_row_count = -1
-        while last_known_row_count != len(processed_row_keys_pass2):
-            last_known_row_count = len(processed_row_keys_pass2)
-            rows = table_container.find_elements(By.XPATH, './/div[@role="row" and contains(@class, "row")]')
-            for row in rows:
-                try:
-                    row_index = row.get_attribute('aria-rowindex')
-                    if row_index and row_index not in processed_row_keys_pass2:
-                        processed_row_keys_pass2.add(row_index)
-                        unidade_cell = row.find_element(By.XPATH, './/div[@role="gridcell" and @aria-colindex="15"]')
-                        if row_index in collected_data:
-                            collected_data[row_index]['unidade'] = unidade_cell.text
-                except NoSuchElementException:
-                    continue
-            
-            driver.execute_script("arguments[0].scrollTop += arguments[0].clientHeight;", vertical_scroll_container)
-            time.sleep(0.5)
-                
-        # --- Combine results ---
-        log_area.write("  - Processando e combinando dados coletados...\n")
-        for row_index, data in collected_data.items():
-            code = data.get('code')
-            date_str_1 = data.get('date1')
-            date_str_2 = data.get('date2')
-            unidade_str = data.get('unidade')
-
-            lotacao_display = "-------"
-            if unidade_str and unidade_str.strip():
-                best_match_unit = find_best_unit_match(unidade_str, unidades_data)
-                if best_match_unit:
-                    lotacao_display = best_match_unit['display_string']
-                else:
-                    lotacao_display = unidade_str.strip()
+        for row_index, cells in self._collect_grid_rows(table_container, vertical_scroll_container, ("15",)).items():
+            if row_index in collected_data:
+                collected_data[row_index]['unidade'] = cells["15"]
 
-            if code and code.isdigit() and date_str_1 and date_str_2:
-                try:
-                    formatted_code = code.zfill(3)
-                    
-                    # Clean up spaces from date strings before parsing
-                    cleaned_date_1 = date_str_1.replace(" ", "")
-                    cleaned_date_2 = date_str_2.replace(" ", "")
+        # Leave the grid as the next lookup expects it: scrolled back to the left and to the top.
+        try:
+            ActionChains(driver).click_and_hold(horizontal_scrollbar).move_by_offset(-500, 0).release().perform()
+            driver.execute_script("arguments[0].scrollTop = 0;", vertical_scroll_container)
+        except WebDriverException:
+            # The rows are already collected; just reload the report before the next lookup.
+            self._parked = False
+        return collected_data
+
+    @traced("MainframeSession.scrape_cpf", category="mainframe")
+    def _scrape_cpf(self, cpf, unidades_data):
+        driver, wait, log_area = self.driver, self.wait, self.log_area
+        self.waiter.reset()
+        if self.progress:
+            # The total is only known once the grid has been read.
+            self.progress.start('scrape', unit="linhas")
+        if self.extraction_mode == 'network':
+            # Discard responses from earlier lookups and from the report's initial load.
+            self._querydata_request_ids()
+        self._apply_cpf_filter(cpf)
+
+        if self.extraction_mode == 'network':
+            collected_data = self._collect_rows_from_network()
+            if collected_data:
+                self._report_rows(len(collected_data))
+                log_area.write(f"  - {len(collected_data)} linhas lidas da resposta de consulta do Power BI (sem rolagem da tabela).\n")
+                scraped_data = build_scraped_data(collected_data, unidades_data, log_area)
+                log_area.write(f"SUCESSO: Scraping do MAINFRAME concluído. {len(collected_data)} linhas de dados processadas.\n")
+                return scraped_data
+            log_area.write("  - AVISO: Resposta do Power BI não encontrada ou incompleta. Lendo a tabela pela página...\n")
+
+        # --- Step 7: Scrape the grid with explicit scrolling ---
+        # Find the main table container
+        table_container = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.tableEx")))
+        vertical_scroll_container = table_container.find_element(By.CSS_SELECTOR, 'div.mid-viewport')
 
-                    date_obj_1 = datetime.strptime(cleaned_date_1.split(' ')[0], '%d/%m/%Y')
-                    date_obj_2 = datetime.strptime(cleaned_date_2.split(' ')[0], '%d/%m/%Y')
-                    
-                    # Sort the dates and format the period string
-                    sorted_dates = sorted([date_obj_1, date_obj_2])
-                    periodo_str = f"{sorted_dates[0]:%d/%m/%Y} - {sorted_dates[1]:%d/%m/%Y}"
-                    
-                    # Use the earlier date for year-based aggregation
-                    year_str = str(sorted_dates[0].year)
-                    # Add the new 5-element tuple to the set
-                    scraped_data[year_str].add((sorted_dates[0], formatted_code, "[MAINFRAME]", lotacao_display, periodo_str))
-                except (ValueError, IndexError):
-                    pass
+        # A previous lookup may have left the grid scrolled down.
+        self.waiter.scroll_and_wait(vertical_scroll_container, table_container, "topo", script=SCROLL_TO_TOP_JS)
+
+        if self.single_pass and driver.execute_script(COLUMNS_RENDERED_JS, table_container, list(GRID_COLUMNS)):
+            log_area.write("  - Iniciando passagem vertical única (Código, Data e Unidade)...\n")
+            collected_data = {
+                row_index: {'code': cells["2"], 'date1': cells["9"], 'date2': cells["8"], 'unidade': cells["15"]}
+                for row_index, cells in self._collect_grid_rows(table_container, vertical_scroll_container, GRID_COLUMNS).items()
+            }
+            driver.execute_script(SCROLL_TO_TOP_JS, vertical_scroll_container)
+        else:
+            if self.single_pass:
+                log_area.write("  - AVISO: A coluna Unidade não está visível. Usando duas passagens...\n")
+            collected_data = self._collect_two_passes(table_container, vertical_scroll_container)
 
+        # --- Combine results ---
+        log_area.write("  - Processando e combinando dados coletados...\n")
+        scraped_data = build_scraped_data(collected_data, unidades_data, log_area)
+        log_area.write(f"  - Tempo de espera pela tabela: {self.waiter.summary()}\n")
         log_area.write(f"SUCESSO: Scraping do MAINFRAME concluído. {len(collected_data)} linhas de dados processadas.\n")
         return scraped_data
+
+    def _quit_driver(self):
+        if self.driver:
+            try:
+                self.driver.switch_to.default_content()
+            except Exception:
+                pass
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+        self.driver = None
+        self.wait = None
+        self.waiter = None
+        self._parked = False
+        self._at_login_page = False
+        self.logged_in_as = None
+
+    def close(self):
+        # A warm-up still starting Chrome gets a few seconds to finish, so its browser is not left behind.
+        acquired = self._lock.acquire(timeout=5)
+        try:
+            self._quit_driver()
+        finally:
+            if acquired:
+                self._lock.release()
+
+@traced(category="mainframe")
+def build_scraped_data(collected_data, unidades_data, log_area=None):
+    """
+    Turns the raw grid rows ({row_index: {code, date1, date2, unidade}}) into yearly MAINFRAME FuncaoRecords.
+    Unit names are resolved through the persistent memo, so repeated names skip the fuzzy match.
+    """
+    scraped_data = defaultdict(set)
+    unit_memo = open_unit_resolution_memo(unidades_fingerprint(unidades_data))
+    for row_index, data in collected_data.items():
+        code = data.get('code')
+        date_str_1 = data.get('date1')
+        date_str_2 = data.get('date2')
+        unidade_str = data.get('unidade')
+
+        lotacao_display = "-------"
+        if unidade_str and unidade_str.strip():
+            best_match_unit = find_best_unit_match(unidade_str, unidades_data, unit_memo)
+            if best_match_unit:
+                lotacao_display = best_match_unit['display_string']
+            else:
+                lotacao_display = unidade_str.strip()
+
+        if code and code.isdigit() and date_str_1 and date_str_2:
+            try:
+                formatted_code = code.zfill(3)
+                
+                # Clean up spaces from date strings before parsing
+                cleaned_date_1 = date_str_1.replace(" ", "")
+                cleaned_date_2 = date_str_2.replace(" ", "")
+
+                date_obj_1 = datetime.strptime(cleaned_date_1.split(' ')[0], '%d/%m/%Y')
+                date_obj_2 = datetime.strptime(cleaned_date_2.split(' ')[0], '%d/%m/%Y')
+                
+                # The earlier date starts the period
+                sorted_dates = sorted([date_obj_1, date_obj_2])
+                
+                # Use the earlier date for year-based aggregation
+                year_str = str(sorted_dates[0].year)
+                scraped_data[year_str].add(FuncaoRecord(
+                    sorted_dates[0], formatted_code, "[MAINFRAME]", lotacao_display, sorted_dates[0].date(), sorted_dates[1].date()
+                ))
+            except (ValueError, IndexError):
+                pass
+
+    unit_memo.save()
+    if log_area:
+        log_area.write(f"  - Unidades associadas: {unit_memo.summary()}.\n")
+    return scraped_data
+
+@traced(category="mainframe")
+def scrape_mainframe_data(cpf, username, password, log_area, unidades_data, session=None, progress=None):
+    """
+    Scrapes the CPF's rows from the MAINFRAME Power BI report. With [mainframe] extraction =
+    network they are read from the report's query response; otherwise from the grid. The
+    browser window is wide enough for Código, the dates and Unidade to render together, so
+    one vertical pass reads them all; if Unidade is not rendered (or single_pass is off),
+    _collect_two_passes reads the left columns, drags the horizontal scrollbar and reads
+    Unidade in a second pass.
+    Pass a MainframeSession to reuse its logged-in browser; otherwise a temporary one is used.
+    Grid rows read are counted on the 'scrape' stage of `progress`, when given.
+    """
+    log_area.write("Iniciando scraping do MAINFRAME...\n")
+    owns_session = session is None
+    if owns_session:
+        session = MainframeSession(username, password, log_area)
+    try:
+        return session.lookup(cpf, unidades_data, log_area, progress)
         
     except Exception as e:
         log_area.write(f"\nERRO durante o scraping do MAINFRAME: {e}\n")
@@ -530,12 +1364,263 @@ def scrape_mainframe_data(cpf, username, password, log_area, unidades_data):
         return None
         
     finally:
-        if driver:
-            try:
-                driver.switch_to.default_content()
-            except Exception:
-                pass
-            driver.quit()
+        if owns_session:
+            session.close()
+
+# --- Analysis Pipeline (shared by the GUI and the batch CLI) ---
+@traced(category="pdf")
+def read_pdf_header(pdf_session, log_area, unidades_data, pdf_cache=None):
+    """
+    Stage 0: reads CPF, name and Data Início into the session and returns the CPF
+    (None when it is missing). If the file is found in `pdf_cache`, the cached
+    yearly MDL data is attached to the session so read_pdf_yearly_data skips parsing.
+    """
+    pdf_session.cached_yearly_data = None
+    pdf_session.result_cache = pdf_cache
+    pdf_session.result_cache_key = None
+    if pdf_cache and pdf_cache.enabled:
+        try:
+            pdf_session.result_cache_key = pdf_cache.make_key(pdf_session.pdf_path, PDF_PARSER_VERSION, unidades_fingerprint(unidades_data))
+            cached_pdf_result = pdf_cache.get(pdf_session.result_cache_key)
+        except OSError as e:
+            log_area.write(f"  - AVISO: Cache do PDF indisponível: {e}\n")
+            cached_pdf_result = None
+
+        if cached_pdf_result is not None:
+            cpf, name, data_inicio, pdf_session.cached_yearly_data = decode_pdf_result(cached_pdf_result)
+            pdf_session.cpf, pdf_session.name, pdf_session.data_inicio = cpf, name, data_inicio
+            log_area.write("  - Resultado do PDF encontrado no cache. A análise do PDF será pulada.\n")
+            log_area.write(f"  - CPF do servidor: {cpf}\n  - Nome do servidor: {name}\n  - Data Início: {data_inicio}\n")
+            return cpf
+
+    pdf_session.cpf = extract_cpf_from_pdf(pdf_session, log_area)
+    if not pdf_session.cpf:
+        return None
+    pdf_session.name = extract_name_from_pdf(pdf_session, log_area)
+    pdf_session.data_inicio = extract_data_inicio_from_pdf(pdf_session, log_area)
+    return pdf_session.cpf
+
+@traced(category="pdf")
+def read_pdf_yearly_data(pdf_session, log_area, unidades_data, progress=None, max_workers=None):
+    """Stage 2: returns the yearly MDL tuples, from the result cache when read_pdf_header found them."""
+    if pdf_session.cached_yearly_data is not None:
+        log_area.write("  - Usando o resultado do PDF armazenado em cache.\n")
+        if progress:
+            progress.finish('pdf')
+        return pdf_session.cached_yearly_data
+
+    pdf_data = aggregate_yearly_data_multi_report(pdf_session, log_area, unidades_data, progress, max_workers=max_workers)
+    if pdf_data is None:
+        return {}
+    # An empty result (e.g. every report predates 05/2014) is cached too, so the file is not re-parsed.
+    if pdf_session.result_cache_key:
+        pdf_session.result_cache.put(
+            pdf_session.result_cache_key,
+            encode_pdf_result(pdf_session.cpf, pdf_session.name, pdf_session.data_inicio, pdf_data)
+        )
+    return pdf_data
+
+def _write_stage_header(log_area, title):
+    log_area.write(f"\n{title}\n" + "="*50 + "\n")
+
+@traced(category="mesclagem")
+def merge_yearly_data(pdf_data, scraped_data, log_area):
+    """Block 3: picks MAINFRAME rows before 2014, MDL rows after it, and mixes both by month in 2014."""
+    final_yearly_data = defaultdict(list)
+    
+    # Get a superset of all years from both sources
+    all_years = set(pdf_data.keys()) | set(scraped_data.keys() if scraped_data else {})
+
+    for year in sorted(list(all_years)):
+        year_int = int(year)
+        
+        # Helper to add a row to the final data, now including the source.
+        # Rows are copies, so the later stages can edit them without touching the source sets.
+        def add_row(data_source, year_key, source_label):
+            for record in data_source[year_key]:
+                final_yearly_data[year_key].append(record.replace(source=source_label))
+
+        if year_int < 2014:
+            log_area.write(f"  - Ano {year}: Usando dados exclusivamente do MAINFRAME.\n")
+            if scraped_data and year in scraped_data:
+                add_row(scraped_data, year, "[MAINFRAME]")
+        
+        elif year_int > 2014:
+            log_area.write(f"  - Ano {year}: Usando dados exclusivamente do PDF (MDL).\n")
+            if year in pdf_data:
+                add_row(pdf_data, year, "[MDL]")
+
+        else: # year_int == 2014
+            log_area.write(f"  - Ano {year}: Mesclando dados (ano de transição).\n")
+            
+            if scraped_data and year in scraped_data:
+                for record in scraped_data[year]:
+                    if record.date.month < 5:
+                        final_yearly_data[year].append(record.replace(source="[MAINFRAME]"))
+            
+            if year in pdf_data:
+                for record in pdf_data[year]:
+                    if record.date.month >= 5:
+                        final_yearly_data[year].append(record.replace(source="[MDL]"))
+
+    return final_yearly_data
+
+@traced(category="mesclagem")
+def harmonize_transition_lotacoes(final_yearly_data, log_area):
+    """Block 3.5: rewrites 2014 MAINFRAME lotações to the MDL form when the location names match."""
+    if '2014' not in final_yearly_data:
+        return
+
+    name_to_golden_lotacao = {}
+    for row in final_yearly_data['2014']:
+        if row.source == '[MDL]':
+            lotacao_parts = row.lotacao.split(' - ', 1)
+            if len(lotacao_parts) > 1:
+                location_name = lotacao_parts[1].strip()
+                if location_name not in name_to_golden_lotacao:
+                    name_to_golden_lotacao[location_name] = row.lotacao
+                    log_area.write(f"  - Mapeando '{location_name}' para o padrão MDL: '{row.lotacao}'\n")
+
+    for row in final_yearly_data['2014']:
+        if row.source == '[MAINFRAME]':
+            lotacao_parts = row.lotacao.split(' - ', 1)
+            if len(lotacao_parts) > 1:
+                location_name = lotacao_parts[1].strip()
+                if location_name in name_to_golden_lotacao:
+                    old_lotacao = row.lotacao
+                    new_lotacao = name_to_golden_lotacao[location_name]
+                    if old_lotacao != new_lotacao:
+                        log_area.write(f"  - Harmonizando Lotação: De '{old_lotacao}' para '{new_lotacao}'\n")
+                        row.lotacao = new_lotacao
+
+@traced(category="mesclagem")
+def filter_before_start_date(final_yearly_data, data_inicio, log_area):
+    """Block 3.8: drops the years before the employee's Data Início (kept as-is if it cannot be parsed)."""
+    try:
+        # Get the employee's official start year from the extracted date.
+        start_date_obj = datetime.strptime(data_inicio, '%d/%m/%Y')
+        start_year = start_date_obj.year
+        log_area.write(f"  - Data de Início do Cargo: {data_inicio}. Anos anteriores a {start_year} serão ignorados.\n")
+
+        filtered_data = defaultdict(list)
+        
+        # Iterate through the collected data and keep only the relevant years.
+        for year_str, rows in final_yearly_data.items():
+            if int(year_str) >= start_year:
+                filtered_data[year_str] = rows
+            else:
+                log_area.write(f"  - Ignorando dados do ano {year_str} (anterior a {start_year}).\n")
+        
+        return filtered_data
+
+    except (ValueError, TypeError):
+        log_area.write("  - AVISO: Não foi possível determinar a Data de Início. A filtragem por ano não será aplicada.\n")
+        return final_yearly_data
+
+@traced(category="mesclagem")
+def deduplicate_yearly_data(final_yearly_data, log_area):
+    """Block 4: keeps the earliest row for each (code, lotacao, periodo) within a year."""
+    for year in list(final_yearly_data.keys()):
+        unique_entries_in_year = {}
+        original_row_count = len(final_yearly_data[year])
+
+        sorted_rows = sorted(final_yearly_data[year], key=lambda r: r.date)
+        
+        for row in sorted_rows:
+            key = (row.code, row.lotacao, row.start, row.end, row.raw_periodo)
+            if key not in unique_entries_in_year:
+                unique_entries_in_year[key] = row
+        
+        if original_row_count > len(unique_entries_in_year):
+            log_area.write(f"  - Ano {year}: {original_row_count} linhas -> {len(unique_entries_in_year)} linhas únicas.\n")
+
+        final_yearly_data[year] = list(unique_entries_in_year.values())
+
+    return final_yearly_data
+
+@traced(category="mesclagem")
+def consolidate_periods(final_yearly_data, log_area=None):
+    """
+    Block 4.2: merges each (code, lotacao) group of a year into one row per continuous
+    stretch of time; periods separated by a gap stay on separate rows (see timeline.py).
+    """
+    consolidated_data = defaultdict(list)
+    for year, rows in final_yearly_data.items():
+        consolidated_data[year] = consolidate_records(rows)
+        if log_area and len(consolidated_data[year]) < len(rows):
+            log_area.write(f"  - Ano {year}: {len(rows)} linhas -> {len(consolidated_data[year])} períodos contínuos.\n")
+
+    return consolidated_data
+
+SPECIAL_FUNCTION_CODES = {"004", "003", "001", "141", "140", "109", "098", "044"}
+
+@traced(category="mesclagem")
+def find_special_functions(final_yearly_data, funcoes_data, log_area):
+    """Block 4.5: returns the {(code, descricao)} of the special functions present in the report."""
+    found_special_functions = set()
+
+    for year in final_yearly_data:
+        for row in final_yearly_data[year]:
+            code = row.code
+            if code in SPECIAL_FUNCTION_CODES:
+                func_info = funcoes_data.get(code, {'descricao': 'Função Desconhecida'})
+                found_special_functions.add((code, func_info['descricao']))
+                log_area.write(f"  - Função Especial encontrada: ({code}) {func_info['descricao']}\n")
+
+    return found_special_functions
+
+# Merge stages counted by build_final_report's progress (Etapas 3, 3.5, 3.8, 4, 4.2 and 4.5).
+MERGE_STAGE_COUNT = 6
+
+@traced(category="mesclagem")
+def build_final_report(pdf_data, scraped_data, data_inicio, funcoes_data, log_area, progress=None):
+    """
+    Runs the merge stages (Etapa 3 to 4.5) and returns (final_yearly_data, found_special_functions).
+    Each finished stage is counted on the 'merge' stage of `progress`, when given.
+    """
+    def stage_done():
+        if progress:
+            progress.advance('merge')
+
+    if progress:
+        progress.start('merge', total=MERGE_STAGE_COUNT, unit="etapas")
+    _write_stage_header(log_area, "Iniciando Etapa 3: Mesclando Dados com Base na Data...")
+    final_yearly_data = merge_yearly_data(pdf_data, scraped_data, log_area)
+    stage_done()
+
+    _write_stage_header(log_area, "Iniciando Etapa 3.5: Harmonizando Lotações de 2014...")
+    harmonize_transition_lotacoes(final_yearly_data, log_area)
+    stage_done()
+
+    _write_stage_header(log_area, "Iniciando Etapa 3.8: Filtrando registros anteriores à Data de Início...")
+    final_yearly_data = filter_before_start_date(final_yearly_data, data_inicio, log_area)
+    stage_done()
+
+    _write_stage_header(log_area, "Iniciando Etapa 4: Removendo Registros Duplicados...")
+    final_yearly_data = deduplicate_yearly_data(final_yearly_data, log_area)
+    stage_done()
+
+    _write_stage_header(log_area, "Iniciando Etapa 4.2: Consolidando Períodos Agrupados...")
+    final_yearly_data = consolidate_periods(final_yearly_data, log_area)
+    coverage = covered_days_by_year(final_yearly_data)
+    if coverage:
+        log_area.write("  - Dias cobertos por ano: " + ", ".join(f"{year}: {days}" for year, days in sorted(coverage.items())) + "\n")
+    stage_done()
+
+    _write_stage_header(log_area, "Iniciando Etapa 4.5: Identificando Funções Especiais...")
+    # Codes created after the reference data was loaded are fetched from the DB.
+    fetched_codes = lookup_funcoes({row.code for rows in final_yearly_data.values() for row in rows}, funcoes_data)
+    if fetched_codes:
+        log_area.write(f"  - Funções obtidas do banco de dados: {', '.join(fetched_codes)}\n")
+    found_special_functions = find_special_functions(final_yearly_data, funcoes_data, log_area)
+    if progress:
+        progress.finish('merge')
+
+    return final_yearly_data, found_special_functions
+
+def render_report_text(name, cpf, data_inicio, final_yearly_data, found_special_functions, funcoes_data):
+    """Renders the fixed-width report shown in the results area and saved as MDL_<cpf>_FUNCOES.txt."""
+    return render_text(build_report_model(name, cpf, data_inicio, final_yearly_data, found_special_functions, funcoes_data))
 
 # --- Tkinter GUI Application ---
 class PdfAnalyzerApp:
@@ -544,13 +1629,9 @@ class PdfAnalyzerApp:
         master.title("Funções MDL")
         master.state('zoomed')
 
-        initial_data = load_all_initial_data()
-        if not initial_data or not initial_data.get('funcoes') or not initial_data.get('unidades'):
-            master.destroy()
-            return
-        
-        self.funcoes_data = initial_data['funcoes']
-        self.unidades_data = initial_data['unidades']
+        # Filled in by the background load started at the end of __init__.
+        self.funcoes_data = None
+        self.unidades_data = None
         
         # --- Window Sizing and Centering ---
         window_width = 1200
@@ -563,6 +1644,12 @@ class PdfAnalyzerApp:
 
         self.selected_pdf_path = None
         self._results_modified_event_id = None 
+        # Logged-in MAINFRAME browser, reused across analyses while the credentials stay the same.
+        self.mainframe_session = None
+        # Model of the last report shown, used for the CSV/JSON Lines files.
+        self.report_model = None
+        self._warm_up_thread = None
+        master.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # --- Top Controls Frame ---
         top_controls_frame = tk.Frame(master, pady=10)
@@ -574,6 +1661,10 @@ class PdfAnalyzerApp:
         self.pdf_path_entry = tk.Entry(top_controls_frame, width=60, state='readonly')
         self.pdf_path_entry.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
 
+        self.reload_data_button = tk.Button(top_controls_frame, text="Tentar novamente", command=self.start_reference_data_load)
+        self.reference_data_status = tk.StringVar()
+        tk.Label(top_controls_frame, textvariable=self.reference_data_status).pack(side=tk.RIGHT, padx=(10, 0))
+
         # --- MAINFRAME Login Frame ---
         mainframe_frame = tk.LabelFrame(master, text="MAINFRAME Login", padx=10, pady=5)
         mainframe_frame.pack(fill=tk.X, padx=10, pady=(5, 0))
@@ -584,6 +1675,7 @@ class PdfAnalyzerApp:
         self.mainframe_user.trace_add("write", self._update_analyze_button_state)
         mainframe_user_entry = tk.Entry(mainframe_frame, textvariable=self.mainframe_user, width=25)
         mainframe_user_entry.pack(side=tk.LEFT, padx=(0, 15))
+        mainframe_user_entry.bind("<FocusOut>", self.start_mainframe_warm_up)
 
         # Password
         tk.Label(mainframe_frame, text="Senha:").pack(side=tk.LEFT, padx=(0, 5))
@@ -591,6 +1683,7 @@ class PdfAnalyzerApp:
         self.mainframe_pass.trace_add("write", self._update_analyze_button_state)
         mainframe_pass_entry = tk.Entry(mainframe_frame, textvariable=self.mainframe_pass, show="*", width=25)
         mainframe_pass_entry.pack(side=tk.LEFT)
+        mainframe_pass_entry.bind("<FocusOut>", self.start_mainframe_warm_up)
 
         # 'Procurar Funções' button
         self.analyze_button = tk.Button(mainframe_frame, text="PROCURAR FUNÇÕES", command=self.start_analysis_thread, state=tk.DISABLED)
@@ -602,11 +1695,11 @@ class PdfAnalyzerApp:
 
         tk.Label(consultar_funcao_frame, text="Código:").pack(side=tk.LEFT, padx=(0, 5))
         
-        self.funcao_code_entry = tk.Entry(consultar_funcao_frame, width=10)
+        self.funcao_code_entry = tk.Entry(consultar_funcao_frame, width=10, state=tk.DISABLED)
         self.funcao_code_entry.pack(side=tk.LEFT, padx=(0, 5))
         self.funcao_code_entry.bind("<Return>", self.consult_funcao)
 
-        self.consultar_funcao_button = tk.Button(consultar_funcao_frame, text="Consultar", command=self.consult_funcao)
+        self.consultar_funcao_button = tk.Button(consultar_funcao_frame, text="Consultar", command=self.consult_funcao, state=tk.DISABLED)
         self.consultar_funcao_button.pack(side=tk.LEFT, padx=(0, 10))
 
         tk.Label(consultar_funcao_frame, text="Função:").pack(side=tk.LEFT, padx=(0, 5))
@@ -618,7 +1711,9 @@ class PdfAnalyzerApp:
 
         # --- Progress Bar ---
         self.progress_bar = ttk.Progressbar(master, orient="horizontal", length=300, mode="determinate")
-        self.progress_bar.pack(pady=(0,10), padx=10, fill=tk.X)
+        self.progress_bar.pack(pady=(0,2), padx=10, fill=tk.X)
+        self.progress_text = tk.StringVar()
+        tk.Label(master, textvariable=self.progress_text, anchor="w").pack(pady=(0,8), padx=10, fill=tk.X)
 
         # Save button frame
         save_button_frame = tk.Frame(master)
@@ -645,19 +1740,63 @@ class PdfAnalyzerApp:
 
         # --- Final Setup ---
         self.master.after(150, self.set_initial_pane_sizes)
-        self.stdout_redirector = TextRedirector(self.log_area)
-        self.stderr_redirector = TextRedirector(self.log_area)
+        # stdout and stderr share one buffered sink, flushed to the log widget on a timer.
+        self.log_sink = open_log_sink(self.log_area)
         self.original_stdout = sys.stdout
         self.original_stderr = sys.stderr
-        sys.stdout = self.stdout_redirector
-        sys.stderr = self.stderr_redirector
+        sys.stdout = self.log_sink
+        sys.stderr = self.log_sink
         
         try:
             import logging
             logging.getLogger("pdfminer").setLevel(logging.ERROR)
         except ImportError:
             self.log_area_write_direct("Logging module not imported.\n")
+
+        self.start_reference_data_load()
+
+    def start_reference_data_load(self):
+        """Loads Funções and Unidades in a background thread; the window stays usable meanwhile."""
+        self.reload_data_button.pack_forget()
+        self.reference_data_status.set("Carregando funções e unidades...")
+        self.progress_bar.config(mode="indeterminate")
+        self.progress_bar.start()
+        load_errors = []
+
+        def load():
+            initial_data = load_all_initial_data(
+                on_refresh=self._on_reference_data_refreshed,
+                on_error=lambda title, message: load_errors.append((title, message))
+            )
+            self.master.after_idle(self._on_reference_data_loaded, initial_data, load_errors)
+
+        threading.Thread(target=load, daemon=True).start()
+
+    def _on_reference_data_loaded(self, initial_data, load_errors):
+        self.progress_bar.stop()
+        self.progress_bar.config(mode="determinate", value=0)
+        if not initial_data or not initial_data.get('funcoes') or not initial_data.get('unidades'):
+            self.reference_data_status.set("Funções e unidades não carregadas.")
+            self.reload_data_button.pack(side=tk.RIGHT)
+            for title, message in load_errors:
+                messagebox.showerror(title, message)
+            return
+
+        self.funcoes_data = initial_data['funcoes']
+        self.unidades_data = initial_data['unidades']
+        self.reference_data_status.set(f"{len(self.funcoes_data)} funções carregadas.")
+        self.funcao_code_entry.config(state=tk.NORMAL)
+        self.consultar_funcao_button.config(state=tk.NORMAL)
+        self._update_analyze_button_state()
             
+    def _on_reference_data_refreshed(self, refreshed_data):
+        """Called from the snapshot refresh thread when the DB had newer Funções/Unidades."""
+        def apply():
+            self.funcoes_data = refreshed_data['funcoes']
+            self.unidades_data = refreshed_data['unidades']
+            self.log_area_write_direct("Funções e Unidades atualizadas a partir do banco de dados.\n")
+        self.master.after_idle(apply)
+
     def set_initial_pane_sizes(self):
         self.master.update_idletasks() 
         try:
@@ -671,10 +1810,8 @@ class PdfAnalyzerApp:
             self.log_area_write_direct(f"Error setting pane sizes: {e}\n")
 
     def log_area_write_direct(self, message):
-        self.log_area.config(state=tk.NORMAL)
-        self.log_area.insert(tk.END, message)
-        self.log_area.see(tk.END)
-        self.log_area.config(state=tk.DISABLED)
+        # Through the sink, so it stays in order with the text still queued there.
+        self.log_sink.write(message)
       
     def select_pdf(self):
             filepath = filedialog.askopenfilename(
@@ -693,18 +1830,23 @@ class PdfAnalyzerApp:
                 self.pdf_path_entry.delete(0, tk.END)
                 self.pdf_path_entry.insert(0, filepath)
                 self.pdf_path_entry.config(state='readonly')
+                self.start_mainframe_warm_up()
 
             self._update_analyze_button_state()
 
-    def update_progress(self, value):
-        self.progress_bar['value'] = value
+    def update_progress(self, snapshot):
+        self.progress_bar['value'] = snapshot.fraction * 100
+        self.progress_text.set(snapshot.text)
 
     def _update_analyze_button_state(self, *args):
         """
-        Enables or disables the 'Analisar PDF' button based on whether all
-        required inputs (PDF path, username, password) are filled.
+        Enables or disables the 'Analisar PDF' button based on whether the reference
+        data is loaded and all required inputs (PDF path, username, password) are filled.
         The *args is necessary because this method is used as a callback for StringVar traces.
         """
+        if self.funcoes_data is None or self.unidades_data is None:
+            self.analyze_button.config(state=tk.DISABLED)
+            return
         pdf_path_filled = bool(self.selected_pdf_path)
         user_filled = bool(self.mainframe_user.get())
         pass_filled = bool(self.mainframe_pass.get())
@@ -748,6 +1890,23 @@ class PdfAnalyzerApp:
         if func_info:
             display_text = f"{func_info['descricao']} ({func_info['classificacao']})"
             self.funcao_result_text.set(display_text)
+            return
+
+        # Not loaded at startup: it may have been added since, so ask the DB off the Tk thread.
+        self.funcao_result_text.set("Consultando o banco de dados...")
+
+        def lookup():
+            lookup_funcoes([code_to_lookup], self.funcoes_data)
+            self.master.after_idle(self._show_looked_up_funcao, code_to_lookup)
+
+        threading.Thread(target=lookup, daemon=True).start()
+
+    def _show_looked_up_funcao(self, code):
+        if self.funcao_code_entry.get().strip() != code:
+            return
+        func_info = self.funcoes_data.get(code)
+        if func_info:
+            self.funcao_result_text.set(f"{func_info['descricao']} ({func_info['classificacao']})")
         else:
             self.funcao_result_text.set("Nenhuma função encontrada")
 
@@ -766,8 +1925,7 @@ class PdfAnalyzerApp:
         self.master.after_idle(lambda: self.analyze_button.config(state=tk.DISABLED))
         self.master.after_idle(lambda: self.select_button.config(state=tk.DISABLED))
         self.master.after_idle(lambda: self.save_button.config(state=tk.DISABLED))
-        self.master.after_idle(lambda: self.progress_bar.config(value=0, mode="indeterminate"))
-        self.master.after_idle(self.progress_bar.start)
+        self.master.after_idle(lambda: self.progress_bar.config(value=0, mode="determinate"))
 
         # --- Clear results and logs ---
         self.master.after_idle(lambda: (
@@ -775,261 +1933,81 @@ class PdfAnalyzerApp:
             self.results_area.delete(1.0, tk.END),
             self.results_area.config(state=tk.DISABLED)
         ))
-        self.master.after_idle(lambda: self.log_area.config(state=tk.NORMAL))
-        self.master.after_idle(lambda: self.log_area.delete(1.0, tk.END))
+        self.log_sink.clear()
 
+        self.report_model = None
+        # Updates reach the window at most five times per second, whatever the stages report.
+        progress = ProgressTracker(lambda snapshot: self.master.after_idle(self.update_progress, snapshot))
+        pdf_session = PdfDocumentSession(self.selected_pdf_path)
         try:
             # --- EXTRACT PDF HEADER DATA ---
-            self.stdout_redirector.write("Iniciando Etapa 0: Extraindo dados do cabeçalho do PDF...\n" + "="*50 + "\n")
-            cpf = extract_cpf_from_pdf(self.selected_pdf_path, self.stdout_redirector)
+            self.log_sink.write("Iniciando Etapa 0: Extraindo dados do cabeçalho do PDF...\n" + "="*50 + "\n")
+            progress.start('header')
+            cpf = read_pdf_header(pdf_session, self.log_sink, self.unidades_data, open_pdf_result_cache())
+            progress.finish('header')
             if not cpf:
                 self.master.after_idle(messagebox.showerror, "Erro no PDF", "Não foi possível encontrar um CPF no arquivo PDF selecionado.")
                 return
             
-            self.report_name = extract_name_from_pdf(self.selected_pdf_path, self.stdout_redirector) or "Nome não encontrado"
+            self.report_name = pdf_session.name or "Nome não encontrado"
             self.report_cpf = cpf
-            self.report_data_inicio = extract_data_inicio_from_pdf(self.selected_pdf_path, self.stdout_redirector) or "Não encontrada"
-
-            # --- BLOCK 1: WEB SCRAPING ---
-            self.master.after_idle(self.log_area_write_direct, "\nIniciando Etapa 1: Scraping de Dados do Power BI...\n" + "="*50 + "\n")
-            scraped_data = scrape_mainframe_data(cpf, mainframe_user, mainframe_pass, self.stdout_redirector, self.unidades_data)
-            
-            # --- BLOCK 2: PDF ANALYSIS ---
-            self.master.after_idle(self.log_area_write_direct, "\nIniciando Etapa 2: Análise do Arquivo PDF...\n" + "="*50 + "\n")
-            pdf_data = aggregate_yearly_data_multi_report(self.selected_pdf_path, self.stdout_redirector, self.unidades_data, self.update_progress)
-
-            # --- BLOCK 3: MERGE DATA ---
-            self.master.after_idle(self.log_area_write_direct, "\nIniciando Etapa 3: Mesclando Dados com Base na Data...\n" + "="*50 + "\n")
-            
-            final_yearly_data = defaultdict(list)
-            
-            # Get a superset of all years from both sources
-            all_years = set(pdf_data.keys()) | set(scraped_data.keys() if scraped_data else {})
-
-            for year in sorted(list(all_years)):
-                year_int = int(year)
-                
-                # Helper to add a row to the final data, now including the source
-                def add_row(data_source, year_key, source_label):
-                    for date_obj, code, source_from_tuple, lotacao, periodo in data_source[year_key]:
-                        row = {"date": date_obj, "code": code, "lotacao": lotacao, "periodo": periodo, "source": source_label}
-                        final_yearly_data[year_key].append(row)
-
-                if year_int < 2014:
-                    self.stdout_redirector.write(f"  - Ano {year}: Usando dados exclusivamente do MAINFRAME.\n")
-                    if scraped_data and year in scraped_data:
-                        add_row(scraped_data, year, "[MAINFRAME]")
-                
-                elif year_int > 2014:
-                    self.stdout_redirector.write(f"  - Ano {year}: Usando dados exclusivamente do PDF (MDL).\n")
-                    if year in pdf_data:
-                        add_row(pdf_data, year, "[MDL]")
-
-                else: # year_int == 2014
-                    self.stdout_redirector.write(f"  - Ano {year}: Mesclando dados (ano de transição).\n")
-                    
-                    if scraped_data and year in scraped_data:
-                        for date_obj, code, source, lotacao, periodo in scraped_data[year]:
-                            if date_obj.month < 5:
-                                row = {"date": date_obj, "code": code, "lotacao": lotacao, "periodo": periodo, "source": "[MAINFRAME]"}
-                                final_yearly_data[year].append(row)
-                    
-                    if year in pdf_data:
-                        for date_obj, code, source, lotacao, periodo in pdf_data[year]:
-                            if date_obj.month >= 5:
-                                row = {"date": date_obj, "code": code, "lotacao": lotacao, "periodo": periodo, "source": "[MDL]"}
-                                final_yearly_data[year].append(row)
-
-            # --- BLOCK 3.5: HARMONIZE LOTAÇÕES FOR TRANSITION YEAR ---
-            self.master.after_idle(self.log_area_write_direct, "\nIniciando Etapa 3.5: Harmonizando Lotações de 2014...\n" + "="*50 + "\n")
-            
-            if '2014' in final_yearly_data:
-                name_to_golden_lotacao = {}
-                for row in final_yearly_data['2014']:
-                    if row['source'] == '[MDL]':
-                        lotacao_parts = row['lotacao'].split(' - ', 1)
-                        if len(lotacao_parts) > 1:
-                            location_name = lotacao_parts[1].strip()
-                            if location_name not in name_to_golden_lotacao:
-                                name_to_golden_lotacao[location_name] = row['lotacao']
-                                self.stdout_redirector.write(f"  - Mapeando '{location_name}' para o padrão MDL: '{row['lotacao']}'\n")
-
-                for row in final_yearly_data['2014']:
-                    if row['source'] == '[MAINFRAME]':
-                        lotacao_parts = row['lotacao'].split(' - ', 1)
-                        if len(lotacao_parts) > 1:
-                            location_name = lotacao_parts[1].strip()
-                            if location_name in name_to_golden_lotacao:
-                                old_lotacao = row['lotacao']
-                                new_lotacao = name_to_golden_lotacao[location_name]
-                                if old_lotacao != new_lotacao:
-                                    self.stdout_redirector.write(f"  - Harmonizando Lotação: De '{old_lotacao}' para '{new_lotacao}'\n")
-                                    row['lotacao'] = new_lotacao
-
-            # --- BLOCK 3.8: FILTER RECORDS BEFORE START DATE ---
-            self.master.after_idle(self.log_area_write_direct, "\nIniciando Etapa 3.8: Filtrando registros anteriores à Data de Início...\n" + "="*50 + "\n")
-
-            try:
-                # Get the employee's official start year from the extracted date.
-                start_date_obj = datetime.strptime(self.report_data_inicio, '%d/%m/%Y')
-                start_year = start_date_obj.year
-                self.stdout_redirector.write(f"  - Data de Início do Cargo: {self.report_data_inicio}. Anos anteriores a {start_year} serão ignorados.\n")
-
-                filtered_data = defaultdict(list)
-                
-                # Iterate through the collected data and keep only the relevant years.
-                for year_str, rows in final_yearly_data.items():
-                    if int(year_str) >= start_year:
-                        filtered_data[year_str] = rows
-                    else:
-                        self.stdout_redirector.write(f"  - Ignorando dados do ano {year_str} (anterior a {start_year}).\n")
-                
-                # Replace the original data with the filtered data for all subsequent steps.
-                final_yearly_data = filtered_data
-
-            except (ValueError, TypeError):
-                self.stdout_redirector.write("  - AVISO: Não foi possível determinar a Data de Início. A filtragem por ano não será aplicada.\n")
-            
-            # --- BLOCK 4: DE-DUPLICATE ALL DATA ---
-            self.master.after_idle(self.log_area_write_direct, "\nIniciando Etapa 4: Removendo Registros Duplicados...\n" + "="*50 + "\n")
-            
-            for year in list(final_yearly_data.keys()):
-                unique_entries_in_year = {}
-                original_row_count = len(final_yearly_data[year])
-
-                sorted_rows = sorted(final_yearly_data[year], key=lambda r: r['date'])
-                
-                for row in sorted_rows:
-                    key = (row['code'], row['lotacao'], row['periodo'])
-                    if key not in unique_entries_in_year:
-                        unique_entries_in_year[key] = row
-                
-                if original_row_count > len(unique_entries_in_year):
-                    self.stdout_redirector.write(f"  - Ano {year}: {original_row_count} linhas -> {len(unique_entries_in_year)} linhas únicas.\n")
-
-                final_yearly_data[year] = list(unique_entries_in_year.values())
-
-            # --- BLOCK 4.2: CONSOLIDATE PERIODS FOR IDENTICAL ENTRIES ---
-            self.master.after_idle(self.log_area_write_direct, "\nIniciando Etapa 4.2: Consolidando Períodos Agrupados...\n" + "="*50 + "\n")
-            
-            consolidated_data = defaultdict(list)
-            for year, rows in final_yearly_data.items():
-                grouped_entries = {}
-                unconsolidatable_rows = []
-
-                for row in rows:
-                    try:
-                        key = (row['code'], row['lotacao'])
-                        start_str, end_str = row['periodo'].split(' - ')
-                        start_date = datetime.strptime(start_str.strip(), '%d/%m/%Y')
-                        end_date = datetime.strptime(end_str.strip(), '%d/%m/%Y')
-
-                        if key not in grouped_entries:
-                            grouped_entries[key] = {
-                                'min_start_date': start_date,
-                                'max_end_date': end_date,
-                                'representative_row': row 
-                            }
-                        else:
-                            grouped_entries[key]['min_start_date'] = min(grouped_entries[key]['min_start_date'], start_date)
-                            grouped_entries[key]['max_end_date'] = max(grouped_entries[key]['max_end_date'], end_date)
-
-                    except (ValueError, KeyError):
-                        unconsolidatable_rows.append(row)
-
-                new_rows_for_year = []
-                for key, data in grouped_entries.items():
-                    final_row = data['representative_row']
-                    final_row['periodo'] = f"{data['min_start_date']:%d/%m/%Y} - {data['max_end_date']:%d/%m/%Y}"
-                    new_rows_for_year.append(final_row)
-                
-                new_rows_for_year.extend(unconsolidatable_rows)
-                consolidated_data[year] = new_rows_for_year
+            self.report_data_inicio = pdf_session.data_inicio or "Não encontrada"
+
+            # --- BLOCKS 1 and 2: WEB SCRAPING and PDF ANALYSIS, in parallel ---
+            # The scrape waits on the browser and the PDF analysis on the CPU, so the
+            # scrape runs in a background thread while this one parses the PDF.
+            self.master.after_idle(self.log_area_write_direct,
+                "\nIniciando Etapas 1 e 2 em paralelo: Scraping do Power BI [MAINFRAME] e Análise do PDF [PDF]...\n" + "="*50 + "\n")
+            stage_seconds = {}
+
+            def run_scraping():
+                started = time.perf_counter()
+                scrape_log = StageLogWriter(self.log_sink, "[MAINFRAME] ")
+                session = self._get_mainframe_session(mainframe_user, mainframe_pass)
+                try:
+                    return scrape_mainframe_data(
+                        cpf, mainframe_user, mainframe_pass, scrape_log, self.unidades_data, session=session, progress=progress
+                    )
+                finally:
+                    progress.finish('scrape')
+                    stage_seconds['Etapa 1 (MAINFRAME)'] = time.perf_counter() - started
+
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix="mainframe") as scrape_executor:
+                scrape_future = scrape_executor.submit(run_scraping)
+
+                started = time.perf_counter()
+                pdf_log = StageLogWriter(self.log_sink, "[PDF] ")
+                pdf_workers = load_app_config().getint('analysis', 'pdf_workers', fallback=0)
+                pdf_data = read_pdf_yearly_data(pdf_session, pdf_log, self.unidades_data, progress, max_workers=pdf_workers)
+                pdf_session.close()
+                stage_seconds['Etapa 2 (PDF)'] = time.perf_counter() - started
+
+                if not scrape_future.done():
+                    self.log_sink.write("[PDF] Análise do PDF concluída. Aguardando o scraping do MAINFRAME...\n")
+                scraped_data = scrape_future.result()
+
+            self.log_sink.write(
+                "  - Tempo por etapa: " + ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in stage_seconds.items()) + "\n"
+            )
 
-            final_yearly_data = consolidated_data
-            
-            # --- BLOCK 4.5: IDENTIFY SPECIAL FUNCTIONS ---
-            self.master.after_idle(self.log_area_write_direct, "\nIniciando Etapa 4.5: Identificando Funções Especiais...\n" + "="*50 + "\n")
-            special_codes = {"004", "003", "001", "141", "140", "109", "098", "044"}
-            found_special_functions = set()
-
-            for year in final_yearly_data:
-                for row in final_yearly_data[year]:
-                    code = row['code']
-                    if code in special_codes:
-                        func_info = self.funcoes_data.get(code, {'descricao': 'Função Desconhecida'})
-                        found_special_functions.add((code, func_info['descricao']))
-                        self.stdout_redirector.write(f"  - Função Especial encontrada: ({code}) {func_info['descricao']}\n")
+            # --- BLOCKS 3 to 4.5: MERGE, HARMONIZE, FILTER, DE-DUPLICATE, CONSOLIDATE ---
+            final_yearly_data, found_special_functions = build_final_report(
+                pdf_data, scraped_data, self.report_data_inicio, self.funcoes_data, self.log_sink, progress
+            )
+            self.report_model = build_report_model(
+                self.report_name, self.report_cpf, self.report_data_inicio,
+                final_yearly_data, found_special_functions, self.funcoes_data
+            )
+            report_text = render_text(self.report_model)
                             
             # --- BLOCK 5: UPDATE GUI ---
             def update_gui_post_analysis():
                 self.results_area.config(state=tk.NORMAL)
-                self.results_area.insert(tk.END, f"{self.report_name.upper()}\n{self.report_cpf}\nData Início: {self.report_data_inicio}\n\n")
-                headers = ["Ano", "Lotação", "Função", "Tipo", "Períodos"]
-                header_string = f"{headers[0]:<6}{headers[1]:<45}{headers[2]:<65}{headers[3]:<15}{headers[4]:<25}\n"
-                separator = "=" * (len(header_string) - 1) + "\n"
-                self.results_area.insert(tk.END, header_string)
-                self.results_area.insert(tk.END, separator)
+                self.results_area.insert(tk.END, report_text)
 
                 if final_yearly_data:
-                    min_year = int(min(final_yearly_data.keys()))
-                    max_year = int(max(final_yearly_data.keys()))
-
-                    for year in range(min_year, max_year + 1):
-                        year_str = str(year)
-                        
-                        if year_str in final_yearly_data and final_yearly_data[year_str]:
-                            rows_for_year = sorted(final_yearly_data[year_str], key=lambda r: r['date'])
-                            for i, row in enumerate(rows_for_year):
-                                year_display = year_str if i == 0 else ""
-                                code = row['code']
-                                func_info = self.funcoes_data.get(code, {'descricao': 'Função Desconhecida','classificacao': 'N/A'})
-                                tipo_display = func_info['classificacao']
-                                periodo_display = row.get('periodo', '-------')
-                                
-                                # --- Logic to determine if the side note is needed ---
-                                side_note = ""
-                                if tipo_display == 'Administrativo':
-                                    side_note = "<- Pedir Frequência"
-                                elif tipo_display == 'Magistério' and row.get('source') == '[MDL]':
-                                    try:
-                                        start_str, end_str = periodo_display.split(' - ')
-                                        start_date = datetime.strptime(start_str.strip(), '%d/%m/%Y')
-                                        end_date = datetime.strptime(end_str.strip(), '%d/%m/%Y')
-                                        duration = (end_date - start_date).days
-                                        if duration < 244:
-                                            side_note = "<- Pedir Frequência"
-                                    except ValueError:
-                                        pass
-
-                                # --- Format the output strings ---
-                                func_desc = f"({code}) {func_info['descricao']}"
-                                func_display = (func_desc[:62] + '...') if len(func_desc) > 62 else func_desc
-                                lotacao_display = (row['lotacao'][:42] + '...') if len(row['lotacao']) > 42 else row['lotacao']
-
-                                row_string = (
-                                    f"{year_display:<6}"
-                                    f"{lotacao_display:<45}"
-                                    f"{func_display:<65}" 
-                                    f"{tipo_display:<15}"
-                                    f"{periodo_display:<25} {side_note}\n"
-                                )
-                                self.results_area.insert(tk.END, row_string)
-                        else:
-                            # Condition 1: Add note for empty years
-                            empty_row = f"{year_str:<6}{'-------':<45}{'-------':<65}{'-------':<15}{'-------':<25} <- Pedir Frequência\n"
-                            self.results_area.insert(tk.END, empty_row)
-                    
-                    # Add the special functions footnote if any were found
-                    if found_special_functions:
-                        sorted_functions = sorted(list(found_special_functions))
-                        formatted_list = [f"({code}) {desc}" for code, desc in sorted_functions]
-                        footnote_text = "\n\nFunções Especiais: " + ", ".join(formatted_list)
-                        self.results_area.insert(tk.END, footnote_text)
-
                     self.save_button.config(state=tk.NORMAL)
                 else:
-                    self.results_area.insert(tk.END, "Nenhum dado encontrado para gerar o relatório.\n")
                     self.save_button.config(state=tk.DISABLED)
                     messagebox.showinfo("Processamento Concluído", "Nenhum dado encontrado.")
                 
@@ -1038,16 +2016,56 @@ class PdfAnalyzerApp:
             self.master.after_idle(update_gui_post_analysis)
 
         finally:
+            pdf_session.close()
             self.master.after_idle(self.progress_bar.stop)
-            self.master.after_idle(self.log_area_write_direct, "\n" + "="*50 + "\nAnálise completa.\n")
+            self.log_sink.write("\n" + "="*50 + "\nAnálise completa.\n")
+            self.log_sink.write(f"  - {self.log_sink.summary()}\n")
             self.master.after_idle(lambda: self.analyze_button.config(state=tk.NORMAL))
             self.master.after_idle(lambda: self.select_button.config(state=tk.NORMAL))
-            self.master.after_idle(lambda: self.progress_bar.config(value=0))
+            self.master.after_idle(lambda: (self.progress_bar.config(value=0), self.progress_text.set("")))
+
+    def _get_mainframe_session(self, username, password):
+        if self.mainframe_session is None:
+            self.mainframe_session = MainframeSession(username, password, self.log_sink)
+        else:
+            self.mainframe_session.set_credentials(username, password)
+        return self.mainframe_session
+
+    def start_mainframe_warm_up(self, event=None):
+        """
+        Opens the MAINFRAME browser in the background so the first 'PROCURAR FUNÇÕES' finds it ready.
+        The session is bound to the credentials, so nothing starts until both have been entered.
+        """
+        if not load_app_config().getboolean('mainframe', 'warm_up', fallback=True):
+            return
+        if not self.mainframe_user.get() or not self.mainframe_pass.get():
+            return
+        if self._warm_up_thread and self._warm_up_thread.is_alive():
+            return
+        session = self._get_mainframe_session(self.mainframe_user.get(), self.mainframe_pass.get())
+        if session.driver is None:
+            self._warm_up_thread = threading.Thread(target=session.warm_up, daemon=True)
+            self._warm_up_thread.start()
+
+    def on_close(self):
+        if self.mainframe_session:
+            self.mainframe_session.close()
+        sys.stdout = self.original_stdout
+        sys.stderr = self.original_stderr
+        self.log_sink.close()
+        self.master.destroy()
 
     def start_analysis_thread(self):
-        analysis_thread = threading.Thread(target=self._run_analysis, daemon=True)
+        analysis_thread = threading.Thread(target=self._run_traced_analysis, daemon=True)
         analysis_thread.start()
 
+    def _run_traced_analysis(self):
+        with span("analise", "analise", pdf=os.path.basename(self.selected_pdf_path or "")):
+            self._run_analysis()
+        trace_path = write_trace()
+        if trace_path:
+            self.log_sink.write(f"  - Trace gravado em {trace_path}\n")
+
     def save_results(self):
         results_content = self.results_area.get("1.0", "end-1c").strip() 
 
@@ -1071,10 +2089,13 @@ class PdfAnalyzerApp:
         if not filepath:
             return
 
+        # The text is saved as edited; the CSV/JSON Lines files come from the analysis itself.
+        export_formats = parse_export_formats(load_app_config().get('export', 'formats', fallback=", ".join(EXPORT_FORMATS)))
         try:
-            with open(filepath, "w", encoding="utf-8") as f:
-                f.write(results_content) 
-            messagebox.showinfo("Salvo com Sucesso", f"Resultados salvos em:\n{filepath}")
+            written_paths = write_report_files(
+                filepath, self.report_model, export_formats if self.report_model else (), text=results_content
+            )
+            messagebox.showinfo("Salvo com Sucesso", "Resultados salvos em:\n" + "\n".join(written_paths))
         except Exception as e:
             messagebox.showerror("Erro ao Salvar", f"Não foi possível salvar o arquivo:\n{e}")
             self.log_area_write_direct(f"Error saving results to {filepath}: {e}\n")
@@ -1101,9 +2122,17 @@ class PdfAnalyzerApp:
             pass
 
 def main():
+    # Tracing is also enabled by the ANALISADOR_TRACE environment variable (see tracing.py).
+    trace_file = load_app_config().get('trace', 'file', fallback='').strip()
+    if trace_file:
+        enable_tracing(resource_path(trace_file))
+    if tk is None:
+        sys.exit("Erro: esta instalação do Python não inclui o Tkinter. Use batch_cli.py para a análise em lote.")
     root = tk.Tk()
     app = PdfAnalyzerApp(root)
     root.mainloop()
 
 if __name__ == "__main__":
+    # Required for the PDF process pool in PyInstaller builds on Windows.
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,162 @@
+import threading
+import time
+
+from collections import deque, namedtuple
+
+# Share of the overall bar per analysis stage (header, MAINFRAME scrape, PDF, merge).
+ANALYSIS_STAGES = (
+    ('header', 'Cabeçalho', 0.05),
+    ('scrape', 'MAINFRAME', 0.35),
+    ('pdf', 'PDF', 0.50),
+    ('merge', 'Mesclagem', 0.10),
+)
+# Rates are measured over this many recent seconds, so they follow the current phase of a stage.
+RATE_WINDOW_SECONDS = 5.0
+
+ProgressSnapshot = namedtuple('ProgressSnapshot', 'fraction eta_seconds text')
+
+def format_duration(seconds):
+    if seconds is None:
+        return "?"
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}min{seconds:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}min"
+
+class _Stage:
+    def __init__(self, name, label, weight):
+        self.name = name
+        self.label = label
+        self.weight = weight
+        self.done = 0
+        self.total = None
+        self.unit = ""
+        self.started = None
+        self.finished = False
+        self._samples = deque()
+
+    @property
+    def fraction(self):
+        if self.finished:
+            return 1.0
+        if not self.total:
+            return 0.0
+        return min(self.done / self.total, 1.0)
+
+    def record(self, now):
+        self._samples.append((now, self.done))
+        while len(self._samples) > 2 and now - self._samples[1][0] >= RATE_WINDOW_SECONDS:
+            self._samples.popleft()
+
+    def rate(self, now):
+        """Units per second over the recent window (from the stage start until it has a window's worth)."""
+        if not self._samples:
+            return None
+        oldest_time, oldest_done = self._samples[0]
+        elapsed = now - oldest_time
+        if elapsed <= 0 or self.done <= oldest_done:
+            return None
+        return (self.done - oldest_done) / elapsed
+
+    def eta(self, now):
+        rate = self.rate(now)
+        if self.finished or not self.total or not rate:
+            return None
+        return max(self.total - self.done, 0) / rate
+
+class ProgressTracker:
+    """
+    Weighted progress over the stages of an analysis, safe to update from any thread.
+    Stages report counts (pages, rows, ...) as often as they like; `on_update` receives
+    a ProgressSnapshot at most once every `min_interval` seconds, plus once whenever a
+    stage starts or finishes. Stages without a known total only count toward the bar
+    when they finish, but their rate is still shown.
+    """
+    def __init__(self, on_update, stages=ANALYSIS_STAGES, min_interval=0.2, clock=time.monotonic):
+        self.on_update = on_update
+        self.min_interval = min_interval
+        self.clock = clock
+        self._stages = {name: _Stage(name, label, weight) for name, label, weight in stages}
+        self._total_weight = sum(weight for _, _, weight in stages) or 1.0
+        self._lock = threading.Lock()
+        self._last_emit = None
+
+    def start(self, stage, total=None, unit=""):
+        with self._lock:
+            state = self._stages[stage]
+            state.started = self.clock()
+            state.done = 0
+            state.total = total
+            state.unit = unit
+            state.finished = False
+            state._samples.clear()
+            state.record(state.started)
+        self._emit(force=True)
+
+    def advance(self, stage, step=1, done=None, total=None):
+        """Adds `step` to the stage's count, or sets it to `done`; `total` may be refined along the way."""
+        with self._lock:
+            state = self._stages[stage]
+            if state.started is None:
+                state.started = self.clock()
+                state.record(state.started)
+            state.done = done if done is not None else state.done + step
+            if total is not None:
+                state.total = total
+            state.record(self.clock())
+        self._emit()
+
+    def finish(self, stage):
+        with self._lock:
+            state = self._stages[stage]
+            if state.started is None:
+                state.started = self.clock()
+            if state.total:
+                state.done = state.total
+            state.finished = True
+        self._emit(force=True)
+
+    def snapshot(self):
+        with self._lock:
+            now = self.clock()
+            fraction = sum(s.weight * s.fraction for s in self._stages.values()) / self._total_weight
+            parts = []
+            etas = []
+            for s in self._stages.values():
+                if s.started is None or s.finished:
+                    continue
+                count = f"{s.done}/{s.total}" if s.total else f"{s.done}"
+                text = f"{s.label}: {count} {s.unit}".rstrip()
+                rate = s.rate(now)
+                if rate:
+                    text += f" ({rate:.1f} {s.unit}/s)"
+                eta = s.eta(now)
+                if eta is not None:
+                    etas.append(eta)
+                    text += f", faltam ~{format_duration(eta)}"
+                parts.append(text)
+        # Stages run in parallel, so the slowest known one is the estimate.
+        eta_seconds = max(etas) if etas else None
+        return ProgressSnapshot(fraction, eta_seconds, f"{fraction * 100:.0f}% - " + " | ".join(parts) if parts else f"{fraction * 100:.0f}%")
+
+    def _emit(self, force=False):
+        now = self.clock()
+        with self._lock:
+            if not force and self._last_emit is not None and now - self._last_emit < self.min_interval:
+                return
+            self._last_emit = now
+        if self.on_update:
+            self.on_update(self.snapshot())
+
+class TextProgressReporter:
+    """Headless counterpart of the progress bar: writes each snapshot it receives as a log line."""
+    def __init__(self, stream, prefix="Progresso: "):
+        self.stream = stream
+        self.prefix = prefix
+
+    def __call__(self, snapshot):
+        self.stream.write(f"{self.prefix}{snapshot.text}\n")
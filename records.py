@@ -0,0 +1,86 @@
+from datetime import datetime
+
+UNKNOWN_PERIODO = "-------"
+DATE_FORMAT = '%d/%m/%Y'
+
+def parse_br_date(text):
+    """Parses a dd/mm/yyyy date (surrounding spaces ignored); returns a date, or None if it is not one."""
+    try:
+        return datetime.strptime(text.strip(), DATE_FORMAT).date()
+    except (AttributeError, ValueError):
+        return None
+
+class FuncaoRecord:
+    """
+    One function period of the servidor, from the MDL PDF or from MAINFRAME.
+
+    `date` (a datetime) is what the record is filed and sorted under: the report date for
+    MDL rows, the period start for MAINFRAME rows. The period itself is kept as the
+    `start`/`end` dates and only formatted for display; a period that could not be
+    parsed keeps its original text in `raw_periodo`.
+    """
+    __slots__ = ('date', 'code', 'source', 'lotacao', 'start', 'end', 'raw_periodo')
+
+    def __init__(self, date, code, source, lotacao, start=None, end=None, raw_periodo=None):
+        self.date = date
+        self.code = code
+        self.source = source
+        self.lotacao = lotacao
+        self.start = start
+        self.end = end
+        self.raw_periodo = raw_periodo
+
+    @classmethod
+    def from_period_strings(cls, date, code, source, lotacao, start_text, end_text):
+        """Builds a record from the two date cells of a row ("-------" when either is missing)."""
+        start, end = parse_br_date(start_text), parse_br_date(end_text)
+        if start and end:
+            return cls(date, code, source, lotacao, start, end)
+        raw_periodo = f"{start_text} - {end_text}" if start_text and end_text else None
+        return cls(date, code, source, lotacao, raw_periodo=raw_periodo)
+
+    @classmethod
+    def from_periodo(cls, date, code, source, lotacao, periodo):
+        """Builds a record from a "dd/mm/yyyy - dd/mm/yyyy" period string."""
+        if periodo and ' - ' in periodo:
+            start_text, end_text = periodo.split(' - ', 1)
+            return cls.from_period_strings(date, code, source, lotacao, start_text, end_text)
+        return cls(date, code, source, lotacao, raw_periodo=None if periodo in (None, UNKNOWN_PERIODO) else periodo)
+
+    @property
+    def has_period(self):
+        return self.start is not None and self.end is not None
+
+    @property
+    def periodo(self):
+        """The period as shown in the report."""
+        if self.has_period:
+            return f"{self.start:%d/%m/%Y} - {self.end:%d/%m/%Y}"
+        return self.raw_periodo or UNKNOWN_PERIODO
+
+    @property
+    def duration_days(self):
+        return (self.end - self.start).days if self.has_period else None
+
+    def replace(self, **changes):
+        """Returns a copy with the given fields changed."""
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return FuncaoRecord(**fields)
+
+    def sort_key(self):
+        return (self.date, self.code, self.source, self.lotacao, self.periodo)
+
+    def _identity(self):
+        return (self.date, self.code, self.source, self.lotacao, self.start, self.end, self.raw_periodo)
+
+    def __eq__(self, other):
+        if not isinstance(other, FuncaoRecord):
+            return NotImplemented
+        return self._identity() == other._identity()
+
+    def __hash__(self):
+        return hash(self._identity())
+
+    def __repr__(self):
+        return f"FuncaoRecord({self.date:%d/%m/%Y}, {self.code!r}, {self.source!r}, {self.lotacao!r}, {self.periodo!r})"
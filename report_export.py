@@ -0,0 +1,177 @@
+import csv
+import io
+import json
+import os
+
+from timeline import covered_days_by_year, gap_years
+
+SIDE_NOTE = "Pedir Frequência"
+COVERED_BY_PREVIOUS = "ver período anterior"
+PLACEHOLDER = "-------"
+# Magistério days a calendar year needs before its MDL Magistério rows go without the side note.
+MAGISTERIO_MIN_DAYS = 244
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+# Row kinds of the report model.
+ROW_FUNCAO = 'funcao'
+ROW_NO_RECORDS = 'sem_registro'
+ROW_PREVIOUS_PERIOD = 'periodo_anterior'
+
+# Columns of the CSV export (and keys of each JSON Lines object), with full, untruncated values.
+EXPORT_FIELDS = (
+    'cpf', 'nome', 'data_inicio', 'ano', 'linha', 'lotacao', 'codigo', 'funcao', 'tipo',
+    'fonte', 'inicio', 'fim', 'periodo', 'dias', 'observacao', 'funcao_especial',
+)
+
+def build_report_model(name, cpf, data_inicio, final_yearly_data, found_special_functions, funcoes_data):
+    """
+    The final report as data: one dict per report line (function rows and year
+    placeholders, in display order), with the notes already decided. Every output
+    format is rendered from this, so the text, CSV and JSON Lines always agree.
+    """
+    special_codes = {code for code, _ in found_special_functions}
+    rows = []
+    if final_yearly_data:
+        uncovered_years = set(gap_years(final_yearly_data, min_days=MAGISTERIO_MIN_DAYS))
+        magisterio_days = magisterio_days_by_year(final_yearly_data, funcoes_data)
+        min_year = int(min(final_yearly_data.keys()))
+        max_year = int(max(final_yearly_data.keys()))
+        for year in range(min_year, max_year + 1):
+            year_rows = final_yearly_data.get(str(year))
+            if year_rows:
+                for record in sorted(year_rows, key=lambda r: r.date):
+                    rows.append(_funcao_row(year, record, funcoes_data, special_codes, magisterio_days))
+            else:
+                kind = ROW_NO_RECORDS if year in uncovered_years else ROW_PREVIOUS_PERIOD
+                rows.append({
+                    'ano': year, 'linha': kind, 'lotacao': None, 'codigo': None, 'funcao': None,
+                    'tipo': None, 'fonte': None, 'inicio': None, 'fim': None, 'periodo': None, 'dias': None,
+                    'observacao': SIDE_NOTE if kind == ROW_NO_RECORDS else COVERED_BY_PREVIOUS,
+                    'funcao_especial': False,
+                })
+    return {
+        'nome': name, 'cpf': cpf, 'data_inicio': data_inicio, 'rows': rows,
+        'funcoes_especiais': sorted(found_special_functions),
+    }
+
+def _classificacao(code, funcoes_data):
+    return funcoes_data.get(code, {}).get('classificacao')
+
+def magisterio_days_by_year(final_yearly_data, funcoes_data):
+    """Days of each calendar year covered by Magistério periods (any source, overlaps counted once)."""
+    return covered_days_by_year({
+        year: [record for record in records if _classificacao(record.code, funcoes_data) == 'Magistério']
+        for year, records in final_yearly_data.items()
+    })
+
+def is_short_magisterio_year(year, magisterio_days):
+    """Whether the calendar year has fewer than MAGISTERIO_MIN_DAYS days of Magistério."""
+    return magisterio_days.get(year, 0) < MAGISTERIO_MIN_DAYS
+
+def _funcao_row(year, record, funcoes_data, special_codes, magisterio_days):
+    func_info = funcoes_data.get(record.code, {'descricao': 'Função Desconhecida', 'classificacao': 'N/A'})
+    tipo = func_info['classificacao']
+    side_note = ""
+    if tipo == 'Administrativo':
+        side_note = SIDE_NOTE
+    elif tipo == 'Magistério' and record.source == '[MDL]':
+        # The rule is per year: short rows that together cover 244 days of a year need no note.
+        # Only the year the row is filed under is judged; later years its period runs into
+        # are judged on their own rows, or on their placeholder when they have none.
+        if record.has_period and is_short_magisterio_year(year, magisterio_days):
+            side_note = SIDE_NOTE
+    return {
+        'ano': year, 'linha': ROW_FUNCAO, 'lotacao': record.lotacao, 'codigo': record.code,
+        'funcao': func_info['descricao'], 'tipo': tipo, 'fonte': record.source.strip('[]'),
+        'inicio': record.start, 'fim': record.end, 'periodo': record.periodo,
+        'dias': record.duration_days, 'observacao': side_note,
+        'funcao_especial': record.code in special_codes,
+    }
+
+def render_text(model):
+    """The fixed-width report shown in the results area and saved as MDL_<cpf>_FUNCOES.txt."""
+    lines = [f"{model['nome'].upper()}\n{model['cpf']}\nData Início: {model['data_inicio']}\n\n"]
+    headers = ["Ano", "Lotação", "Função", "Tipo", "Períodos"]
+    header_string = f"{headers[0]:<6}{headers[1]:<45}{headers[2]:<65}{headers[3]:<15}{headers[4]:<25}\n"
+    separator = "=" * (len(header_string) - 1) + "\n"
+    lines.append(header_string)
+    lines.append(separator)
+
+    if not model['rows']:
+        lines.append("Nenhum dado encontrado para gerar o relatório.\n")
+        return "".join(lines)
+
+    previous_year = None
+    for row in model['rows']:
+        year_str = str(row['ano'])
+        if row['linha'] == ROW_NO_RECORDS:
+            lines.append(f"{year_str:<6}{PLACEHOLDER:<45}{PLACEHOLDER:<65}{PLACEHOLDER:<15}{PLACEHOLDER:<25} <- {SIDE_NOTE}\n")
+        elif row['linha'] == ROW_PREVIOUS_PERIOD:
+            lines.append(f"{year_str:<6}{PLACEHOLDER:<45}{PLACEHOLDER:<65}{PLACEHOLDER:<15}{COVERED_BY_PREVIOUS:<25}\n")
+        else:
+            year_display = year_str if row['ano'] != previous_year else ""
+            func_desc = f"({row['codigo']}) {row['funcao']}"
+            func_display = (func_desc[:62] + '...') if len(func_desc) > 62 else func_desc
+            lotacao_display = (row['lotacao'][:42] + '...') if len(row['lotacao']) > 42 else row['lotacao']
+            side_note = f"<- {row['observacao']}" if row['observacao'] else ""
+            lines.append(
+                f"{year_display:<6}"
+                f"{lotacao_display:<45}"
+                f"{func_display:<65}"
+                f"{row['tipo']:<15}"
+                f"{row['periodo']:<25} {side_note}\n"
+            )
+        previous_year = row['ano']
+
+    if model['funcoes_especiais']:
+        formatted_list = [f"({code}) {desc}" for code, desc in model['funcoes_especiais']]
+        lines.append("\n\nFunções Especiais: " + ", ".join(formatted_list))
+
+    return "".join(lines)
+
+def _export_records(model):
+    for row in model['rows']:
+        record = {'cpf': model['cpf'], 'nome': model['nome'], 'data_inicio': model['data_inicio']}
+        record.update(row)
+        for field in ('inicio', 'fim'):
+            if record[field] is not None:
+                record[field] = record[field].isoformat()
+        yield record
+
+def render_csv(model):
+    """One line per report line, ';'-separated (opens directly in a pt-BR Excel), dates in ISO format."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, delimiter=';', lineterminator='\n')
+    writer.writeheader()
+    writer.writerows(_export_records(model))
+    return buffer.getvalue()
+
+def render_jsonl(model):
+    """One JSON object per report line, with the same keys as the CSV columns."""
+    return "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in _export_records(model))
+
+RENDERERS = {'csv': render_csv, 'jsonl': render_jsonl}
+
+def parse_export_formats(text):
+    """Reads a "csv, jsonl" list (config or command line); unknown names are ignored."""
+    names = [name.strip().lower() for name in (text or "").replace(';', ',').split(',')]
+    return [name for name in EXPORT_FORMATS if name in names]
+
+def write_report_files(text_path, model, formats=EXPORT_FORMATS, text=None):
+    """
+    Writes the report to `text_path` and each structured format next to it (same
+    name, .csv/.jsonl). Every file is rendered in memory and written in one go.
+    `text` overrides the rendered text (e.g. the report edited in the GUI).
+    Returns the written paths.
+    """
+    base_path = os.path.splitext(text_path)[0]
+    outputs = [(text_path, render_text(model).strip() if text is None else text)]
+    outputs.extend(
+        (f"{base_path}.{name}", RENDERERS[name](model)) for name in formats if f"{base_path}.{name}" != text_path
+    )
+    for path, content in outputs:
+        # utf-8-sig on the CSV so Excel detects the encoding; the csv module writes its own line ends.
+        is_csv = path.endswith(".csv")
+        with open(path, "w", encoding="utf-8-sig" if is_csv else "utf-8", newline="" if is_csv else None) as f:
+            f.write(content)
+    return [path for path, _ in outputs]
@@ -0,0 +1,52 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+import batch_cli
+from benchmarks.synthetic_pdf import generate_mdl_pdf
+from benchmarks.synthetic_units import synthetic_unidades
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_batch_cli_imports_without_tkinter():
+    # A None entry in sys.modules makes `import tkinter` raise ImportError, as on a Python build without Tk.
+    code = "import sys; sys.modules['tkinter'] = None; import batch_cli; print(batch_cli.__name__)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True,
+                            env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "batch_cli"
+
+@pytest.mark.parametrize("content", ['{"123": [', '[]', '{"123": [{"code": "036"}]}', '{"123": [{"date": "ontem", "code": "036"}]}'])
+def test_malformed_mainframe_data_exits_with_a_message(tmp_path, capsys, content):
+    mainframe_data = tmp_path / "mainframe.json"
+    mainframe_data.write_text(content, encoding="utf-8")
+    assert batch_cli.main([str(tmp_path / "a.pdf"), "--mainframe-data", str(mainframe_data)]) == 1
+    assert "Não foi possível ler os dados do MAINFRAME" in capsys.readouterr().err
+
+def test_missing_mainframe_data_exits_with_a_message(tmp_path, capsys):
+    assert batch_cli.main([str(tmp_path / "a.pdf"), "--mainframe-data", str(tmp_path / "nao_existe.json")]) == 1
+    assert "Não foi possível ler os dados do MAINFRAME" in capsys.readouterr().err
+
+def test_unique_report_path_suffixes_the_pdf_name_on_collision():
+    used_paths = set()
+    first = batch_cli.unique_report_path("out/MDL_1_FUNCOES.txt", "a/servidor.pdf", used_paths)
+    second = batch_cli.unique_report_path("out/MDL_1_FUNCOES.txt", "b/servidor_2019.pdf", used_paths)
+    third = batch_cli.unique_report_path("out/MDL_1_FUNCOES.txt", "c/servidor_2019.pdf", used_paths)
+    assert (first, second, third) == ("out/MDL_1_FUNCOES.txt", "out/MDL_1_FUNCOES_servidor_2019.txt",
+                                      "out/MDL_1_FUNCOES_servidor_2019_3.txt")
+
+def test_two_pdfs_of_one_cpf_get_separate_reports(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    unidades_data = synthetic_unidades(50)
+    first, second = str(tmp_path / "primeiro.pdf"), str(tmp_path / "segundo.pdf")
+    generate_mdl_pdf(first, reports=1, pages_per_report=2, unidades_data=unidades_data)
+    shutil.copyfile(first, second)
+
+    results = batch_cli.run_batch([first, second], str(tmp_path / "saida"), {}, unidades_data, {}, export_formats=())
+    assert [result['error'] for result in results] == [None, None]
+    output_paths = [result['output_path'] for result in results]
+    assert os.path.basename(output_paths[1]) == os.path.basename(output_paths[0])[:-len(".txt")] + "_segundo.txt"
+    assert all(os.path.exists(path) for path in output_paths)
@@ -0,0 +1,113 @@
+import io
+import os
+
+from benchmarks.synthetic_pdf import generate_mdl_pdf
+from benchmarks.synthetic_units import mainframe_unit_names, synthetic_unidades
+from cache_utils import JsonLruCache, PdfResultCache, UnitResolutionMemo
+from db_utils import unidades_fingerprint
+from pdf_parser import (
+    PdfDocumentSession, decode_pdf_result, encode_pdf_result, find_best_unit_match,
+    read_pdf_header, read_pdf_yearly_data,
+)
+
+def _analyse(pdf_path, unidades_data, cache):
+    log = io.StringIO()
+    with PdfDocumentSession(pdf_path) as pdf_session:
+        cpf = read_pdf_header(pdf_session, log, unidades_data, cache)
+        pdf_data = read_pdf_yearly_data(pdf_session, log, unidades_data, max_workers=1)
+    return cpf, pdf_data, log.getvalue()
+
+def test_lru_cache_evicts_the_oldest_entries(tmp_path):
+    cache = JsonLruCache(str(tmp_path), max_entries=2)
+    for number, key in enumerate(('a', 'b', 'c')):
+        cache.put(key, {'n': number})
+        os.utime(tmp_path / f"{key}.json", (number, number))
+    cache.put('d', {'n': 3})
+    assert cache.get('a') is None and cache.get('b') is None
+    assert cache.get('c') == {'n': 2} and cache.get('d') == {'n': 3}
+
+def test_disabled_cache_neither_reads_nor_writes(tmp_path):
+    cache = JsonLruCache(str(tmp_path), enabled=False)
+    cache.put('a', {'n': 1})
+    assert cache.get('a') is None
+    assert not os.listdir(tmp_path)
+
+def test_key_depends_on_content_and_parts(tmp_path):
+    first, second = tmp_path / "a.pdf", tmp_path / "b.pdf"
+    first.write_bytes(b"%PDF-1.4 um")
+    second.write_bytes(b"%PDF-1.4 um")
+    cache = PdfResultCache(str(tmp_path / "cache"))
+    assert cache.make_key(str(first), "2", "x") == cache.make_key(str(second), "2", "x")
+    assert cache.make_key(str(first), "2", "x") != cache.make_key(str(first), "3", "x")
+    second.write_bytes(b"%PDF-1.4 dois")
+    assert cache.make_key(str(first), "2", "x") != cache.make_key(str(second), "2", "x")
+
+def test_result_round_trip_and_cache_hit(tmp_path):
+    unidades_data = synthetic_unidades(50)
+    pdf_path = str(tmp_path / "mdl.pdf")
+    generate_mdl_pdf(pdf_path, reports=2, pages_per_report=2, unidades_data=unidades_data)
+    cache = PdfResultCache(str(tmp_path / "cache"))
+
+    cpf, parsed, _ = _analyse(pdf_path, unidades_data, cache)
+    assert parsed
+    assert decode_pdf_result(encode_pdf_result(cpf, "MARIA", None, parsed))[3] == parsed
+
+    cached_cpf, cached, log = _analyse(pdf_path, unidades_data, cache)
+    assert "encontrado no cache" in log
+    assert (cached_cpf, cached) == (cpf, parsed)
+
+def test_empty_result_is_cached(tmp_path):
+    pdf_path = str(tmp_path / "antigo.pdf")
+    generate_mdl_pdf(pdf_path, reports=0, old_reports=2)
+    cache = PdfResultCache(str(tmp_path / "cache"))
+
+    cpf, parsed, _ = _analyse(pdf_path, {}, cache)
+    assert cpf and not parsed
+    assert len(os.listdir(tmp_path / "cache")) == 1
+
+    _, cached, log = _analyse(pdf_path, {}, cache)
+    assert "encontrado no cache" in log
+    assert not cached
+
+def test_unit_memo_survives_a_restart(tmp_path):
+    path = str(tmp_path / "unidades" / "resolutions.json")
+    memo = UnitResolutionMemo(path, "f1")
+    memo.put("ESCOLA A", "1001", 0.93)
+    memo.put("ESCOLA X", None, 0.41)
+    memo.save()
+
+    reloaded = UnitResolutionMemo(path, "f1")
+    assert reloaded.get("ESCOLA A") == ("1001", 0.93)
+    assert reloaded.get("ESCOLA X") == (None, 0.41)
+    assert reloaded.get("ESCOLA B") is None
+    assert (reloaded.hits, reloaded.misses) == (2, 1)
+
+def test_unit_memo_is_discarded_when_the_units_change(tmp_path):
+    path = str(tmp_path / "resolutions.json")
+    memo = UnitResolutionMemo(path, "f1")
+    memo.put("ESCOLA A", "1001", 0.93)
+    memo.save()
+    assert UnitResolutionMemo(path, "f2").get("ESCOLA A") is None
+
+def test_unit_memo_drops_the_least_recently_used(tmp_path):
+    memo = UnitResolutionMemo(str(tmp_path / "resolutions.json"), "f1", max_entries=2)
+    memo.put("A", "1", 1.0)
+    memo.put("B", "2", 1.0)
+    memo.get("A")
+    memo.put("C", "3", 1.0)
+    assert memo.get("B") is None
+    assert memo.get("A") == ("1", 1.0) and memo.get("C") == ("3", 1.0)
+
+def test_memo_gives_the_same_units_as_the_index(tmp_path):
+    unidades_data = synthetic_unidades(200)
+    names = mainframe_unit_names(unidades_data, 60, seed=3)
+    path = str(tmp_path / "resolutions.json")
+    expected = [find_best_unit_match(name, unidades_data) for name in names]
+
+    memo = UnitResolutionMemo(path, unidades_fingerprint(unidades_data))
+    assert [find_best_unit_match(name, unidades_data, memo) for name in names] == expected
+    memo.save()
+
+    reloaded = UnitResolutionMemo(path, unidades_fingerprint(unidades_data))
+    assert [find_best_unit_match(name, unidades_data, reloaded) for name in names] == expected
+    assert reloaded.misses == 0
@@ -0,0 +1,150 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import pyodbc
+import pytest
+
+import db_utils
+from db_utils import ConnectionPool
+
+class _Cursor:
+    def execute(self, *args):
+        return self
+
+    def fetchall(self):
+        return []
+
+class _Connection:
+    def cursor(self):
+        return _Cursor()
+
+    def close(self):
+        pass
+
+class _FlakyConnect:
+    """pyodbc.connect stand-in that fails the first `failures` calls."""
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self, connection_string, timeout=None):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise pyodbc.Error("08001", "offline")
+        return _Connection()
+
+def test_failed_connect_fails_fast_until_the_backoff_is_reset(monkeypatch):
+    connect = _FlakyConnect(failures=1)
+    monkeypatch.setattr(db_utils.pyodbc, "connect", connect)
+    pool = ConnectionPool("DSN=x", retry_after=60)
+    for _ in range(2):
+        with pytest.raises(pyodbc.Error):
+            with pool.connection():
+                pass
+    assert connect.calls == 1
+
+    pool.reset_backoff()
+    with pool.connection() as conn:
+        assert isinstance(conn, _Connection)
+    assert connect.calls == 2
+
+def test_retrying_the_load_right_after_a_failure_reaches_the_db(monkeypatch, tmp_path):
+    (tmp_path / "config.ini").write_text(
+        "[database]\ndriver = x\nserver = x\ndatabase = x\nuid = x\npwd = x\n\n[snapshot]\nenabled = false\n",
+        encoding="utf-8",
+    )
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(db_utils, "_pool", None)
+    connect = _FlakyConnect(failures=1)
+    monkeypatch.setattr(db_utils.pyodbc, "connect", connect)
+    errors = []
+
+    assert db_utils.load_all_initial_data(on_error=lambda title, message: errors.append(title)) is None
+    assert errors == ["Erro de Conexão com o Banco de Dados"]
+    assert db_utils.load_all_initial_data(on_error=lambda title, message: errors.append(title)) == {'funcoes': {}, 'unidades': {}}
+    assert connect.calls == 2
+
+class _UnitPool:
+    """Pool stand-in whose queries for the codes in `blocked` wait until `release` is set."""
+    def __init__(self, units, blocked=(), fail=False):
+        self.units = units
+        self.blocked = set(blocked)
+        self.fail = fail
+        self.release = threading.Event()
+        self.queried = []
+
+    @contextmanager
+    def connection(self):
+        if self.fail:
+            raise pyodbc.Error("08001", "offline")
+        pool = self
+
+        class Cursor:
+            def execute(self, query, code, _):
+                pool.queried.append(code)
+                if code in pool.blocked:
+                    pool.release.wait(5)
+                self.rows = [(code, None, pool.units[code])] if code in pool.units else []
+                return self
+
+            def fetchall(self):
+                return self.rows
+
+        class Connection:
+            def cursor(self):
+                return Cursor()
+
+        yield Connection()
+
+@pytest.fixture
+def unit_pool(monkeypatch):
+    monkeypatch.setattr(db_utils, "_fetched_unidades", {})
+    monkeypatch.setattr(db_utils, "_unidade_query_locks", {})
+    monkeypatch.setattr(db_utils, "_missing_codes", {})
+
+    def install(pool):
+        monkeypatch.setattr(db_utils, "get_connection_pool", lambda: pool)
+        return pool
+    return install
+
+def test_unit_query_does_not_block_cached_units(unit_pool):
+    pool = unit_pool(_UnitPool({'111': "ESCOLA A", '222': "ESCOLA B"}, blocked={'222'}))
+    assert db_utils.lookup_unidade('111', {})['nome_folha'] == "ESCOLA A"
+
+    slow = threading.Thread(target=db_utils.lookup_unidade, args=('222', {}))
+    slow.start()
+    results = []
+    try:
+        while '222' not in pool.queried:
+            time.sleep(0.01)
+        # The query for 222 is still running; the cached 111 must be answered meanwhile.
+        cached = threading.Thread(target=lambda: results.append(db_utils.lookup_unidade('111', {})))
+        cached.start()
+        cached.join(1)
+        assert not cached.is_alive()
+    finally:
+        pool.release.set()
+        slow.join()
+    assert results[0]['nome_folha'] == "ESCOLA A"
+    assert pool.queried == ['111', '222']
+
+def test_concurrent_lookups_of_one_unit_query_it_once(unit_pool):
+    pool = unit_pool(_UnitPool({'333': "ESCOLA C"}, blocked={'333'}))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(db_utils.lookup_unidade('333', {}))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    pool.release.set()
+    for thread in threads:
+        thread.join()
+    assert pool.queried == ['333']
+    assert [unit_info['nome_folha'] for unit_info in results] == ["ESCOLA C"] * 4
+
+def test_failed_unit_query_is_not_repeated_right_away(unit_pool):
+    pool = unit_pool(_UnitPool({}, fail=True))
+    assert db_utils.lookup_unidade('444', {}) is None
+    pool.fail = False
+    pool.units['444'] = "ESCOLA D"
+    assert db_utils.lookup_unidade('444', {}) is None
+    assert pool.queried == []
@@ -0,0 +1,91 @@
+import io
+
+import pdf_parser
+from benchmarks.synthetic_units import mainframe_unit_names, synthetic_unidades
+from cache_utils import UnitResolutionMemo
+from db_utils import unidades_fingerprint
+from pdf_parser import (
+    GRID_COLUMNS, READ_GRID_ROWS_JS, SCROLL_TO_TOP_JS, MainframeSession, build_scraped_data, find_best_unit_match,
+)
+
+class FakeGridDriver:
+    """A virtualized grid showing `viewport` rows at a time; the Unidade cell of the bottom row is not rendered yet."""
+    def __init__(self, rows, viewport=5):
+        self.rows = rows
+        self.viewport = viewport
+        self.position = 0
+        self.reads = 0
+
+    def execute_script(self, script, *args):
+        if script == READ_GRID_ROWS_JS:
+            self.reads += 1
+            window = self.rows[self.position:self.position + self.viewport]
+            at_bottom = self.position + self.viewport >= len(self.rows)
+            result = []
+            for number, (row_index, cells) in enumerate(window):
+                cells = {col: cells.get(col) for col in args[1]}
+                if number == len(window) - 1 and not at_bottom and '15' in cells:
+                    cells['15'] = None
+                result.append([row_index, cells])
+            return result
+        if script == SCROLL_TO_TOP_JS:
+            self.position = 0
+            return True
+        raise AssertionError(f"unexpected script: {script[:40]}")
+
+class FakeWaiter:
+    """Scrolls by one viewport minus one row, like the real grid's overlap."""
+    def __init__(self, driver):
+        self.driver = driver
+
+    def scroll_and_wait(self, scroll_container, grid, label, script=None, timeout=3):
+        last_start = max(len(self.driver.rows) - self.driver.viewport, 0)
+        if self.driver.position >= last_start:
+            return False
+        self.driver.position = min(self.driver.position + self.driver.viewport - 1, last_start)
+        return True
+
+def _grid_rows(unit_names):
+    return [
+        (str(number + 2), {'2': f"{36 + number % 3}", '9': f"01/02/{2000 + number % 15}", '8': f"31/12/{2000 + number % 15}", '15': name})
+        for number, name in enumerate(unit_names)
+    ]
+
+def _session(driver):
+    session = object.__new__(MainframeSession)
+    session.driver, session.waiter, session.progress = driver, FakeWaiter(driver), None
+    return session
+
+def test_single_pass_reads_every_row_once_with_all_columns():
+    rows = _grid_rows([f"ESCOLA {number}" for number in range(23)])
+    driver = FakeGridDriver(rows)
+    collected = _session(driver)._collect_grid_rows(None, None, GRID_COLUMNS)
+    assert collected == dict(rows)
+    # 23 rows, 4 new per scroll: 6 positions plus the read that finds nothing new.
+    assert driver.reads == 7
+
+def test_rows_missing_a_column_are_not_kept():
+    rows = _grid_rows(["ESCOLA A", None, "ESCOLA C"])
+    collected = _session(FakeGridDriver(rows))._collect_grid_rows(None, None, GRID_COLUMNS)
+    assert sorted(collected) == ['2', '4']
+
+def test_collected_rows_become_yearly_mainframe_records(tmp_path, monkeypatch):
+    unidades_data = synthetic_unidades(100)
+    names = mainframe_unit_names(unidades_data, 12, seed=5)
+    memo = UnitResolutionMemo(str(tmp_path / "resolutions.json"), unidades_fingerprint(unidades_data))
+    monkeypatch.setattr(pdf_parser, 'open_unit_resolution_memo', lambda fingerprint: memo)
+    collected = {
+        row_index: {'code': cells['2'], 'date1': cells['9'], 'date2': cells['8'], 'unidade': cells['15']}
+        for row_index, cells in _grid_rows(names)
+    }
+    collected['99'] = {'code': 'IC', 'date1': '01/02/2010', 'date2': '31/12/2010', 'unidade': names[0]}
+
+    scraped = build_scraped_data(collected, unidades_data, io.StringIO())
+    # One row per year (2000-2011); the 'IC' row has no numeric code and is dropped.
+    assert sorted(scraped) == [str(2000 + number) for number in range(len(names))]
+    for (_, cells), name in zip(_grid_rows(names), names):
+        (record,) = scraped[cells['9'][-4:]]
+        unit = find_best_unit_match(name, unidades_data)
+        assert (record.code, record.source) == (cells['2'].zfill(3), "[MAINFRAME]")
+        assert record.periodo == f"{cells['9']} - {cells['8']}"
+        assert record.lotacao == (unit['display_string'] if unit else name.strip())
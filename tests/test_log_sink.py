@@ -0,0 +1,97 @@
+import threading
+
+from log_sink import BufferedLogSink
+
+class FakeTextWidget:
+    """The parts of a Tk Text widget the sink uses; timers only run when the test calls tick()."""
+    def __init__(self):
+        self.text = ""
+        self.state = None
+        self.inserts = 0
+        self.timers = {}
+
+    def after(self, _ms, callback):
+        timer_id = f"timer{len(self.timers)}"
+        self.timers[timer_id] = callback
+        return timer_id
+
+    def after_cancel(self, timer_id):
+        self.timers.pop(timer_id, None)
+
+    def tick(self):
+        timers, self.timers = self.timers, {}
+        for callback in timers.values():
+            callback()
+
+    def config(self, state):
+        self.state = state
+
+    def insert(self, _index, text):
+        assert self.state == 'normal'
+        self.text += text
+        self.inserts += 1
+
+    def delete(self, first, last):
+        assert first == '1.0'
+        if last == 'end':
+            self.text = ""
+        else:
+            lines_to_remove = int(last.split('.')[0]) - 1
+            self.text = "".join(self.text.splitlines(keepends=True)[lines_to_remove:])
+
+    def index(self, _index):
+        return f"{self.text.count(chr(10)) + 1}.0"
+
+    def see(self, _index):
+        pass
+
+def test_writes_are_batched_into_one_insert_per_tick():
+    widget = FakeTextWidget()
+    sink = BufferedLogSink(widget)
+    for number in range(100):
+        sink.write(f"linha {number}\n")
+    assert widget.text == ""
+    widget.tick()
+    assert widget.inserts == 1
+    assert widget.text.splitlines()[-1] == "linha 99"
+    assert (sink.flushed_lines, sink.flush_count, widget.state) == (100, 1, 'disabled')
+    sink.close()
+
+def test_writes_from_other_threads_keep_their_order_per_thread():
+    widget = FakeTextWidget()
+    sink = BufferedLogSink(widget)
+    threads = [threading.Thread(target=lambda t=t: [sink.write(f"{t}:{n}\n") for n in range(200)]) for t in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    widget.tick()
+    lines = widget.text.splitlines()
+    assert len(lines) == 800
+    for t in range(4):
+        assert [line for line in lines if line.startswith(f"{t}:")] == [f"{t}:{n}" for n in range(200)]
+    sink.close()
+
+def test_widget_is_bounded_and_the_file_keeps_everything(tmp_path):
+    widget = FakeTextWidget()
+    log_file = tmp_path / "logs" / "processamento.log"
+    sink = BufferedLogSink(widget, max_lines=10, log_file=str(log_file))
+    for number in range(25):
+        sink.write(f"linha {number}\n")
+    widget.tick()
+    assert widget.text.splitlines() == [f"linha {number}" for number in range(16, 25)]
+    assert sink.dropped_lines == 16
+    sink.write("pendente\n")
+    sink.close()
+    assert log_file.read_text(encoding='utf-8').splitlines() == [f"linha {number}" for number in range(25)] + ["pendente"]
+    assert not widget.timers
+
+def test_clear_only_removes_text_written_before_it():
+    widget = FakeTextWidget()
+    sink = BufferedLogSink(widget)
+    sink.write("antes\n")
+    sink.clear()
+    sink.write("depois\n")
+    widget.tick()
+    assert widget.text == "depois\n"
+    sink.close()
@@ -0,0 +1,30 @@
+import io
+
+from benchmarks.synthetic_pdf import generate_mdl_pdf
+from benchmarks.synthetic_units import synthetic_unidades
+from pdf_parser import aggregate_yearly_data_multi_report, split_into_chunks
+
+def test_one_large_report_is_split_across_workers():
+    reports = [('2015', list(range(3, 63)))]
+    chunks = split_into_chunks(reports, 4)
+    # 60 pages over 4 workers x 4 chunks: 15 chunks of 4 pages.
+    assert len(chunks) == 15
+    assert all(report_number == 0 and first_page == 3 for report_number, first_page, _ in chunks)
+    assert [page for _, _, pages in chunks for page in pages] == list(range(3, 63))
+
+def test_chunks_do_not_cross_reports():
+    chunks = split_into_chunks([('2015', [0, 1, 2]), ('2016', [3, 4, 5, 6, 7])], 2)
+    assert {report_number for report_number, _, pages in chunks if 2 in pages} == {0}
+    assert all(pages[0] >= first_page for _, first_page, pages in chunks)
+
+def test_process_pool_matches_the_serial_path(tmp_path):
+    unidades_data = synthetic_unidades(100)
+    pdf_path = str(tmp_path / "grande.pdf")
+    # A single valid report large enough for the pool, after an ignored old one.
+    generate_mdl_pdf(pdf_path, reports=1, pages_per_report=45, rows_per_page=4, unidades_data=unidades_data, old_reports=1)
+
+    serial_log, parallel_log = io.StringIO(), io.StringIO()
+    serial = aggregate_yearly_data_multi_report(pdf_path, serial_log, unidades_data, max_workers=1)
+    parallel = aggregate_yearly_data_multi_report(pdf_path, parallel_log, unidades_data, max_workers=3)
+    assert "processos" in parallel_log.getvalue()
+    assert serial and dict(serial) == dict(parallel)
@@ -0,0 +1,78 @@
+import json
+
+from datetime import datetime
+
+from pdf_parser import decode_powerbi_dsr_rows, rows_from_powerbi_response
+
+WIDTH = 16
+CODE, DT_FINAL, DT_INICIAL, UNIDADE = 1, 7, 8, 14
+
+def epoch_ms(day):
+    return int((datetime.strptime(day, '%d/%m/%Y') - datetime(1970, 1, 1)).total_seconds() * 1000)
+
+def schema():
+    columns = [{'N': f'G{i}', 'T': 1} for i in range(WIDTH)]
+    columns[CODE]['T'] = 4
+    columns[DT_FINAL]['T'] = columns[DT_INICIAL]['T'] = 7
+    columns[UNIDADE]['DN'] = 'D0'
+    return columns
+
+def querydata(dm0, value_dicts=None, incomplete=False):
+    dataset = {'PH': [{'DM0': dm0}], 'ValueDicts': value_dicts or {'D0': ['E.E. JARDIM AMERICA', 'C.E. ALFREDO NASSER']}}
+    if incomplete:
+        dataset['IC'] = True
+    return json.dumps({'results': [{'result': {'data': {'dsr': {'DS': [dataset]}}}}]})
+
+def raw_row(values, repeated=0, nulls=0, with_schema=False):
+    """A DM0 row: `values` maps column -> value; repeated and null columns are left out of 'C'."""
+    row = {'C': [values.get(i, 0) for i in range(WIDTH) if not (repeated | nulls) & (1 << i)]}
+    if repeated:
+        row['R'] = repeated
+    if nulls:
+        row['Ø'] = nulls
+    if with_schema:
+        row['S'] = schema()
+    return row
+
+def test_decode_expands_repeats_nulls_and_value_dicts():
+    body = querydata([
+        raw_row({CODE: 36, DT_FINAL: epoch_ms('31/12/2015'), DT_INICIAL: epoch_ms('01/02/2015'), UNIDADE: 1}, with_schema=True),
+        # Same code and unit as the row above; Dt Final is null (open-ended period).
+        raw_row({DT_INICIAL: epoch_ms('01/02/2016')}, repeated=(1 << CODE) | (1 << UNIDADE), nulls=1 << DT_FINAL),
+    ])
+    rows, complete, columns = decode_powerbi_dsr_rows(json.loads(body)['results'][0])
+    assert complete and len(columns) == WIDTH
+    assert rows[1][CODE] == 36 and rows[1][UNIDADE] == 'C.E. ALFREDO NASSER' and rows[1][DT_FINAL] is None
+
+def test_open_ended_row_is_blanked_not_the_whole_response():
+    body = querydata([
+        raw_row({CODE: 36, DT_FINAL: epoch_ms('31/12/2015'), DT_INICIAL: epoch_ms('01/02/2015'), UNIDADE: 0}, with_schema=True),
+        raw_row({DT_INICIAL: epoch_ms('01/02/2016')}, repeated=(1 << CODE) | (1 << UNIDADE), nulls=1 << DT_FINAL),
+    ])
+    assert rows_from_powerbi_response(body) == {
+        '1': {'code': '36', 'date2': '31/12/2015', 'date1': '01/02/2015', 'unidade': 'E.E. JARDIM AMERICA'},
+        '2': {'code': '36', 'date2': None, 'date1': '01/02/2016', 'unidade': 'E.E. JARDIM AMERICA'},
+    }
+
+def test_dates_before_1973_and_1970_are_decoded():
+    body = querydata([
+        raw_row({CODE: 40, DT_FINAL: epoch_ms('15/03/1972'), DT_INICIAL: epoch_ms('20/05/1969'), UNIDADE: 1}, with_schema=True),
+    ])
+    rows = rows_from_powerbi_response(body)
+    assert rows['1']['date1'] == '20/05/1969' and rows['1']['date2'] == '15/03/1972'
+
+def test_bad_date_cell_is_blanked():
+    body = querydata([
+        raw_row({CODE: 36, DT_FINAL: 'sem data', DT_INICIAL: epoch_ms('01/02/2015'), UNIDADE: 0}, with_schema=True),
+        raw_row({CODE: 40, DT_FINAL: epoch_ms('01/01/2020'), DT_INICIAL: epoch_ms('01/02/2019'), UNIDADE: 1}),
+    ])
+    rows = rows_from_powerbi_response(body)
+    assert rows['1']['date2'] is None and rows['2']['date2'] == '01/01/2020'
+
+def test_incomplete_or_foreign_results_are_not_used():
+    complete_row = raw_row({CODE: 36, DT_FINAL: epoch_ms('31/12/2015'), DT_INICIAL: epoch_ms('01/02/2015'), UNIDADE: 0}, with_schema=True)
+    assert rows_from_powerbi_response(querydata([complete_row], incomplete=True)) is None
+    # A visual whose columns hold no code/date pair at the expected positions.
+    foreign = raw_row({CODE: 'Total', DT_INICIAL: 'x'}, with_schema=True)
+    assert rows_from_powerbi_response(querydata([foreign])) is None
+    assert rows_from_powerbi_response('not json') is None
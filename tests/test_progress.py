@@ -0,0 +1,76 @@
+import io
+
+from progress import ProgressTracker, TextProgressReporter, format_duration
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def _tracker(min_interval=0.2, stages=(('pdf', 'PDF', 0.5), ('merge', 'Mesclagem', 0.5))):
+    clock, snapshots = FakeClock(), []
+    return ProgressTracker(snapshots.append, stages=stages, min_interval=min_interval, clock=clock), clock, snapshots
+
+def test_format_duration():
+    assert format_duration(None) == "?"
+    assert format_duration(59.4) == "59s"
+    assert format_duration(125) == "2min05s"
+    assert format_duration(3 * 3600 + 7 * 60) == "3h07min"
+
+def test_updates_are_throttled_but_start_and_finish_always_emit():
+    tracker, clock, snapshots = _tracker()
+    tracker.start('pdf', total=100, unit="páginas")
+    for _ in range(50):
+        clock.now += 0.01
+        tracker.advance('pdf')
+    # One for start, one when 0.2s had passed, one more at 0.4s.
+    assert len(snapshots) == 3
+    tracker.finish('pdf')
+    assert len(snapshots) == 4
+    assert snapshots[-1].fraction == 0.5
+
+def test_eta_follows_the_recent_rate():
+    tracker, clock, _ = _tracker(min_interval=0)
+    tracker.start('pdf', total=100, unit="páginas")
+    # Slow at first (1 page/s), then 10 pages/s; after the window only the fast rate counts.
+    for _ in range(10):
+        clock.now += 1
+        tracker.advance('pdf')
+    for _ in range(60):
+        clock.now += 0.1
+        tracker.advance('pdf')
+    snapshot = tracker.snapshot()
+    assert abs(snapshot.eta_seconds - 3.0) < 0.2
+    assert snapshot.text.startswith("35% - PDF: 70/100 páginas (")
+    assert "faltam ~3s" in snapshot.text
+
+def test_total_can_be_refined_and_stages_without_total_count_when_done():
+    tracker, clock, _ = _tracker(min_interval=0)
+    tracker.start('pdf', total=200)
+    tracker.advance('pdf', done=100, total=100)
+    tracker.start('merge')
+    clock.now += 1
+    tracker.advance('merge', step=5)
+    snapshot = tracker.snapshot()
+    assert snapshot.fraction == 0.5
+    assert "Mesclagem: 5" in snapshot.text
+    tracker.finish('merge')
+    assert tracker.snapshot().fraction == 1.0
+
+def test_slowest_parallel_stage_is_the_estimate():
+    tracker, clock, _ = _tracker(min_interval=0)
+    tracker.start('pdf', total=100)
+    tracker.start('merge', total=100)
+    clock.now += 1
+    tracker.advance('pdf', step=50)
+    tracker.advance('merge', step=10)
+    assert tracker.snapshot().eta_seconds == 9.0
+
+def test_text_reporter_writes_one_line_per_snapshot():
+    stream = io.StringIO()
+    tracker = ProgressTracker(TextProgressReporter(stream), stages=(('pdf', 'PDF', 1.0),), clock=FakeClock())
+    tracker.start('pdf', total=4, unit="páginas")
+    tracker.finish('pdf')
+    assert stream.getvalue().splitlines() == ["Progresso: 0% - PDF: 0/4 páginas", "Progresso: 100%"]
@@ -0,0 +1,44 @@
+from datetime import date, datetime
+
+from records import UNKNOWN_PERIODO, FuncaoRecord, parse_br_date
+
+REPORT_DATE = datetime(2015, 3, 2)
+
+def test_parse_br_date():
+    assert parse_br_date(" 01/02/2015 ") == date(2015, 2, 1)
+    assert parse_br_date("31/02/2015") is None
+    assert parse_br_date("") is None
+    assert parse_br_date(None) is None
+
+def test_period_is_parsed_once_and_formatted_back():
+    record = FuncaoRecord.from_period_strings(REPORT_DATE, "036", "[MDL]", "1001 - E.E. A", "01/02/2015", "30/06/2015")
+    assert (record.start, record.end, record.raw_periodo) == (date(2015, 2, 1), date(2015, 6, 30), None)
+    assert record.has_period
+    assert record.periodo == "01/02/2015 - 30/06/2015"
+    assert record.duration_days == 149
+
+def test_unparsable_period_keeps_its_text():
+    record = FuncaoRecord.from_period_strings(REPORT_DATE, "036", "[MDL]", "L", "01/02/2015", "ATUAL")
+    assert not record.has_period and record.duration_days is None
+    assert record.periodo == "01/02/2015 - ATUAL"
+    missing = FuncaoRecord.from_period_strings(REPORT_DATE, "036", "[MDL]", "L", "01/02/2015", "")
+    assert missing.periodo == UNKNOWN_PERIODO
+
+def test_from_periodo_matches_from_period_strings():
+    assert (FuncaoRecord.from_periodo(REPORT_DATE, "036", "[MAINFRAME]", "L", "01/02/2015 - 30/06/2015")
+            == FuncaoRecord.from_period_strings(REPORT_DATE, "036", "[MAINFRAME]", "L", "01/02/2015", "30/06/2015"))
+    assert FuncaoRecord.from_periodo(REPORT_DATE, "036", "[MAINFRAME]", "L", UNKNOWN_PERIODO).raw_periodo is None
+    assert FuncaoRecord.from_periodo(REPORT_DATE, "036", "[MAINFRAME]", "L", "SEM DATA").periodo == "SEM DATA"
+
+def test_equal_records_collapse_in_a_set():
+    first = FuncaoRecord.from_period_strings(REPORT_DATE, "036", "[MDL]", "L", "01/02/2015", "30/06/2015")
+    second = FuncaoRecord.from_period_strings(REPORT_DATE, "036", "[MDL]", "L", "01/02/2015", "30/06/2015")
+    assert first == second and len({first, second}) == 1
+    assert first.replace(code="037") != first
+    assert first.replace(code="037").code == "037" and first.code == "036"
+
+def test_sort_key_orders_by_date_then_code():
+    later = FuncaoRecord(datetime(2016, 1, 1), "004", "[MDL]", "L")
+    earlier = FuncaoRecord(REPORT_DATE, "141", "[MDL]", "L")
+    other_code = FuncaoRecord(REPORT_DATE, "036", "[MDL]", "L")
+    assert sorted([later, earlier, other_code], key=FuncaoRecord.sort_key) == [other_code, earlier, later]
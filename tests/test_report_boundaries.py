@@ -0,0 +1,45 @@
+import io
+
+import pdfplumber
+
+from benchmarks.synthetic_pdf import generate_mdl_pdf, write_pdf, _text
+from pdf_parser import PageExtractionCache, detect_report_start, is_start_of_new_report, scan_report_boundaries
+
+def test_band_scan_finds_the_same_reports_as_full_pages(tmp_path):
+    pdf_path = str(tmp_path / "mdl.pdf")
+    generate_mdl_pdf(pdf_path, reports=4, pages_per_report=3, rows_per_page=3, old_reports=2)
+    with pdfplumber.open(pdf_path) as pdf:
+        page_cache = PageExtractionCache()
+        for pdf_page in pdf.pages:
+            page = page_cache.page(pdf_page)
+            assert detect_report_start(page) == is_start_of_new_report(pdf_page.extract_text())
+
+        reports = scan_report_boundaries(pdf, PageExtractionCache(), io.StringIO())
+
+    # The two reports before 05/2014 (pages 1-6) are skipped; each valid one spans 3 pages.
+    assert [(report_date.strftime('%d/%m/%Y'), pages) for report_date, pages in reports] == [
+        ('10/06/2014', [6, 7, 8]), ('25/07/2014', [9, 10, 11]),
+        ('08/09/2014', [12, 13, 14]), ('23/10/2014', [15, 16, 17]),
+    ]
+
+def test_footer_date_is_not_taken_for_data_consulta(tmp_path):
+    # The 'Data Consulta' value line sits just below the header band, and the footer has a date of its own.
+    pdf_path = str(tmp_path / "rodape.pdf")
+    write_pdf(pdf_path, [[
+        _text(700, 570, "Página 1 de 1"),
+        _text(40, 400, "CPF Nome Data Consulta Vínculo"),
+        _text(40, 370, "123.456.789-00 MARIA DA SILVA 10/06/2015 1"),
+        _text(40, 20, "Impresso em 03/03/2013"),
+    ]])
+    with pdfplumber.open(pdf_path) as pdf:
+        page = PageExtractionCache().page(pdf.pages[0])
+        header_text, footer_text = page.extract_boundary_text()
+        assert "Data Consulta" in header_text and "10/06/2015" not in header_text
+        assert "03/03/2013" in footer_text
+        assert detect_report_start(page) == '10/06/2015'
+
+def test_pages_without_the_first_page_marker_are_not_report_starts(tmp_path):
+    pdf_path = str(tmp_path / "mdl.pdf")
+    generate_mdl_pdf(pdf_path, reports=1, pages_per_report=2, rows_per_page=2)
+    with pdfplumber.open(pdf_path) as pdf:
+        assert detect_report_start(PageExtractionCache().page(pdf.pages[1])) is None
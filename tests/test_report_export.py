@@ -0,0 +1,96 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from benchmarks.synthetic_pdf import FUNCOES, generate_mdl_pdf
+from benchmarks.synthetic_units import synthetic_unidades
+from pdf_parser import PdfDocumentSession, build_final_report, read_pdf_header, read_pdf_yearly_data
+from records import FuncaoRecord
+from report_export import (
+    COVERED_BY_PREVIOUS, ROW_FUNCAO, ROW_NO_RECORDS, ROW_PREVIOUS_PERIOD, SIDE_NOTE,
+    build_report_model, parse_export_formats, render_csv, render_jsonl, render_text, write_report_files,
+)
+
+FUNCOES_DATA = {
+    '036': {'descricao': 'PROFESSOR', 'classificacao': 'Magistério'},
+    '040': {'descricao': 'AUXILIAR ADMINISTRATIVO', 'classificacao': 'Administrativo'},
+}
+
+def _record(code, source, start, end):
+    return FuncaoRecord.from_period_strings(datetime.strptime(start, '%d/%m/%Y'), code, source, "1001 - E.E. A", start, end)
+
+def _model():
+    final_yearly_data = {
+        '2015': [_record('036', '[MDL]', '02/02/2015', '30/11/2015'), _record('040', '[MDL]', '01/12/2015', '31/12/2015')],
+        # 2016 is covered by the period below, 2017 by nothing.
+        '2016': [],
+        '2018': [_record('036', '[MAINFRAME]', '01/02/2016', '31/12/2016'), _record('036', '[MDL]', '01/03/2018', '30/04/2018')],
+    }
+    return build_report_model("maria da silva", "123.456.789-00", "02/08/1999", final_yearly_data,
+                              [('040', 'AUXILIAR ADMINISTRATIVO')], FUNCOES_DATA)
+
+def test_model_rows_and_notes():
+    rows = _model()['rows']
+    assert [(row['ano'], row['linha']) for row in rows] == [
+        (2015, ROW_FUNCAO), (2015, ROW_FUNCAO), (2016, ROW_PREVIOUS_PERIOD), (2017, ROW_NO_RECORDS),
+        (2018, ROW_FUNCAO), (2018, ROW_FUNCAO),
+    ]
+    notes = [row['observacao'] for row in rows]
+    # 2015 has 302 Magistério days; 2018 only 61, so its MDL row needs the note.
+    assert notes == ["", SIDE_NOTE, COVERED_BY_PREVIOUS, SIDE_NOTE, "", SIDE_NOTE]
+    assert [row['funcao_especial'] for row in rows] == [False, True, False, False, False, False]
+
+def test_text_csv_and_jsonl_agree():
+    model = _model()
+    text = render_text(model)
+    csv_rows = list(csv.DictReader(io.StringIO(render_csv(model)), delimiter=';'))
+    json_rows = [json.loads(line) for line in render_jsonl(model).splitlines()]
+
+    assert text.startswith("MARIA DA SILVA\n123.456.789-00\nData Início: 02/08/1999\n")
+    assert text.count(f"<- {SIDE_NOTE}") == 3
+    assert "Funções Especiais: (040) AUXILIAR ADMINISTRATIVO" in text
+    assert len(csv_rows) == len(json_rows) == len(model['rows'])
+    for csv_row, json_row in zip(csv_rows, json_rows):
+        assert csv_row['observacao'] == json_row['observacao']
+        assert csv_row['inicio'] == (json_row['inicio'] or "")
+    assert json_rows[0]['inicio'] == "2015-02-02" and json_rows[0]['dias'] == 301
+
+def test_empty_report():
+    model = build_report_model("Maria", "1", "Não encontrada", {}, [], FUNCOES_DATA)
+    assert "Nenhum dado encontrado" in render_text(model)
+    assert render_jsonl(model) == ""
+
+def test_parse_export_formats():
+    assert parse_export_formats("JSONL; csv, xml") == ['csv', 'jsonl']
+    assert parse_export_formats("none") == []
+    assert parse_export_formats(None) == []
+
+def test_write_report_files(tmp_path):
+    model = _model()
+    text_path = str(tmp_path / "MDL_1_FUNCOES.txt")
+    paths = write_report_files(text_path, model, formats=['csv', 'jsonl'], text="editado")
+    assert paths == [text_path, str(tmp_path / "MDL_1_FUNCOES.csv"), str(tmp_path / "MDL_1_FUNCOES.jsonl")]
+    assert (tmp_path / "MDL_1_FUNCOES.txt").read_text(encoding='utf-8') == "editado"
+    assert (tmp_path / "MDL_1_FUNCOES.csv").read_bytes().startswith(b'\xef\xbb\xbf')
+    assert (tmp_path / "MDL_1_FUNCOES.jsonl").read_text(encoding='utf-8') == render_jsonl(model)
+
+def test_synthetic_pdf_report_formats_agree(tmp_path):
+    unidades_data = synthetic_unidades(50)
+    funcoes_data = {code: {'descricao': description, 'classificacao': 'Magistério'} for code, description in FUNCOES}
+    pdf_path = str(tmp_path / "mdl.pdf")
+    generate_mdl_pdf(pdf_path, reports=4, pages_per_report=2, unidades_data=unidades_data, old_reports=1)
+    log = io.StringIO()
+    with PdfDocumentSession(pdf_path) as pdf_session:
+        read_pdf_header(pdf_session, log, unidades_data)
+        pdf_data = read_pdf_yearly_data(pdf_session, log, unidades_data, max_workers=1)
+        data_inicio = pdf_session.data_inicio
+    final_yearly_data, found_special_functions = build_final_report(pdf_data, None, data_inicio, funcoes_data, log)
+    model = build_report_model("Maria", "123.456.789-00", data_inicio, final_yearly_data, found_special_functions, funcoes_data)
+
+    funcao_rows = [row for row in model['rows'] if row['linha'] == ROW_FUNCAO]
+    assert funcao_rows
+    assert len(render_jsonl(model).splitlines()) == len(model['rows'])
+    assert len(render_csv(model).splitlines()) == len(model['rows']) + 1
+    text = render_text(model)
+    assert all(row['periodo'] in text for row in funcao_rows)
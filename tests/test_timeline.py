@@ -0,0 +1,74 @@
+from datetime import date, datetime
+
+from records import FuncaoRecord
+from report_export import COVERED_BY_PREVIOUS, SIDE_NOTE, build_report_model
+from timeline import consolidate_records, covered_days_by_year, gap_years, merge_intervals
+
+FUNCOES = {
+    '036': {'descricao': 'PROFESSOR', 'classificacao': 'Magistério'},
+    '040': {'descricao': 'AUXILIAR', 'classificacao': 'Administrativo'},
+}
+
+def record(code, start, end, lotacao="8992 - C.E. ALFREDO NASSER", source="[MDL]", filed=None):
+    start, end = datetime.strptime(start, '%d/%m/%Y').date(), datetime.strptime(end, '%d/%m/%Y').date()
+    filed = filed or datetime(start.year, start.month, start.day)
+    return FuncaoRecord(filed, code, source, lotacao, start, end)
+
+def test_merge_intervals_joins_overlapping_and_adjacent_periods():
+    intervals = [(date(2015, 3, 1), date(2015, 3, 31)), (date(2015, 1, 1), date(2015, 2, 28)),
+                 (date(2015, 3, 15), date(2015, 4, 10)), (date(2015, 6, 1), date(2015, 6, 30))]
+    assert merge_intervals(intervals) == [(date(2015, 1, 1), date(2015, 4, 10)), (date(2015, 6, 1), date(2015, 6, 30))]
+
+def test_consolidate_keeps_real_gaps_apart():
+    rows = [record('036', '01/02/2015', '30/04/2015'), record('036', '01/05/2015', '30/06/2015'),
+            record('036', '01/08/2015', '15/12/2015')]
+    periods = sorted(r.periodo for r in consolidate_records(rows))
+    assert periods == ['01/02/2015 - 30/06/2015', '01/08/2015 - 15/12/2015']
+
+def test_covered_days_split_at_new_year_and_count_overlaps_once():
+    yearly = {'2015': [record('036', '01/11/2015', '31/01/2016'), record('040', '01/12/2015', '31/12/2015')]}
+    assert covered_days_by_year(yearly) == {2015: 61, 2016: 31}
+
+def test_gap_years_skip_years_covered_by_an_earlier_period():
+    yearly = {'2013': [record('036', '01/02/2013', '31/12/2014')], '2016': [record('036', '01/02/2016', '30/11/2016')]}
+    assert gap_years(yearly) == [2015]
+
+def test_a_few_spilled_days_do_not_cover_a_gap_year():
+    yearly = {'2015': [record('036', '01/01/2015', '02/01/2016')], '2017': [record('036', '01/01/2017', '31/12/2017')]}
+    assert gap_years(yearly) == []
+    assert gap_years(yearly, min_days=244) == [2016]
+    model = build_report_model("MARIA", "123.456.789-00", "01/01/2010", yearly, set(), FUNCOES)
+    assert [row['observacao'] for row in model['rows'] if row['ano'] == 2016] == [SIDE_NOTE]
+
+def test_a_year_mostly_covered_by_an_earlier_period_points_back_to_it():
+    yearly = {'2015': [record('036', '01/01/2015', '30/09/2016')], '2017': [record('036', '01/01/2017', '31/12/2017')]}
+    model = build_report_model("MARIA", "123.456.789-00", "01/01/2010", yearly, set(), FUNCOES)
+    assert [row['observacao'] for row in model['rows'] if row['ano'] == 2016] == [COVERED_BY_PREVIOUS]
+
+def model_notes(yearly):
+    model = build_report_model("MARIA", "123.456.789-00", "01/01/2010", yearly, set(), FUNCOES)
+    return {(row['periodo'], row['observacao']) for row in model['rows'] if row['linha'] == 'funcao'}
+
+def test_short_magisterio_rows_covering_244_days_of_a_year_get_no_note():
+    # Split at a July gap: each row is shorter than 244 days, the year is covered for 288.
+    yearly = {'2015': consolidate_records([record('036', '01/02/2015', '30/06/2015'), record('036', '01/08/2015', '15/12/2015')])}
+    assert model_notes(yearly) == {('01/02/2015 - 30/06/2015', ''), ('01/08/2015 - 15/12/2015', '')}
+
+def test_magisterio_year_with_fewer_than_244_days_gets_the_note():
+    yearly = {'2015': [record('036', '01/02/2015', '30/06/2015')], '2016': [record('036', '01/01/2016', '31/12/2016')]}
+    assert model_notes(yearly) == {('01/02/2015 - 30/06/2015', SIDE_NOTE), ('01/01/2016 - 31/12/2016', '')}
+
+def test_administrative_days_do_not_count_toward_magisterio():
+    yearly = {'2015': [record('036', '01/02/2015', '30/06/2015'), record('040', '01/07/2015', '31/12/2015')]}
+    assert model_notes(yearly) == {('01/02/2015 - 30/06/2015', SIDE_NOTE), ('01/07/2015 - 31/12/2015', SIDE_NOTE)}
+
+def test_year_long_row_spilling_into_the_next_year_gets_no_note():
+    yearly = {'2015': [record('036', '01/01/2015', '05/01/2016')]}
+    assert model_notes(yearly) == {('01/01/2015 - 05/01/2016', '')}
+
+def test_row_running_into_the_current_year_is_judged_on_its_filed_year():
+    # The current year has at most a few weeks covered so far.
+    today = date.today()
+    start, end = date(today.year - 1, 1, 1), min(today, date(today.year, 2, 15))
+    yearly = {str(start.year): [FuncaoRecord(datetime(start.year, 1, 1), '036', "[MDL]", "8992 - C.E. ALFREDO NASSER", start, end)]}
+    assert model_notes(yearly) == {(f"{start:%d/%m/%Y} - {end:%d/%m/%Y}", '')}
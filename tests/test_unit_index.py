@@ -0,0 +1,46 @@
+from difflib import SequenceMatcher
+
+import pytest
+
+from benchmarks.synthetic_units import synthetic_unidades, mainframe_unit_names
+from unit_index import UnitMatchIndex, normalize_unit_name, ratio_upper_bound, _full_scan_match, _ngrams
+
+def shared_ngrams(a, b):
+    return sum((_ngrams(a) & _ngrams(b)).values())
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_index_matches_full_scan(seed):
+    unidades_data = synthetic_unidades(250, seed)
+    index = UnitMatchIndex(unidades_data)
+    for name in mainframe_unit_names(unidades_data, 120, seed):
+        assert index.match(name) is _full_scan_match(name, unidades_data), name
+
+def test_candidate_outside_the_top_shared_ngrams_still_wins():
+    # A cap on the number of scored candidates would pick 'CENTRO DE EDUCACAO LUIZ II' (0.868).
+    unidades_data = synthetic_unidades(5000, 1)
+    name = 'CENTRO DE EDUACAO LUIZC ORC'
+    expected = _full_scan_match(name, unidades_data)
+    assert expected['nome_folha'] == 'CENTRO DE EDUCACAO LUIZ CORA'
+    assert UnitMatchIndex(unidades_data).match(name) is expected
+
+def test_exact_match_ignores_case_and_periods():
+    unidades_data = synthetic_unidades(50)
+    unit = next(iter(unidades_data.values()))
+    assert UnitMatchIndex(unidades_data).match(unit['nome_folha'].replace('.', '').lower()) is unit
+
+def test_ties_keep_the_unit_listed_first():
+    rows = {'1': {'mdl': '1', 'inep': None, 'nome_folha': 'ESCOLA ABCX', 'display_string': '1 - ESCOLA ABCX'},
+            '2': {'mdl': '2', 'inep': None, 'nome_folha': 'ESCOLA ABCY', 'display_string': '2 - ESCOLA ABCY'}}
+    assert UnitMatchIndex(rows).match('ESCOLA ABCZ') is rows['1']
+
+def test_unknown_name_is_not_matched():
+    assert UnitMatchIndex(synthetic_unidades(200)).match('XYZ QWERTY 123') is None
+
+def test_ratio_upper_bound_holds():
+    unidades_data = synthetic_unidades(60, 3)
+    names = [normalize_unit_name(unit['nome_folha']) for unit in unidades_data.values()]
+    queries = mainframe_unit_names(unidades_data, 40, 3)
+    for query in map(normalize_unit_name, queries):
+        for name in names:
+            ratio = SequenceMatcher(None, query, name).ratio()
+            assert ratio <= ratio_upper_bound(shared_ngrams(query, name), len(query), len(name)) + 1e-9
@@ -0,0 +1,87 @@
+from collections import defaultdict
+from datetime import date, timedelta
+
+ONE_DAY = timedelta(days=1)
+
+def merge_intervals(intervals):
+    """
+    Merges overlapping or adjacent (next day) (start, end) date intervals.
+    Returns the merged intervals in start order; O(n log n).
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + ONE_DAY:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+def consolidate_records(records):
+    """
+    Sweeps the records of one year per (code, lotacao): overlapping or adjacent periods
+    become one record, while periods separated by a real gap stay separate. Each merged
+    record is the earliest-filed record of its run, with the run's start and end.
+    Records without a parsed period are returned unchanged, after the merged ones.
+    """
+    runs_by_key = defaultdict(list)
+    without_period = []
+    for record in records:
+        if record.has_period:
+            runs_by_key[(record.code, record.lotacao)].append(record)
+        else:
+            without_period.append(record)
+
+    consolidated = []
+    for group in runs_by_key.values():
+        group.sort(key=lambda r: (r.start, r.date))
+        run_records = [group[0]]
+        run_end = group[0].end
+        for record in group[1:]:
+            if record.start <= run_end + ONE_DAY:
+                run_records.append(record)
+                run_end = max(run_end, record.end)
+                continue
+            consolidated.append(_merged_record(run_records, run_end))
+            run_records = [record]
+            run_end = record.end
+        consolidated.append(_merged_record(run_records, run_end))
+
+    return consolidated + without_period
+
+def _merged_record(run_records, run_end):
+    representative = min(run_records, key=lambda r: r.date)
+    representative.start = min(r.start for r in run_records)
+    representative.end = run_end
+    return representative
+
+def covered_days_by_year(yearly_records):
+    """
+    Days covered by at least one period in each calendar year, from the union of all
+    records' periods (overlaps count once, periods crossing New Year are split).
+    """
+    intervals = [(r.start, r.end) for records in yearly_records.values() for r in records if r.has_period]
+    coverage = defaultdict(int)
+    for start, end in merge_intervals(intervals):
+        for year in range(start.year, end.year + 1):
+            year_start = max(start, date(year, 1, 1))
+            year_end = min(end, date(year, 12, 31))
+            coverage[year] += (year_end - year_start).days + 1
+    return coverage
+
+def gap_years(yearly_records, coverage=None, min_days=1):
+    """
+    Years between the first and last filed year that have no records and fewer than
+    `min_days` days covered by periods from other years (so a period spilling a few
+    days past New Year does not stand in for the whole next year).
+    """
+    years = [int(year) for year, records in yearly_records.items() if records]
+    if not years:
+        return []
+    if coverage is None:
+        coverage = covered_days_by_year(yearly_records)
+    filed_years = set(years)
+    return [
+        year for year in range(min(years), max(years) + 1)
+        if year not in filed_years and coverage.get(year, 0) < min_days
+    ]
@@ -0,0 +1,148 @@
+"""
+Optional span tracing, written as a Chrome trace-event JSON file (open it in
+https://ui.perfetto.dev or chrome://tracing).
+
+Tracing is off unless enable_tracing() is called or the ANALISADOR_TRACE
+environment variable names the output file. While it is off, span() returns a
+shared no-op context manager and traced() functions run without extra work.
+"""
+import atexit
+import functools
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+from contextlib import nullcontext
+
+TRACE_ENV_VAR = "ANALISADOR_TRACE"
+
+_NO_SPAN = nullcontext()
+_tracer = None
+
+class Tracer:
+    """Collects complete ("X") events; list.append is atomic, so threads need no lock to record."""
+    def __init__(self, path):
+        self.path = path
+        self.pid = os.getpid()
+        self.events = []
+        self._origin = time.perf_counter()
+        self._thread_names = {}
+
+    def now_us(self):
+        return (time.perf_counter() - self._origin) * 1e6
+
+    def record(self, name, category, start_us, end_us, args):
+        thread = threading.current_thread()
+        self._thread_names.setdefault(thread.ident, thread.name)
+        event = {'name': name, 'cat': category, 'ph': 'X', 'ts': round(start_us, 1),
+                 'dur': round(end_us - start_us, 1), 'pid': self.pid, 'tid': thread.ident}
+        if args:
+            event['args'] = {key: value if isinstance(value, (int, float, bool)) or value is None else str(value)
+                             for key, value in args.items()}
+        self.events.append(event)
+
+    def write(self):
+        """Writes every event recorded so far (the file is rewritten on each call)."""
+        if os.getpid() != self.pid:
+            # A forked worker's copy of the parent's tracer; the parent writes these events.
+            return 0
+        metadata = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': name}}
+            for tid, name in list(self._thread_names.items())
+        ]
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': metadata + list(self.events), 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+        return len(self.events)
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'category', 'args', 'start_us')
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start_us = self.tracer.now_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args['erro'] = exc_type.__name__
+        self.tracer.record(self.name, self.category, self.start_us, self.tracer.now_us(), self.args)
+        return False
+
+def span(name, category="analise", **args):
+    """Times the enclosed block as one trace event; `args` are shown with it in the viewer."""
+    tracer = _tracer
+    if tracer is None:
+        return _NO_SPAN
+    return _Span(tracer, name, category, args)
+
+def traced(name=None, category="analise"):
+    """Decorator form of span(), named after the function unless `name` is given."""
+    def decorator(function):
+        span_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            tracer = _tracer
+            if tracer is None:
+                return function(*args, **kwargs)
+            with _Span(tracer, span_name, category, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def tracing_enabled():
+    return _tracer is not None
+
+def enable_tracing(path):
+    """Starts recording spans; they are written to `path` by write_trace() and at exit."""
+    global _tracer
+    # A forked worker inherits the parent's tracer; it starts one of its own.
+    if _tracer is None or _tracer.pid != os.getpid():
+        if multiprocessing.parent_process() is not None:
+            # Pool workers get their own file next to the main one.
+            root, extension = os.path.splitext(path)
+            path = f"{root}.{os.getpid()}{extension or '.json'}"
+        else:
+            os.environ[TRACE_ENV_VAR] = os.path.abspath(path)
+        _tracer = Tracer(os.path.abspath(path))
+        atexit.register(write_trace)
+    return _tracer
+
+def write_trace():
+    """Writes the trace file, if tracing is on. Returns its path, or None."""
+    tracer = _tracer
+    if tracer is None:
+        return None
+    try:
+        tracer.write()
+    except OSError as e:
+        print(f"AVISO: Não foi possível gravar o trace em {tracer.path}: {e}")
+        return None
+    return tracer.path
+
+def init_worker_tracing():
+    """
+    For process-pool initializers: traces the worker too when the main process traces
+    (enable_tracing() sets the environment variable the workers inherit).
+    Workers may end without running atexit, so they call write_worker_trace() after each task.
+    """
+    if os.environ.get(TRACE_ENV_VAR):
+        enable_tracing(os.environ[TRACE_ENV_VAR])
+
+def write_worker_trace():
+    """In a pool worker process, rewrites its trace file; does nothing in the main process or when off."""
+    if _tracer is not None and multiprocessing.parent_process() is not None:
+        write_trace()
+
+if os.environ.get(TRACE_ENV_VAR):
+    enable_tracing(os.environ[TRACE_ENV_VAR])
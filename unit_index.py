@@ -0,0 +1,166 @@
+import re
+
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+# A MAINFRAME name is only matched to a unit whose similarity ratio is above this.
+MATCH_THRESHOLD = 0.85
+# Trigrams over the name padded with one space on each side, so a name has one n-gram
+# per character; ratio_upper_bound relies on that.
+NGRAM_SIZE = 3
+# Slack for float rounding when a bound is compared with an actual ratio.
+BOUND_TOLERANCE = 1e-9
+
+def normalize_unit_name(text):
+    """Uppercase, no periods ("E.E." == "E E") and single spaces, for a lenient comparison."""
+    text = text.upper().strip()
+    text = text.replace('.', '')
+    return re.sub(r'\s+', ' ', text)
+
+def _ngrams(normalized_name):
+    """Counts of the name's n-grams, padded with one space on each side (one n-gram per character)."""
+    padded = f" {normalized_name} "
+    return Counter(padded[i:i + NGRAM_SIZE] for i in range(max(len(padded) - NGRAM_SIZE + 1, 1)))
+
+def ratio_upper_bound(shared_ngrams, length_a, length_b):
+    """
+    Upper bound of SequenceMatcher(None, a, b).ratio() from the number of n-grams
+    (counted with repetition) the two names share.
+
+    The matched characters of SequenceMatcher form a common subsequence of length L.
+    Each character of `a` outside it touches at most NGRAM_SIZE n-grams of the padded
+    `a`, and each character of `b` outside it splits at most NGRAM_SIZE - 1 of the
+    rest, so shared >= L*(2*NGRAM_SIZE - 1) - (NGRAM_SIZE - 1)*(length_a + length_b).
+    That is ratio <= 0.8 + 0.4 * shared / (length_a + length_b): a unit sharing no
+    trigram cannot reach MATCH_THRESHOLD.
+    """
+    total = length_a + length_b
+    if not total:
+        return 1.0
+    longest_common = (shared_ngrams + (NGRAM_SIZE - 1) * total) / (2 * NGRAM_SIZE - 1)
+    length_bound = 2.0 * min(length_a, length_b) / total
+    return min(2.0 * longest_common / total, length_bound)
+
+def min_shared_ngrams(bound, total_length):
+    """Fewest shared n-grams for which ratio_upper_bound can reach `bound` (inverse of its first term)."""
+    return ((2 * NGRAM_SIZE - 1) * bound / 2.0 - (NGRAM_SIZE - 1)) * total_length
+
+class UnitMatchIndex:
+    """
+    Lookup structure over the SGDP_UNIDADES names, built once per loaded table.
+    Exact matches on the normalized name are a dict lookup. Otherwise only units that
+    share character n-grams with the MAINFRAME name can reach the threshold (see
+    ratio_upper_bound); they are scored with SequenceMatcher from the highest bound
+    down, stopping once no remaining unit can beat the best score. Ties keep the unit
+    that comes first in the table, so the result is the same as a full scan's.
+    """
+    def __init__(self, unidades_data):
+        # One entry per distinct nome_folha (INEP and MDL keys point to the same unit).
+        units_by_name = {unit['nome_folha']: unit for unit in unidades_data.values() if unit.get('nome_folha')}
+        self.source_size = len(unidades_data)
+        self._names = []
+        self._units = []
+        self._exact = {}
+        # Most n-grams occur once in a name; those postings are plain position lists, so
+        # counting them is a C-level Counter.update. Repeated n-grams keep their count.
+        self._postings = defaultdict(list)
+        self._repeated_postings = defaultdict(list)
+        for position, (name, unit) in enumerate(units_by_name.items()):
+            normalized_name = normalize_unit_name(name)
+            self._names.append(normalized_name)
+            self._units.append(unit)
+            self._exact.setdefault(normalized_name, unit)
+            for gram, count in _ngrams(normalized_name).items():
+                if count == 1:
+                    self._postings[gram].append(position)
+                else:
+                    self._repeated_postings[gram].append((position, count))
+
+    def __len__(self):
+        return len(self._units)
+
+    def candidates(self, normalized_name, min_bound=0.0):
+        """
+        (ratio upper bound, position) of the units sharing an n-gram with the name whose
+        bound is at least `min_bound`, highest bound first and, for equal bounds, in table order.
+        """
+        shared_grams = Counter()
+        for gram, query_count in _ngrams(normalized_name).items():
+            shared_grams.update(self._postings.get(gram, ()))
+            for position, unit_count in self._repeated_postings.get(gram, ()):
+                shared_grams[position] += min(query_count, unit_count)
+        query_length = len(normalized_name)
+        # The unit's own length only raises the requirement, so this skips most units cheaply.
+        fewest_shared = min_shared_ngrams(min_bound, query_length)
+        bounds = []
+        for position, shared in shared_grams.items():
+            if shared < fewest_shared:
+                continue
+            bound = ratio_upper_bound(shared, query_length, len(self._names[position]))
+            if bound >= min_bound:
+                bounds.append((bound, position))
+        bounds.sort(key=lambda item: (-item[0], item[1]))
+        return bounds
+
+    def match(self, mainframe_name):
+        """Returns the unit_info for the MAINFRAME name, or None when nothing is similar enough."""
+        if not mainframe_name or not mainframe_name.strip():
+            return None
+        return self.match_normalized(normalize_unit_name(mainframe_name))[0]
+
+    def match_normalized(self, normalized_mainframe_name):
+        """Returns (unit_info or None, best score scored) for an already normalized name; exact matches score 1.0."""
+        if not self._units:
+            return None, 0.0
+        exact_unit = self._exact.get(normalized_mainframe_name)
+        if exact_unit:
+            return exact_unit, 1.0
+
+        best_position = None
+        highest_score = 0.0
+        for bound, position in self.candidates(normalized_mainframe_name, MATCH_THRESHOLD - BOUND_TOLERANCE):
+            # Sorted by bound, so once it cannot beat (or tie) the best, nothing after it can.
+            limit = max(highest_score, MATCH_THRESHOLD)
+            if bound < limit - BOUND_TOLERANCE:
+                break
+            matcher = SequenceMatcher(None, normalized_mainframe_name, self._names[position])
+            if matcher.quick_ratio() < limit:
+                continue
+            score = matcher.ratio()
+            # Equal scores go to the unit listed first, as in a scan in table order.
+            if score > highest_score or (score == highest_score and best_position is not None and position < best_position):
+                highest_score = score
+                best_position = position
+
+        best_match_unit = self._units[best_position] if best_position is not None else None
+        if highest_score > MATCH_THRESHOLD:
+            return best_match_unit, highest_score
+        return None, highest_score
+
+def _full_scan_match(mainframe_name, unidades_data):
+    """
+    The matcher before the index: SequenceMatcher against every distinct unit name.
+    UnitMatchIndex.match must pick the same unit; the tests and benchmarks compare them.
+    """
+    normalized_name = normalize_unit_name(mainframe_name)
+    best_unit, best_score = None, 0.0
+    for unit in {unit['nome_folha']: unit for unit in unidades_data.values() if unit.get('nome_folha')}.values():
+        score = SequenceMatcher(None, normalized_name, normalize_unit_name(unit['nome_folha'])).ratio()
+        if score > best_score:
+            best_unit, best_score = unit, score
+    return best_unit if best_score > MATCH_THRESHOLD else None
+
+# Indexes already built, by the identity of the unidades_data dict they were built from.
+_indexes = {}
+
+def unit_index_for(unidades_data):
+    """Returns the (cached) index for a loaded unidades_data dict, rebuilding it if units were added."""
+    cached = _indexes.get(id(unidades_data))
+    if cached and cached[0] is unidades_data and cached[1].source_size == len(unidades_data):
+        return cached[1]
+    if len(_indexes) >= 4:
+        _indexes.clear()
+    index = UnitMatchIndex(unidades_data)
+    # The dict itself is kept so its id cannot be reused by another object.
+    _indexes[id(unidades_data)] = (unidades_data, index)
+    return index